@@ -0,0 +1,6 @@
+"""Benchmarks of mf2py.parse over the test examples, the microformats test
+suite and large generated pages.
+
+Run them from the root of the repository with `python -m benchmarks run` and
+compare two runs with `python -m benchmarks compare`; see `--help`.
+"""
@@ -0,0 +1,146 @@
+"""The documents benchmarked, by corpus name.
+
+Every corpus is a list of (name, doc) tuples, where doc is the bytes of the
+document as they would be read from a file or fetched.
+"""
+
+import glob
+import os
+
+# the directory of the test examples, relative to the root of the repository
+EXAMPLES_DIR = os.path.join("test", "examples")
+# the glob of test/test_suite.py, relative to the current directory
+TESTSUITE_GLOB = os.path.join(".", "testsuite", "tests", "*", "*", "*.html")
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="/style.css">
+<link rel="alternate" type="application/rss+xml" href="/feed.xml">
+<meta property="og:title" content="{title}">
+<meta name="description" content="A page generated for benchmarks">
+</head>
+<body>
+<header><nav><ul>{nav}</ul></nav></header>
+<main>
+{main}
+</main>
+<footer><p>Generated for benchmarks.</p></footer>
+</body>
+</html>
+"""
+
+_NAV = '<li><a href="/section/{0}/">Section {0}</a></li>'
+
+_ENTRY = """<article class="h-entry" id="post-{i}">
+  <h2 class="p-name"><a class="u-url" href="/posts/{i}">Post number {i}</a></h2>
+  <a class="p-author h-card" href="/"><img class="u-photo" src="/me.jpg" alt="">Author</a>
+  <time class="dt-published" datetime="2023-01-{day:02d}T10:{minute:02d}:00Z">January {day}</time>
+  <div class="e-content">
+    <p>Paragraph one of post {i}, with a <a href="/posts/{prev}">link</a>
+    to the previous post and <em>some</em> <strong>inline</strong> markup.</p>
+    <p>Paragraph two, with an image <img src="/img/{i}.png" alt="figure {i}">
+    and a list:</p>
+    <ul><li>first</li><li>second</li><li>third</li></ul>
+  </div>
+  <a class="p-category" href="/tags/tag{tag}">tag{tag}</a>
+  <a class="u-in-reply-to" href="https://example.org/notes/{i}">in reply to</a>
+</article>
+"""
+
+_BACKCOMPAT_ENTRY = """<div class="hentry">
+  <h2 class="entry-title"><a rel="bookmark" href="/posts/{i}">Post {i}</a></h2>
+  <span class="author vcard"><a class="url fn" href="/">Author</a></span>
+  <abbr class="published" title="2023-01-{day:02d}">January {day}</abbr>
+  <div class="entry-content"><p>Content of post {i}.</p></div>
+  <a rel="tag" href="/tags/tag{tag}">tag{tag}</a>
+</div>
+"""
+
+_PLAIN_SECTION = """<section>
+  <h2>Section {i}</h2>
+  <div class="row"><div class="col-md-8 content">
+    <p>Text without microformats, {i}, with <a href="/page/{i}">a link</a>,
+    <span class="highlight">spans</span> and <code>code</code>.</p>
+    <table><tr><td>{i}</td><td>cell</td></tr><tr><td>row</td><td>cell</td></tr></table>
+  </div></div>
+</section>
+"""
+
+_REL = '<a rel="{rel}" href="https://example.org/{i}" title="Link {i}">Link {i}</a>\n'
+_RELS = ("me", "nofollow", "tag", "author", "webmention")
+
+
+def _page(title, main):
+    nav = "".join(_NAV.format(i) for i in range(20))
+    return _PAGE.format(title=title, nav=nav, main=main).encode("utf-8")
+
+
+def _values(i):
+    return {
+        "i": i,
+        "prev": max(i - 1, 0),
+        "day": i % 28 + 1,
+        "minute": i % 60,
+        "tag": i % 10,
+    }
+
+
+def large(scale=1):
+    """Generate large pages shaped like real-world ones.
+
+    Args:
+      scale (int): optional, multiplies the number of elements of every page
+    """
+    entries = "".join(_ENTRY.format(**_values(i)) for i in range(200 * scale))
+    backcompat = "".join(
+        _BACKCOMPAT_ENTRY.format(**_values(i)) for i in range(200 * scale)
+    )
+    plain = "".join(_PLAIN_SECTION.format(i=i) for i in range(1000 * scale))
+    rels = "".join(
+        _REL.format(rel=_RELS[i % len(_RELS)], i=i) for i in range(2000 * scale)
+    )
+    return [
+        ("h-feed", _page("Feed", '<div class="h-feed">' + entries + "</div>")),
+        (
+            "backcompat",
+            _page("Backcompat", '<div class="hfeed">' + backcompat + "</div>"),
+        ),
+        ("no-microformats", _page("Plain", plain)),
+        ("rels", _page("Rels", rels)),
+    ]
+
+
+def _read(paths, root):
+    docs = []
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            docs.append((os.path.relpath(path, root), f.read()))
+    return docs
+
+
+def examples():
+    """The HTML files of test/examples"""
+    return _read(glob.glob(os.path.join(EXAMPLES_DIR, "*.html")), EXAMPLES_DIR)
+
+
+def testsuite():
+    """The HTML files of the microformats test suite, if it is checked out"""
+    return _read(glob.glob(TESTSUITE_GLOB), ".")
+
+
+def load(names, scale=1):
+    """Get the corpora by name, leaving out the empty ones"""
+    loaders = {
+        "examples": examples,
+        "testsuite": testsuite,
+        "large": lambda: large(scale),
+    }
+    corpora = {}
+    for name in names:
+        docs = loaders[name]()
+        if docs:
+            corpora[name] = docs
+    return corpora
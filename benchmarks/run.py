@@ -0,0 +1,258 @@
+"""Time mf2py.parse with every parser backend over the corpora, save the
+results as JSON and compare them with a baseline.
+
+Usage:
+  python -m benchmarks run [--output results.json]
+  python -m benchmarks compare baseline.json results.json
+"""
+
+import argparse
+import importlib.util
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import mf2py
+
+from . import corpus
+
+# the options of every backend by name
+BACKENDS = {
+    "html5lib": {},
+    "html.parser": {"html_parser": "html.parser"},
+    "lxml": {"html_parser": "lxml"},
+    "lxml-dom": {"dom_backend": "lxml"},
+    "compact": {"dom_backend": "compact"},
+}
+
+# the libraries that every backend needs, by name. mf2py.parse falls back to
+# another parser when the one asked for is missing, so trying it is not enough
+REQUIRES = {
+    "html5lib": ("html5lib",),
+    "html.parser": (),
+    "lxml": ("lxml",),
+    "lxml-dom": ("lxml",),
+    "compact": ("lxml",),
+}
+
+CORPORA = ("examples", "testsuite", "large")
+
+# the metrics compared, and whether higher values are better
+METRICS = {
+    "docs_per_s": True,
+    "mb_per_s": True,
+    "p50_ms": False,
+    "p90_ms": False,
+    "p99_ms": False,
+    # tracemalloc only traces the Python heap, not the memory lxml allocates
+    # in C, so this is only comparable between runs of the same backend
+    "py_peak_mb": False,
+}
+
+DEFAULT_THRESHOLD = 0.1
+
+_URL = "http://example.com"
+
+
+def _available(name):
+    """Whether the libraries of a backend are installed"""
+    return all(importlib.util.find_spec(module) for module in REQUIRES[name])
+
+
+def _percentile(values, fraction):
+    """Get a percentile of sorted values, interpolating between them"""
+    position = (len(values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def measure(docs, options, repeat=5):
+    """Time parsing every document and measure the peak memory.
+
+    The latency of each document is the median of repeat runs, and the peak
+    memory is the largest of the Python heap traced while parsing one
+    document, in a separate run so that tracing does not slow the timed ones.
+
+    Args:
+      docs (list): (name, doc) tuples
+      options (dict): the options of mf2py.parse
+      repeat (int): optional, number of timed runs
+
+    Returns:
+      dict: the metrics
+    """
+    latencies = []
+    for _, doc in docs:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            mf2py.parse(doc, _URL, **options)
+            times.append(time.perf_counter() - start)
+        latencies.append(statistics.median(times))
+
+    peak = 0
+    for _, doc in docs:
+        tracemalloc.start()
+        try:
+            mf2py.parse(doc, _URL, **options)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    total = sum(latencies)
+    size = sum(len(doc) for _, doc in docs)
+    latencies.sort()
+    return {
+        "docs": len(docs),
+        "mb": round(size / 1e6, 3),
+        "seconds": round(total, 6),
+        "docs_per_s": round(len(docs) / total, 3),
+        "mb_per_s": round(size / 1e6 / total, 3),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p90_ms": round(_percentile(latencies, 0.9) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "py_peak_mb": round(peak / 1e6, 3),
+    }
+
+
+def run(backends, corpora, repeat=5, scale=1, out=sys.stderr):
+    """Run the benchmarks.
+
+    Returns:
+      dict: the environment and the metrics by "corpus/backend"
+    """
+    results = {}
+    docs_by_corpus = corpus.load(corpora, scale)
+    for name in corpora:
+        if name not in docs_by_corpus:
+            print("{0}: no documents, skipped".format(name), file=out)
+    for backend in backends:
+        if not _available(backend):
+            print("{0}: not installed, skipped".format(backend), file=out)
+            continue
+        for name, docs in docs_by_corpus.items():
+            key = "{0}/{1}".format(name, backend)
+            results[key] = measure(docs, BACKENDS[backend], repeat)
+            print(_format_row(key, results[key]), file=out)
+    return {
+        "mf2py": mf2py.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "scale": scale,
+        "results": results,
+    }
+
+
+def _format_row(key, metrics):
+    return "{0:<28} {1}".format(
+        key, "  ".join("{0}={1}".format(name, metrics[name]) for name in METRICS)
+    )
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare the metrics of two runs.
+
+    Args:
+      baseline, current (dict): results of run()
+      threshold (float): optional, the relative change of a metric for the
+        worse above which it is a regression
+
+    Returns:
+      list: (key, metric, baseline value, current value, relative change)
+        tuples of the regressions
+    """
+    regressions = []
+    for key, metrics in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            # the metrics of older runs may be missing
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+
+def _argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "--backend",
+        action="append",
+        choices=sorted(BACKENDS),
+        help="backend to benchmark, can be repeated. Defaults to all.",
+    )
+    run_parser.add_argument(
+        "--corpus",
+        action="append",
+        choices=CORPORA,
+        help="corpus to benchmark, can be repeated. Defaults to all.",
+    )
+    run_parser.add_argument(
+        "--repeat", type=int, default=5, help="number of timed runs per document"
+    )
+    run_parser.add_argument(
+        "--scale", type=int, default=1, help="size multiplier of the large pages"
+    )
+    run_parser.add_argument(
+        "-o", "--output", help="file to save the results to as JSON"
+    )
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare results with a baseline"
+    )
+    compare_parser.add_argument("baseline", help="results file of the baseline")
+    compare_parser.add_argument("current", help="results file to compare")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative change for the worse that is a regression, e.g. 0.1",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _argument_parser().parse_args(argv)
+    if args.command == "run":
+        results = run(
+            args.backend or list(BACKENDS),
+            args.corpus or list(CORPORA),
+            repeat=args.repeat,
+            scale=args.scale,
+        )
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for key, metric, old, new, change in regressions:
+        print(
+            "REGRESSION {0} {1}: {2} -> {3} ({4:+.1%})".format(
+                key, metric, old, new, change
+            )
+        )
+    if regressions:
+        return 1
+    print("No regressions above {0:.0%}".format(args.threshold))
+    return 0
@@ -5,8 +5,36 @@ a microformatted HTML document and returns a well-formed JSON
 dictionary.
 """
 
+from .aio import parse_url_async, parse_urls_async
+from .batch import parse_many
+from .cache import ResultCache, SubtreeMemo
+from .http_cache import HTTPCache
 from .mf_helpers import get_url
 from .parser import Parser, parse
+from .prescan import may_contain_microformats
+from .results import Item, PropertyValue, Rel
+from .serialize import write_json
+from .streaming import StreamingParser
 from .version import __version__
+from .warc import iter_warc_responses, parse_warc
 
-__all__ = ["Parser", "parse", "get_url", "__version__"]
+__all__ = [
+    "HTTPCache",
+    "Item",
+    "Parser",
+    "PropertyValue",
+    "Rel",
+    "ResultCache",
+    "StreamingParser",
+    "SubtreeMemo",
+    "parse",
+    "parse_many",
+    "parse_url_async",
+    "parse_urls_async",
+    "parse_warc",
+    "get_url",
+    "iter_warc_responses",
+    "may_contain_microformats",
+    "write_json",
+    "__version__",
+]
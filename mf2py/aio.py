@@ -0,0 +1,214 @@
+"""Fetch and parse documents from URLs concurrently with asyncio.
+
+Fetching is done with a shared `requests.Session` so connections to the same
+host are kept alive and reused: the session given, one per call of
+parse_urls_async(), or one for the module shared by the calls of
+parse_url_async(). Parsing is handed to an executor so that network I/O and
+parsing overlap.
+"""
+
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .parser import Parser, _response_doc
+
+# maximum number of concurrent requests to a single host
+DEFAULT_PER_HOST = 6
+# maximum number of concurrent requests overall
+DEFAULT_CONCURRENCY = 32
+
+
+# the session of parse_url_async() when none is given, created on first use
+_session = None
+
+
+def _default_session():
+    """The session shared by the calls of parse_url_async() without one"""
+    global _session
+    if _session is None:
+        _session = _new_session(DEFAULT_CONCURRENCY, DEFAULT_PER_HOST)
+    return _session
+
+
+def _new_session(concurrency, per_host):
+    """A new session with connection pools sized for concurrent requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=per_host)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _parse_doc(doc, url, options):
+    """Parse a fetched document. Run in an executor."""
+    return Parser(doc, url, **options).to_dict()
+
+
+class _Fetcher(object):
+    """Fetches URLs in a thread pool with a shared session, limiting the number
+    of concurrent requests per host.
+    """
+
+    def __init__(self, session=None, per_host=DEFAULT_PER_HOST, concurrency=None):
+        self.per_host = per_host
+        concurrency = concurrency or DEFAULT_CONCURRENCY
+        # a session created here is closed with the fetcher
+        self._owns_session = session is None
+        if session is None:
+            session = _new_session(concurrency, per_host)
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._host_limits = {}
+
+    def _get(self, url):
+        return self.session.get(url, headers={"User-Agent": Parser.useragent})
+
+    async def fetch(self, url):
+        """Fetch a URL and return a tuple of (final URL, document)."""
+        host = urlparse(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        async with limit:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(
+                self._executor, functools.partial(self._get, url)
+            )
+        return _response_doc(data)
+
+    def close(self):
+        """Shut down the threads and close the session if it was created here"""
+        self._executor.shutdown(wait=False)
+        if self._owns_session:
+            self.session.close()
+
+
+async def _fetch_and_parse(fetcher, url, executor, options):
+    url, doc = await fetcher.fetch(url)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(_parse_doc, doc, url, options)
+    )
+
+
+async def parse_url_async(
+    url,
+    session=None,
+    executor=None,
+    html_parser=None,
+    metaformats=False,
+    filter_roots=False,
+):
+    """
+    Fetch a URL and parse it for microformats, without blocking the event loop.
+
+    Args:
+      url (string): URL of the document. Redirects are followed and the final
+        URL is used, as for `Parser(url=...)`.
+      session (requests.Session): optional, session to fetch with. By default
+        a session of the module is used, shared by the calls without one, so
+        that connections are reused between them.
+      executor (concurrent.futures.Executor): optional, executor to parse the
+        document in. Defaults to the event loop's default executor.
+      html_parser (string): optional, select a specific HTML parser. Valid options
+        from the BeautifulSoup documentation are: "html", "xml","html5", "lxml",
+        "html5lib", and "html.parser".
+      metaformats (boolean): optional, include metaformats extracted from OGP
+        and Twitter card data: https://microformats.org/wiki/metaformats
+      filter_roots (boolean or list): optional, filter root class names. Use
+        True to filter known conflicting classes, otherwise filter given list.
+
+    Return: a mf2json dict representing the structured data in the document
+
+    """
+    options = {
+        "html_parser": html_parser,
+        "metaformats": metaformats,
+        "filter_roots": filter_roots,
+    }
+    fetcher = _Fetcher(session or _default_session(), concurrency=1)
+    try:
+        return await _fetch_and_parse(fetcher, url, executor, options)
+    finally:
+        fetcher.close()
+
+
+async def parse_urls_async(
+    urls,
+    per_host=DEFAULT_PER_HOST,
+    concurrency=DEFAULT_CONCURRENCY,
+    session=None,
+    executor=None,
+    html_parser=None,
+    metaformats=False,
+    filter_roots=False,
+):
+    """
+    Fetch and parse many URLs concurrently and yield the results as they are
+    completed.
+
+    Args:
+      urls (iterable): URLs of the documents to parse.
+      per_host (int): optional, maximum number of concurrent requests to a
+        single host.
+      concurrency (int): optional, maximum number of URLs fetched or parsed
+        at once. URLs are only taken from urls when one of them is done.
+      session (requests.Session): optional, session to fetch with. By default
+        a new session is created with a connection pool sized to `per_host`,
+        and closed when all URLs are done.
+      executor (concurrent.futures.Executor): optional, executor to parse the
+        documents in, e.g. a `ProcessPoolExecutor` to parse on several cores.
+        Defaults to the event loop's default executor.
+      html_parser (string): optional, select a specific HTML parser. Valid options
+        from the BeautifulSoup documentation are: "html", "xml","html5", "lxml",
+        "html5lib", and "html.parser".
+      metaformats (boolean): optional, include metaformats extracted from OGP
+        and Twitter card data: https://microformats.org/wiki/metaformats
+      filter_roots (boolean or list): optional, filter root class names. Use
+        True to filter known conflicting classes, otherwise filter given list.
+
+    Yields:
+      tuple: (index, result) in completion order, where index is the position
+        of the URL in urls and result is a mf2json dict, or the exception
+        raised while fetching or parsing that URL.
+
+    """
+    options = {
+        "html_parser": html_parser,
+        "metaformats": metaformats,
+        "filter_roots": filter_roots,
+    }
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    fetcher = _Fetcher(session, per_host=per_host, concurrency=concurrency)
+
+    async def run(index, url):
+        try:
+            result = await _fetch_and_parse(fetcher, url, executor, options)
+        except Exception as e:
+            result = e
+        return index, result
+
+    urls = enumerate(urls)
+    pending = set()
+    try:
+        while True:
+            # keep at most concurrency URLs in progress
+            for index, url in itertools.islice(urls, concurrency - len(pending)):
+                pending.add(asyncio.ensure_future(run(index, url)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        fetcher.close()
@@ -1,36 +1,20 @@
 """Looks for classic microformats class names and augments them with
 microformats2 names. Ported and adapted from php-mf2.
 
-NOTE: functions in this module modify DOM elements. For this copies of the source tree are created, but BS4's copy
-function doesn't create copy of all sub-elements: most notably, the values of the `attrs` dictionary are not copied,
-and thus reference the same list objects as in the original tree. Thus, special care has to be taken when modifying the
-tree so changes do not accidentally propagate.
-
-a) adding new/removing children is safe
-
-b) attributes (e.g. `class`) should only by changed by assigning a *copy* of the original value, not by modifying it in
-place.
-
-DO NOT:
-child_classes = child.get('class', [])
-child_classes.append('p-kittens')
-child['class'] = child_classes
-
-DO:
-child_classes = child.get('class', [])[:] ###<------- COPY CREATED HERE
-child_classes.append('p-kittens')
-child['class'] = child_classes
+NOTE: functions in this module do not modify DOM elements, nor copy them. The
+microformats2 class names they add are recorded in an Overlay, a DOM adapter
+that gives them instead of the class names of the elements, and the elements
+are parsed through it. rel=tag links are turned into p-category elements that
+only the overlay has.
 
 """
 
 import codecs
-import copy
+import itertools
 import json
 import os
 from urllib.parse import unquote
 
-import bs4
-
 from . import mf2_classes
 from .dom_helpers import get_children
 from .mf_helpers import unordered_list
@@ -38,6 +22,9 @@ from .mf_helpers import unordered_list
 # Classic map
 _CLASSIC_MAP = {}
 
+# an attribute the overlay did not set
+_MISSING = object()
+
 # populate backcompat rules from JSON files
 
 _RULES_LOC = os.path.join(
@@ -53,75 +40,91 @@ for filename in os.listdir(_RULES_LOC):
     _CLASSIC_MAP[root] = rules
 
 
+class _Translation(object):
+    """The microformats2 class names of an element while the rules are applied
+    to it, and what else the rules record about it.
+
+    Attributes:
+      classes (list): the class names
+      rels (list): the rel values, without tag once it was made a
+        p-category, or None without a rel attribute
+      category: the value of the p-category element to add before the
+        element, then the element once recorded in the overlay, or None
+      original (list): the class names the element had before an e-* class
+        name was added, or None
+    """
+
+    __slots__ = ("classes", "rels", "category", "original")
+
+    def __init__(self, classes, rels):
+        self.classes = classes
+        self.rels = rels
+        self.category = None
+        self.original = None
+
+
 def _make_classes_rule(old_classes, new_classes):
     """Builds a rule for augmenting an mf1 class with its mf2
     equivalent(s).
     """
 
-    def f(child, **kwargs):
-        child_original = child.original or copy.copy(child)
-        child_classes = child.get("class", [])[:]
+    def f(child, translation, dom):
+        child_classes = translation.classes
         if all(cl in child_classes for cl in old_classes):
-            child_classes.extend([cl for cl in new_classes if cl not in child_classes])
-            child["class"] = child_classes
+            added = [cl for cl in new_classes if cl not in child_classes]
+
+            # if any new class is e-* keep the classes before it, to parse
+            # the originally authored HTML with them
+            if translation.original is None and mf2_classes.has_embedded_class(
+                child_classes + added
+            ):
+                translation.original = list(child_classes)
 
-            # if any new class is e-* attach original to parse originally authored HTML
-            if mf2_classes.has_embedded_class(child_classes) and child.original is None:
-                child.original = child_original
+            child_classes.extend(added)
 
     return f
 
 
-def _rel_tag_to_category_rule(child, html_parser, **kwargs):
+def _rel_tag_to_category_rule(child, translation, dom):
     """rel=tag converts to p-category using a special transformation (the
-    category becomes the tag href's last path segment). This rule adds a new data tag so that
-    <a rel="tag" href="http://example.com/tags/cat"></a> gets replaced with
+    category becomes the tag href's last path segment). This rule records a
+    new data tag so that
+    <a rel="tag" href="http://example.com/tags/cat"></a> gets preceded by
     <data class="p-category" value="cat"></data>
     """
 
-    href = child.get("href", "")
-    rels = child.get("rel", [])
+    href = dom.get_attr(child, "href", "")
+    rels = translation.rels or []
     if "tag" in rels and href:
         segments = [seg for seg in href.split("/") if seg]
         if segments:
-            if html_parser:
-                soup = bs4.BeautifulSoup("", features=html_parser)
-            else:
-                soup = bs4.BeautifulSoup("")
-
-            data = soup.new_tag("data")
             # this does not use what's given in the JSON
             # but that is not a problem currently
-            # use mf1 class so it doesn't get removed later
-            data["class"] = ["p-category"]
-            data["value"] = unquote(segments[-1])
-            child.insert_before(data)
+            translation.category = unquote(segments[-1])
             # remove tag from rels to avoid repeat
-            # new list created, original not modifed -> safe on incomplete copy
-            child["rel"] = [r for r in rels if r != "tag"]
+            translation.rels = [r for r in rels if r != "tag"]
 
 
-def _make_rels_rule(old_rels, new_classes, html_parser):
+def _make_rels_rule(old_rels, new_classes):
     """Builds a rule for augmenting an mf1 rel with its mf2 class equivalent(s)."""
 
     # need to special case rel=tag as it operates differently
 
-    def f(child, **kwargs):
-        child_rels = child.get("rel", [])
-        child_classes = child.get("class", [])[:]
+    def f(child, translation, dom):
+        child_rels = translation.rels or []
+        child_classes = translation.classes
         if all(r in child_rels for r in old_rels):
             if "tag" in old_rels:
-                _rel_tag_to_category_rule(child, html_parser, **kwargs)
+                _rel_tag_to_category_rule(child, translation, dom)
             else:
                 child_classes.extend(
                     [cl for cl in new_classes if cl not in child_classes]
                 )
-                child["class"] = child_classes
 
     return f
 
 
-def _get_rules(old_root, html_parser):
+def _get_rules(old_root):
     """for given mf1 root get the rules as a list of functions to act on children"""
 
     class_rules = [
@@ -131,7 +134,7 @@ def _get_rules(old_root, html_parser):
         .items()
     ]
     rel_rules = [
-        _make_rels_rule(old_rels.split(), new_classes, html_parser)
+        _make_rels_rule(old_rels.split(), new_classes)
         for old_rels, new_classes in _CLASSIC_MAP[old_root].get("rels", {}).items()
     ]
 
@@ -143,43 +146,212 @@ def root(classes):
     return unordered_list([c for c in classes if c in _CLASSIC_MAP])
 
 
-def apply_rules(el, html_parser, filtered_roots):
-    """add modern classnames for older mf1 classnames
+def root_types(old_roots):
+    """get the mf2 root classnames equivalent to the given backcompat root
+    classnames"""
+    return {t for old_root in old_roots for t in _CLASSIC_MAP[old_root]["type"]}
+
 
-    returns a copy of el and does not modify the original
+class Overlay(object):
+    """
+    A DOM adapter over another one, which gives the class names that
+    apply_rules() translated instead of those of the elements, without
+    copying or changing the DOM.
+
+    A classic microformat is parsed within a context, entered before its
+    rules are applied and left once it is parsed, which drops what was
+    recorded within it. The rules of a microformat nested in another are
+    applied on top of those of the other, and a microformat parsed again,
+    e.g. as it is the value of more than one property, is translated again.
+    Attribute values set within a context, e.g. the URLs of e-* properties
+    made absolute, are only set in the overlay.
+
+    The p-category elements made of rel=tag links are children of the
+    parents of the links, before them, but only for children(): they have no
+    text and are not part of the HTML of their parents. Everything else is
+    left to the adapter the overlay is over.
+
+    Args:
+      base (DOMAdapter): the adapter of the DOM
     """
 
-    el_copy = copy.copy(el)
+    def __init__(self, base):
+        self.base = base
+        # the values by id of element are tuples starting with the element,
+        # so that its id is not reused while it is in the overlay
+        # (element, [_Translation, ...]) in the order translated
+        self._translations = {}
+        # (element, {attribute: value})
+        self._attrs = {}
+        # (element,) for the parents of elements translated to a p-category
+        self._category_parents = {}
+        # for each context entered, what to undo when leaving it: the
+        # elements translated and (element, attribute, previous value)
+        self._contexts = []
+
+    def __getattr__(self, name):
+        # the other methods are those of the base adapter, set on the overlay
+        # so that they are only looked up once
+        value = getattr(self.base, name)
+        setattr(self, name, value)
+        return value
+
+    def _translation(self, el):
+        """The last translation of an element, or None"""
+        translations = self._translations.get(id(el))
+        if translations is None:
+            return None
+        return translations[1][-1]
+
+    def get_attr(self, el, attr, default=None):
+        attrs = self._attrs.get(id(el))
+        if attrs is not None and attr in attrs[1]:
+            return attrs[1][attr]
+        if attr == "class" or attr == "rel":
+            translation = self._translation(el)
+            if translation is not None:
+                value = translation.classes if attr == "class" else translation.rels
+                if value is not None:
+                    return value
+        return self.base.get_attr(el, attr, default)
+
+    def set_attr(self, el, attr, value):
+        if not self._contexts:
+            self.base.set_attr(el, attr, value)
+            return
+        attrs = self._attrs.setdefault(id(el), (el, {}))[1]
+        self._contexts[-1].append((el, attr, attrs.get(attr, _MISSING)))
+        attrs[attr] = value
+
+    def children(self, el):
+        if id(el) not in self._category_parents:
+            return self.base.children(el)
+        return self._children_and_categories(el)
+
+    def _children_and_categories(self, el):
+        for child in self.base.children(el):
+            translation = self._translation(child)
+            if translation is not None and translation.category is not None:
+                yield translation.category
+            yield child
+
+    def original(self, el):
+        """A copy of an element that was given an e-* class name, with the
+        class names it had before, to parse its HTML as authored, or None"""
+        translation = self._translation(el)
+        if translation is None or translation.original is None:
+            return None
+        el_copy = self.base.copy(el)
+        self.base.set_attr(el_copy, "class", translation.original)
+        return el_copy
+
+    def enter(self):
+        """Enter the context of parsing a classic microformat"""
+        self._contexts.append([])
+
+    def leave(self):
+        """Leave the context entered last, dropping what was recorded in it"""
+        for change in reversed(self._contexts.pop()):
+            if len(change) == 1:
+                el = change[0]
+                translations = self._translations[id(el)][1]
+                translations.pop()
+                if not translations:
+                    del self._translations[id(el)]
+            else:
+                el, attr, value = change
+                attrs = self._attrs[id(el)][1]
+                if value is _MISSING:
+                    del attrs[attr]
+                    if not attrs:
+                        del self._attrs[id(el)]
+                else:
+                    attrs[attr] = value
+
+    def add_translation(self, parent, el, translation):
+        """Record what the rules translated for an element, a child of parent,
+        in the context entered last"""
+        self._translations.setdefault(id(el), (el, []))[1].append(translation)
+        self._contexts[-1].append((el,))
+        if translation.category is not None:
+            translation.category = self.base.new_element(
+                el,
+                "data",
+                {"class": ["p-category"], "value": translation.category},
+            )
+            self._category_parents[id(parent)] = (parent,)
+
+
+def apply_rules(el, filtered_roots, dom):
+    """add modern classnames for older mf1 classnames to the descendants of
+    el, down to nested roots, in an overlay of the DOM
+
+    Args:
+      el: a DOM element with mf1 root classnames
+      filtered_roots (set): root class names to filter
+      dom (Overlay): the overlay to record the classnames in, through which
+        the descendants of el are then parsed
+
+    Returns:
+      set: the mf2 root classnames of el
+    """
 
     def apply_prop_rules_to_children(parent, rules):
-        for child in get_children(parent):
-            classes = child.get("class", [])[:]
+        base = dom.base
+        # with BeautifulSoup, the copies the rules were applied to before the
+        # overlay had the p-category elements inserted into the lists of
+        # children being walked, so rel=tag links were walked again, dropping
+        # the categories of the rel=tag links within them. this is kept so
+        # that the results are the same
+        walk_again = base.name == "bs4"
+        # the categories of the links walked again, by id
+        categories = {}
+        # (element, iterator over its children) of the elements being walked,
+        # instead of recursion so that deeply nested elements do not exceed
+        # the recursion limit
+        stack = [(parent, get_children(parent, dom=base))]
+        while stack:
+            parent, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+
+            classes = dom.get_attr(child, "class", [])
             # find existing mf2 properties if any and delete them
-            child["class"] = [
-                cl for cl in classes if not mf2_classes.is_property_class(cl)
-            ]
+            translation = _Translation(
+                [cl for cl in classes if not mf2_classes.is_property_class(cl)],
+                dom.get_attr(child, "rel"),
+            )
 
             # apply rules to change mf1 to mf2
             for rule in rules:
-                rule(child)
+                rule(child, translation, dom)
+
+            if walk_again and translation.category is not None:
+                categories[id(child)] = translation.category
+                stack[-1] = (parent, itertools.chain((child,), children))
+            elif id(child) in categories:
+                translation.category = categories.pop(id(child))
+
+            dom.add_translation(parent, child, translation)
 
-            # recurse if it's not a nested mf1 or mf2 root
+            # descend if it's not a nested mf1 or mf2 root
             if not (mf2_classes.root(classes, filtered_roots) or root(classes)):
-                apply_prop_rules_to_children(child, rules)
+                stack.append((child, get_children(child, dom=base)))
 
     # add mf2 root equivalent
-    classes = el_copy.get("class", [])[:]
+    classes = list(dom.get_attr(el, "class", []))
     old_roots = root(classes)
     for old_root in old_roots:
         new_roots = _CLASSIC_MAP[old_root]["type"]
         classes.extend(new_roots)
-    el_copy["class"] = classes
 
     # add mf2 prop equivalent to descendents and remove existing mf2 props
     rules = []
     for old_root in old_roots:
-        rules.extend(_get_rules(old_root, html_parser))
+        rules.extend(_get_rules(old_root))
 
-    apply_prop_rules_to_children(el_copy, rules)
+    apply_prop_rules_to_children(el, rules)
 
-    return el_copy
+    return mf2_classes.root(classes, filtered_roots)
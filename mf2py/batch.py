@@ -0,0 +1,205 @@
+"""Parse many documents in parallel using a pool of worker processes."""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .parser import parse
+
+# documents are grouped into chunks of roughly this many bytes (or characters)
+# before being sent to a worker, so that many small documents share the cost of
+# a round trip while a very large one is sent on its own
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def _split_doc(doc):
+    """Split a batch entry into a (doc, url) tuple."""
+    if isinstance(doc, tuple):
+        return doc
+    return doc, None
+
+
+def _doc_size(doc):
+    """Size of a document for chunking; anything without a length counts as 0
+    and is left for the worker to reject."""
+    try:
+        return len(doc)
+    except TypeError:
+        return 0
+
+
+def _chunks(docs, chunk_size):
+    """Group enumerated documents into lists of at most chunk_size bytes.
+
+    A document larger than chunk_size is always put into a chunk of its own.
+    """
+    chunk = []
+    size = 0
+    for index, doc in enumerate(docs):
+        doc, url = _split_doc(doc)
+        doc_size = _doc_size(doc)
+        if chunk and size + doc_size > chunk_size:
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append((index, doc, url))
+        size += doc_size
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(chunk, options):
+    """Parse a chunk of documents in a worker process.
+
+    Exceptions are returned in place of the result so that a failure in one
+    document does not affect the others in the chunk.
+    """
+    results = []
+    for index, doc, url in chunk:
+        try:
+            result = parse(doc, url, **options)
+        except Exception as e:
+            result = e
+        results.append((index, result))
+    return results
+
+
+def _run_in_pool(fn, tasks, workers, max_pending):
+    """Run fn(*task) for each tuple in tasks in a pool of worker processes and
+    yield (task, result, seconds) as they are completed.
+
+    result is the exception raised instead if the task or its worker failed,
+    and seconds the wall time from submitting the task to its completion. If
+    a worker dies, e.g. it is killed for running out of memory, the pool is
+    replaced and the tasks that were in flight are run again one at a time,
+    so that only the task that killed it fails.
+
+    tasks is consumed lazily, with at most max_pending tasks in flight.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers)
+    # (task, start time) by future
+    pending = {}
+
+    def restart():
+        nonlocal executor
+        executor.shutdown(wait=False)
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    def rerun(tasks):
+        """Run the tasks in flight when the pool broke one at a time"""
+        restart()
+        for task in tasks:
+            start = time.perf_counter()
+            future = executor.submit(fn, *task)
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                result = e
+                restart()
+            except Exception as e:
+                result = e
+            yield task, result, time.perf_counter() - start
+
+    def collect(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        broken = []
+        while done:
+            for future in done:
+                task, start = pending.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken.append(task)
+                    continue
+                except Exception as e:
+                    # e.g. the result could not be pickled
+                    result = e
+                yield task, result, time.perf_counter() - start
+            # once a worker died the others in flight fail with the pool
+            done = wait(pending)[0] if broken else ()
+        if broken:
+            yield from rerun(broken)
+
+    def submit(task):
+        pending[executor.submit(fn, *task)] = (task, time.perf_counter())
+
+    try:
+        for task in tasks:
+            try:
+                submit(task)
+            except BrokenProcessPool:
+                # a worker died since the tasks in flight were collected. they
+                # are run again once collected
+                restart()
+                submit(task)
+            if len(pending) >= max_pending:
+                yield from collect(FIRST_COMPLETED)
+        while pending:
+            yield from collect(FIRST_COMPLETED)
+    finally:
+        executor.shutdown()
+
+
+def parse_many(
+    docs,
+    workers=None,
+    html_parser=None,
+    metaformats=False,
+    filter_roots=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    prescan=False,
+    memory=False,
+):
+    """
+    Parse many documents in a pool of worker processes and yield the results
+    as they are completed.
+
+    Args:
+      docs (iterable): strings or bytes of content to parse, or (doc, url)
+        tuples to also give the URL of each document. It is consumed lazily
+        so it may be a generator over a very large batch.
+      workers (int): optional, number of worker processes. Defaults to the
+        number of CPUs.
+      html_parser (string): optional, select a specific HTML parser. Valid options
+        from the BeautifulSoup documentation are: "html", "xml","html5", "lxml",
+        "html5lib", and "html.parser".
+      metaformats (boolean): optional, include metaformats extracted from OGP
+        and Twitter card data: https://microformats.org/wiki/metaformats
+      filter_roots (boolean or list): optional, filter root class names. Use
+        True to filter known conflicting classes, otherwise filter given list.
+      chunk_size (int): optional, approximate number of bytes of documents to
+        send to a worker at once.
+      prescan (boolean): optional, skip parsing the documents that
+        may_contain_microformats() finds have no microformats or rel links.
+      memory (boolean): optional, add the peak and retained bytes of each
+        phase of parsing to the "debug" dict of every result, as with Parser.
+
+    Yields:
+      tuple: (index, result) in completion order, where index is the position
+        of the document in docs and result is a mf2json dict, or the exception
+        raised while parsing that document. If a worker dies while parsing a
+        chunk, the documents of that chunk get a BrokenProcessPool exception
+        and those of the other chunks are parsed again.
+
+    """
+    options = {
+        "html_parser": html_parser,
+        "metaformats": metaformats,
+        "filter_roots": filter_roots,
+        "prescan": prescan,
+        "memory": memory,
+    }
+    workers = workers or os.cpu_count() or 1
+    # bound the number of chunks in flight so docs is not consumed all at once
+    max_pending = 2 * workers
+
+    for (chunk, _), results, _ in _run_in_pool(
+        _parse_chunk,
+        ((chunk, options) for chunk in _chunks(docs, chunk_size)),
+        workers,
+        max_pending,
+    ):
+        if isinstance(results, Exception):
+            results = [(index, results) for index, _, _ in chunk]
+        yield from results
@@ -0,0 +1,153 @@
+"""Resource limits of parsing a document, for Parser's limits option."""
+
+import time
+
+# the names of the limits
+LIMITS = ("seconds", "depth", "items", "rel_urls", "html_bytes")
+
+
+class Budget(object):
+    """
+    What is left of the limits of parsing a document. Once a limit is
+    exceeded, nothing more is parsed.
+
+    Args:
+      limits (dict): the limits by name, see Parser
+
+    Attributes:
+      exceeded (string): the name of the first limit exceeded, or None
+    """
+
+    def __init__(self, limits):
+        unknown = set(limits).difference(LIMITS)
+        if unknown:
+            raise ValueError("Unknown limits: {0}".format(", ".join(sorted(unknown))))
+        seconds = limits.get("seconds")
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.max_depth = limits.get("depth")
+        self.max_items = limits.get("items")
+        self.max_rel_urls = limits.get("rel_urls")
+        self.max_html_bytes = limits.get("html_bytes")
+        self.depth = 0
+        # the deepest depth since mark() was called
+        self.peak_depth = 0
+        self.items = 0
+        self.html_bytes = 0
+        self.exceeded = None
+
+    def exceed(self, limit):
+        """Record that a limit is exceeded"""
+        if self.exceeded is None:
+            self.exceeded = limit
+
+    def check_time(self):
+        """Check that the deadline has not passed.
+
+        Returns:
+          boolean: whether parsing may go on
+        """
+        if self.exceeded is not None:
+            return False
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceed("seconds")
+            return False
+        return True
+
+    def enter(self, is_root):
+        """Account for parsing an element, one level deeper than its parent,
+        and for the microformat it is the root of if is_root. Every element
+        entered must be left with leave().
+
+        Returns:
+          boolean: whether the element may be parsed, else it is not entered
+        """
+        if not self.check_time():
+            return False
+        if self.max_depth is not None and self.depth >= self.max_depth:
+            self.exceed("depth")
+            return False
+        if is_root:
+            if self.max_items is not None and self.items >= self.max_items:
+                self.exceed("items")
+                return False
+            self.items += 1
+        self.depth += 1
+        if self.depth > self.peak_depth:
+            self.peak_depth = self.depth
+        return True
+
+    def leave(self):
+        """Account for having parsed an element"""
+        self.depth -= 1
+
+    def add_html(self, html):
+        """Account for the HTML of an e-* property.
+
+        Returns:
+          boolean: whether the property may be added to the result
+        """
+        # counted without a limit too, for used()
+        self.html_bytes += len(html.encode("utf-8", "surrogatepass"))
+        if self.max_html_bytes is not None and self.html_bytes > self.max_html_bytes:
+            self.exceed("html_bytes")
+            return False
+        return True
+
+    def add_rel_url(self, count):
+        """Check that another rel URL can be added to the count of them.
+
+        Returns:
+          boolean: whether parsing the rels may go on
+        """
+        if not self.check_time():
+            return False
+        if self.max_rel_urls is not None and count >= self.max_rel_urls:
+            self.exceed("rel_urls")
+            return False
+        return True
+
+    def mark(self):
+        """Start measuring what parsing uses from now on.
+
+        Returns:
+          tuple: the mark to give to used()
+        """
+        self.peak_depth = self.depth
+        return (self.depth, self.items, self.html_bytes)
+
+    def used(self, mark):
+        """Get what parsing used since mark() was called.
+
+        Returns:
+          list: the depth, number of items and HTML bytes used, to reuse()
+        """
+        depth, items, html_bytes = mark
+        return [
+            self.peak_depth - depth,
+            self.items - items,
+            self.html_bytes - html_bytes,
+        ]
+
+    def reuse(self, used):
+        """Account for reusing the result of parsing that used what used()
+        gave, if it is within the limits.
+
+        Returns:
+          boolean: whether it is, else nothing is accounted for and it is up
+            to parsing again to stop where a limit is exceeded
+        """
+        if not self.check_time():
+            return False
+        depth, items, html_bytes = used
+        if (
+            (self.max_depth is not None and self.depth + depth > self.max_depth)
+            or (self.max_items is not None and self.items + items > self.max_items)
+            or (
+                self.max_html_bytes is not None
+                and self.html_bytes + html_bytes > self.max_html_bytes
+            )
+        ):
+            return False
+        self.items += items
+        self.html_bytes += html_bytes
+        return True
@@ -0,0 +1,324 @@
+"""Cache of parse results keyed by the content of the document, so that
+documents that are fetched again unchanged are not parsed again.
+
+Results are kept in a bounded in-memory LRU and optionally in an SQLite
+database on disk, which can be shared by several processes.
+
+SubtreeMemo does the same for the top-level microformats of documents, so that
+microformats repeated on many pages, e.g. the h-card of a site's sidebar, are
+only parsed once.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import requests
+
+from .parser import Parser, _response_doc
+from .version import __version__
+
+DEFAULT_MAXSIZE = 128
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "disk_hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+MemoInfo = collections.namedtuple(
+    "MemoInfo", ["hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+def _option_key(value):
+    """Make an option value JSON-serializable and independent of order"""
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    return sorted(value)
+
+
+def _settings_key(url, options):
+    """Get a string for the URL of a document and the options it is parsed
+    with, which is the same if and only if the result is"""
+    settings = {
+        name: _option_key(value)
+        for name, value in options.items()
+        # prescan does not change the result
+        if name != "prescan"
+    }
+    settings["url"] = url
+    settings["version"] = __version__
+    return json.dumps(settings, sort_keys=True)
+
+
+class ResultCache(object):
+    """
+    Cache of mf2json results in front of Parser, keyed by a hash of the
+    document and of the options that affect the result.
+
+    Example:
+      cache = ResultCache(maxsize=1000, path="mf2py-cache.sqlite")
+      mf2json = cache.parse(doc, url="https://example.com/")
+
+    Args:
+      maxsize (int): optional, maximum number of results kept in memory.
+      path (string): optional, path of an SQLite database to also keep the
+        results in. It is created if needed and can be shared by several
+        processes.
+
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # JSON text of the results by key, least recently used first
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def parse(
+        self,
+        doc=None,
+        url=None,
+        html_parser=None,
+        expose_dom=False,
+        metaformats=False,
+        filter_roots=False,
+        types=None,
+        properties=None,
+        dom_backend=None,
+        prescan=False,
+    ):
+        """
+        Parse a document or URL like `mf2py.parse()`, returning the cached
+        result if the same document was parsed with the same options before.
+
+        The result is a new dict on every call, equal to the one a fresh
+        Parser gives. Results with expose_dom=True and documents that are
+        already parsed, e.g. BeautifulSoup documents, are never cached.
+
+        Args: see `mf2py.parse()`
+
+        Return: a mf2json dict representing the structured data in the document
+
+        """
+        options = {
+            "html_parser": html_parser,
+            "expose_dom": expose_dom,
+            "metaformats": metaformats,
+            "filter_roots": filter_roots,
+            "types": types,
+            "properties": properties,
+            "dom_backend": dom_backend,
+            "prescan": prescan,
+        }
+        if doc is None and url is not None:
+            data = requests.get(url, headers={"User-Agent": Parser.useragent})
+            url, doc = _response_doc(data)
+        elif hasattr(doc, "read"):
+            doc = doc.read()
+
+        if expose_dom or not isinstance(doc, (str, bytes)):
+            return Parser(doc, url, **options).to_dict()
+
+        key = self._key(doc, url, options)
+        result = self._get(key)
+        if result is None:
+            with self._lock:
+                self.misses += 1
+            result = json.dumps(Parser(doc, url, **options).to_dict())
+            self._set(key, result)
+        return json.loads(result)
+
+    def cache_info(self):
+        """Get the counters of the cache.
+
+        Returns:
+          CacheInfo: named tuple of (hits, disk_hits, misses, evictions,
+            maxsize, currsize), where hits include disk_hits and currsize is
+            the number of results in memory
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.disk_hits,
+                self.misses,
+                self.evictions,
+                self.maxsize,
+                len(self._results),
+            )
+
+    def clear(self):
+        """Remove all the results from memory and disk and reset the counters"""
+        with self._lock:
+            self._results.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+            db = self._connect()
+            if db is not None:
+                with db:
+                    db.execute("DELETE FROM results")
+
+    def _key(self, doc, url, options):
+        """Hash a document, its URL and the options that affect its result"""
+        digest = hashlib.sha256()
+        # bytes may be decoded differently from the same str
+        if isinstance(doc, bytes):
+            digest.update(b"b")
+            digest.update(doc)
+        else:
+            digest.update(b"s")
+            digest.update(doc.encode("utf-8", "surrogatepass"))
+        digest.update(_settings_key(url, options).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get(self, key):
+        """Get the JSON text of a result from memory or disk, or None"""
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT result FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def _set(self, key, result):
+        with self._lock:
+            self._remember(key, result)
+            db = self._connect()
+            if db is not None:
+                with db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO results (key, result) VALUES (?, ?)",
+                        (key, result),
+                    )
+
+    def _remember(self, key, result):
+        """Keep a result in memory, evicting the least recently used ones"""
+        if self.maxsize <= 0:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+    def _connect(self):
+        """Get the connection to the database of this process, if any"""
+        if self.path is None:
+            return None
+        # connections can not be used after a fork
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT)"
+            )
+            self._db_pid = os.getpid()
+        return self._db
+
+
+class SubtreeMemo(object):
+    """
+    Memo of the top-level microformats parsed by Parser, keyed by a hash of
+    the HTML of their root element and of everything else their result
+    depends on: the base URL, the document language and the options. It can
+    be shared by the parsers of many documents, e.g. all the pages of a site.
+
+    Example:
+      memo = SubtreeMemo(maxsize=1000)
+      for doc in docs:
+          mf2json = mf2py.parse(doc, memo=memo)
+      print(memo.hit_rate)
+
+    Args:
+      maxsize (int): optional, maximum number of microformats kept, least
+        recently used first out.
+
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # JSON text of the microformats by key, least recently used first
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        """float: the fraction of lookups that were hits, 0 if none"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def cache_info(self):
+        """Get the counters of the memo.
+
+        Returns:
+          MemoInfo: named tuple of (hits, misses, evictions, maxsize, currsize)
+        """
+        with self._lock:
+            return MemoInfo(
+                self.hits, self.misses, self.evictions, self.maxsize, len(self._items)
+            )
+
+    def clear(self):
+        """Remove all the microformats and reset the counters"""
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def key(self, html, settings):
+        """Hash the HTML of a root element and the settings it is parsed with
+
+        Args:
+          html (string): the HTML serialization of the root element
+          settings (dict): JSON-serializable values of everything else the
+            result depends on
+        """
+        digest = hashlib.sha256(html.encode("utf-8", "surrogatepass"))
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Get a new copy of a memoized microformat, or None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        return json.loads(item)
+
+    def set(self, key, item):
+        """Memoize a microformat"""
+        if self.maxsize <= 0:
+            return
+        item = json.dumps(item)
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
@@ -0,0 +1,232 @@
+"""Command-line tool to parse many documents in parallel, writing one JSON
+record per document.
+
+Usage: python -m mf2py [options] [URL, file or directory ...]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+
+from .batch import _run_in_pool
+from .parser import Parser
+from .version import __version__
+
+DEFAULT_GLOBS = ("*.html", "*.htm")
+
+
+def _is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _expand(sources, globs):
+    """Yield the URLs and file paths to parse, walking directories for the
+    files that match one of globs"""
+    for source in sources:
+        if not _is_url(source) and os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if any(fnmatch.fnmatch(name, pattern) for pattern in globs):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+
+def _read_sources(fp):
+    """Yield the non-empty lines of a newline-delimited list of sources"""
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _error(e):
+    """The error of a record for an exception"""
+    return "{0}: {1}".format(type(e).__name__, e)
+
+
+def _process(source, options):
+    """Parse a URL or file in a worker and return its record.
+
+    Exceptions are recorded in place of the result so that a failure in one
+    document does not stop the others.
+    """
+    start = time.perf_counter()
+    record = {"source": source}
+    try:
+        if _is_url(source):
+            result = Parser(url=source, **options).to_dict()
+        else:
+            with open(source, "rb") as fp:
+                result = Parser(fp.read(), **options).to_dict()
+    except Exception as e:
+        record["error"] = _error(e)
+    else:
+        record["result"] = result
+    record["time"] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def _run(sources, options, workers):
+    """Yield the records of the sources as they are completed"""
+    if workers == 1:
+        for source in sources:
+            yield _process(source, options)
+        return
+
+    # bound the number of documents in flight so sources is consumed lazily
+    for (source, _), record, seconds in _run_in_pool(
+        _process, ((source, options) for source in sources), workers, 4 * workers
+    ):
+        if isinstance(record, Exception):
+            # the worker itself failed, e.g. it was killed or the record could
+            # not be pickled. the others in flight were run again
+            record = {
+                "source": source,
+                "error": _error(record),
+                "time": round(seconds, 6),
+            }
+        yield record
+
+
+def _split(values):
+    """Join repeated and comma-separated option values into a list"""
+    if values is None:
+        return None
+    return [value for values in values for value in values.split(",") if value]
+
+
+def _argument_parser():
+    parser = argparse.ArgumentParser(
+        prog="mf2py",
+        description="Parse microformats from URLs, files and directories in "
+        "parallel and write one JSON record per document, with its result or "
+        "error and the time it took, as newline-delimited JSON.",
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        metavar="SOURCE",
+        help="URL, file or directory to parse. Directories are walked for the "
+        "files matching --glob. With no SOURCE or -, sources are read from "
+        "stdin, one per line.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="file to write the records to, appended to when resuming from "
+        "--checkpoint and overwritten otherwise. Defaults to stdout.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="file listing the sources already done. They are skipped, and "
+        "every source is added once its record is written, so an interrupted "
+        "run can be resumed by running it again.",
+    )
+    parser.add_argument(
+        "--glob",
+        action="append",
+        help="pattern of the file names to parse in directories, can be "
+        "repeated. Defaults to *.html and *.htm.",
+    )
+    parser.add_argument("--html-parser", help="the BeautifulSoup HTML parser")
+    parser.add_argument(
+        "--dom-backend", choices=("bs4", "lxml", "compact"), help="the DOM backend"
+    )
+    parser.add_argument(
+        "--metaformats", action="store_true", help="include metaformats"
+    )
+    parser.add_argument(
+        "--filter-roots",
+        action="store_true",
+        help="filter known conflicting root class names",
+    )
+    parser.add_argument(
+        "--types",
+        action="append",
+        help="only parse microformats of these h-* types, comma-separated",
+    )
+    parser.add_argument(
+        "--properties",
+        action="append",
+        help="only parse these properties, comma-separated",
+    )
+    parser.add_argument(
+        "--prescan",
+        action="store_true",
+        help="skip documents that have no microformats or rel links",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="add the peak and retained bytes of each phase of parsing to the "
+        "debug dict of the results",
+    )
+    parser.add_argument(
+        "--version", action="version", version="%(prog)s " + __version__
+    )
+    return parser
+
+
+def main(argv=None):
+    """Run the command-line tool.
+
+    Args:
+      argv (list): optional, the arguments. Defaults to sys.argv[1:].
+
+    Returns:
+      int: the exit status
+    """
+    args = _argument_parser().parse_args(argv)
+    options = {
+        "html_parser": args.html_parser,
+        "dom_backend": args.dom_backend,
+        "metaformats": args.metaformats,
+        "filter_roots": args.filter_roots,
+        "types": _split(args.types),
+        "properties": _split(args.properties),
+        "prescan": args.prescan,
+        "memory": args.memory,
+    }
+
+    if not args.sources or args.sources == ["-"]:
+        sources = _read_sources(sys.stdin)
+    else:
+        sources = args.sources
+    sources = _expand(sources, args.glob or DEFAULT_GLOBS)
+
+    resuming = args.checkpoint is not None and os.path.exists(args.checkpoint)
+    if resuming:
+        with open(args.checkpoint) as fp:
+            done = set(_read_sources(fp))
+        sources = (source for source in sources if source not in done)
+
+    # the records of the sources done are kept when resuming
+    output = open(args.output, "a" if resuming else "w") if args.output else sys.stdout
+    checkpoint = open(args.checkpoint, "a") if args.checkpoint else None
+    try:
+        for record in _run(sources, options, max(args.workers, 1)):
+            output.write(json.dumps(record))
+            output.write("\n")
+            output.flush()
+            if checkpoint is not None:
+                # only once its record is safely written
+                checkpoint.write(record["source"] + "\n")
+                checkpoint.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    return 0
@@ -0,0 +1,904 @@
+"""Adapters between the parser and the DOM of the document it parses.
+
+The parser only accesses the DOM through an adapter, so that documents can be
+parsed from different tree implementations. Nodes are the native nodes of the
+backend; the adapter methods take them as their first argument.
+
+Three backends are available:
+
+* "bs4": a BeautifulSoup document, built by the BeautifulSoup tree builder
+  given by `html_parser`. This is the default.
+* "lxml": an `lxml.etree` document built directly by lxml's HTML parser,
+  without building a BeautifulSoup tree. Its results are the same as those of
+  the "bs4" backend with `html_parser="lxml"`.
+* "compact": a tree of small `__slots__` elements built from the events of
+  lxml's HTML parser, using much less memory than a BeautifulSoup tree and
+  faster to walk than an lxml tree. Its results are the same too.
+"""
+
+import abc
+import copy
+import re
+from sys import intern
+
+from bs4 import BeautifulSoup, FeatureNotFound
+from bs4.builder import builder_registry
+from bs4.dammit import EncodingDetector
+from bs4.element import Comment, Tag
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+class DOMAdapter(abc.ABC):
+    """Interface to the nodes of a DOM backend.
+
+    Elements are the only nodes passed to the adapter methods, apart from the
+    document node returned by parse(). Multi-valued attributes, i.e. "class"
+    everywhere and "rel" on a, area and link elements, are sequences of
+    strings.
+
+    Backends implement all the methods below.
+    """
+
+    #: the name of the backend, as given to Parser's dom_backend option
+    name = None
+
+    @abc.abstractmethod
+    def parse(self, doc, html_parser=None):
+        """Parse a string, bytes or file object into a document node"""
+
+    @abc.abstractmethod
+    def markup_parser(self, doc, html_parser=None):
+        """The name of the markup parser that built a document, or None. If
+        doc is None, that of the markup parser parse() would use with
+        html_parser"""
+
+    @abc.abstractmethod
+    def is_node(self, doc):
+        """Check if doc is a document or element node of this backend"""
+
+    @abc.abstractmethod
+    def tag_name(self, el):
+        """The lowercase tag name of an element"""
+
+    @abc.abstractmethod
+    def children(self, el):
+        """An iterator over the child elements of an element or document"""
+
+    @abc.abstractmethod
+    def descendants(self, el):
+        """An iterator over the descendant elements of an element or document,
+        in document order"""
+
+    @abc.abstractmethod
+    def contents(self, el):
+        """An iterator over the child elements and text strings of an element,
+        in document order. Comments are skipped."""
+
+    @abc.abstractmethod
+    def contains(self, ancestor, el):
+        """Check if el is a descendant of ancestor"""
+
+    @abc.abstractmethod
+    def get_attr(self, el, attr, default=None):
+        """The value of an attribute of an element or default if not present.
+        The document node has no attributes."""
+
+    @abc.abstractmethod
+    def has_attr(self, el, attr):
+        """Check if an element has an attribute"""
+
+    @abc.abstractmethod
+    def set_attr(self, el, attr, value):
+        """Set the value of an attribute of an element"""
+
+    @abc.abstractmethod
+    def text(self, el):
+        """The text of all the descendant strings of an element"""
+
+    @abc.abstractmethod
+    def inner_html(self, el):
+        """The HTML serialization of the contents of an element"""
+
+    @abc.abstractmethod
+    def outer_html(self, el):
+        """The HTML serialization of an element, including its own tags"""
+
+    @abc.abstractmethod
+    def copy(self, el):
+        """A deep copy of an element, detached from the document"""
+
+    @abc.abstractmethod
+    def remove(self, el):
+        """Remove an element and its descendants from the document"""
+
+    @abc.abstractmethod
+    def new_element(self, el, tag_name, attrs):
+        """A new empty element for the document of an element, which is not
+        inserted in it"""
+
+
+class BS4Adapter(DOMAdapter):
+    """Adapter for BeautifulSoup documents"""
+
+    name = "bs4"
+
+    def parse(self, doc, html_parser=None):
+        try:
+            # try the user-given html parser or default html5lib
+            soup = BeautifulSoup(doc, features=html_parser or "html5lib")
+        except FeatureNotFound:
+            # maybe raise a warning?
+            # else switch to default use
+            soup = BeautifulSoup(doc)
+        return soup
+
+    def markup_parser(self, doc, html_parser=None):
+        # uses builder.NAME from BeautifulSoup
+        if doc is None:
+            # the builder BeautifulSoup finds in parse(), or its default
+            builder = builder_registry.lookup(
+                html_parser or "html5lib"
+            ) or builder_registry.lookup(*BeautifulSoup.DEFAULT_BUILDER_FEATURES)
+            return builder.NAME if builder is not None else None
+        if isinstance(doc, BeautifulSoup) and doc.builder is not None:
+            return doc.builder.NAME
+
+    def is_node(self, doc):
+        return isinstance(doc, Tag)
+
+    def tag_name(self, el):
+        return el.name
+
+    def children(self, el):
+        return (child for child in el.contents if isinstance(child, Tag))
+
+    def descendants(self, el):
+        return el.find_all()
+
+    def contents(self, el):
+        return (child for child in el.contents if not isinstance(child, Comment))
+
+    def contains(self, ancestor, el):
+        return any(parent is ancestor for parent in el.parents)
+
+    def get_attr(self, el, attr, default=None):
+        return el.get(attr, default)
+
+    def has_attr(self, el, attr):
+        return attr in el.attrs
+
+    def set_attr(self, el, attr, value):
+        el[attr] = value
+
+    def text(self, el):
+        return el.get_text()
+
+    def inner_html(self, el):
+        return el.decode_contents()
+
+    def outer_html(self, el):
+        return el.decode()
+
+    def copy(self, el):
+        return copy.copy(el)
+
+    def remove(self, el):
+        el.extract()
+
+    def new_element(self, el, tag_name, attrs):
+        return Tag(name=tag_name, attrs=attrs)
+
+
+# the bs4 tree builders collapse strings that are only made of these
+# characters to a single space or newline, outside of _PRESERVE_WHITESPACE_TAGS
+_ASCII_SPACES = " \n\t\x0c\r"
+_PRESERVE_WHITESPACE_TAGS = frozenset(("pre", "textarea"))
+# elements whose strings bs4 only includes in the text of the element itself
+_STRING_CONTAINER_TAGS = frozenset(("rt", "rp", "style", "script", "template"))
+# elements whose text bs4 does not escape when serializing
+_CDATA_CONTAINING_TAGS = frozenset(("script", "style"))
+_VOID_TAGS = frozenset(
+    (
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+        "basefont",
+        "bgsound",
+        "command",
+        "frame",
+        "image",
+        "isindex",
+        "nextid",
+        "spacer",
+    )
+)
+_LIST_ATTRS = {
+    "*": frozenset(("class", "accesskey", "dropzone")),
+    "a": frozenset(("rel", "rev")),
+    "link": frozenset(("rel", "rev")),
+    "area": frozenset(("rel",)),
+    "td": frozenset(("headers",)),
+    "th": frozenset(("headers",)),
+    "form": frozenset(("accept-charset",)),
+    "object": frozenset(("archive",)),
+    "icon": frozenset(("sizes",)),
+    "iframe": frozenset(("sandbox",)),
+    "output": frozenset(("for",)),
+}
+# libxml2 gives these attributes their name as value when they have none,
+# where bs4 gets an empty value
+_BOOLEAN_ATTRS = frozenset(
+    (
+        "checked",
+        "compact",
+        "declare",
+        "defer",
+        "disabled",
+        "ismap",
+        "multiple",
+        "nohref",
+        "noresize",
+        "noshade",
+        "nowrap",
+        "readonly",
+        "selected",
+    )
+)
+_ESCAPE_RE = re.compile(r"[&<>]")
+_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;"}
+
+
+def _collapse(text, preserve_whitespace):
+    """Collapse a whitespace-only string as the bs4 tree builders do"""
+    if preserve_whitespace or text.strip(_ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _escape(text):
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], text)
+
+
+def _quote_attr(value):
+    value = _escape(value)
+    if '"' in value:
+        if "'" in value:
+            return '"%s"' % value.replace('"', "&quot;")
+        return "'%s'" % value
+    return '"%s"' % value
+
+
+def _is_list_attr(tag_name, attr):
+    return attr in _LIST_ATTRS["*"] or attr in _LIST_ATTRS.get(tag_name, ())
+
+
+def _start_tag(tag_name, attrs):
+    """Serialize a start tag as bs4 does, given (name, value) attribute pairs
+    where the values of multi-valued attributes may be sequences"""
+    start = [tag_name]
+    # bs4 sorts attributes by name
+    for attr, value in sorted(attrs):
+        if not isinstance(value, str):
+            value = " ".join(value)
+        elif _is_list_attr(tag_name, attr):
+            value = " ".join(value.split())
+        start.append("%s=%s" % (attr, _quote_attr(value)))
+    return "<%s>" % " ".join(start)
+
+
+def _read(doc):
+    """Read a document from a string, bytes or file object as a string"""
+    if hasattr(doc, "read"):
+        doc = doc.read()
+    if isinstance(doc, bytes):
+        # find the encoding the same way as BeautifulSoup
+        for encoding in EncodingDetector(doc, is_html=True).encodings:
+            try:
+                return doc.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                pass
+        return doc.decode("utf-8", "replace")
+    return doc
+
+
+def _html_parser(target=None):
+    """A new lxml HTML parser, with the same options for all backends. Without
+    huge_tree, lxml silently truncates deep trees and long attribute values."""
+    return etree.HTMLParser(target=target, recover=True, huge_tree=True)
+
+
+# even with huge_tree, the trees that lxml's HTML parser builds itself stop at
+# this depth, without an error, dropping the elements nested deeper. the
+# events given to parser targets are not limited
+_LXML_MAX_DEPTH = 2048
+_lxml_deepest = None
+
+
+def _lxml_truncated(root):
+    """Whether an element of a tree built by lxml's HTML parser may have had
+    elements nested within it dropped for being too deep"""
+    global _lxml_deepest
+    if _lxml_deepest is None:
+        _lxml_deepest = etree.XPath(
+            "boolean(/{0})".format("/".join(["*"] * (_LXML_MAX_DEPTH - 1)))
+        )
+    return _lxml_deepest(root)
+
+
+def _lxml_start_tag(el):
+    """Serialize the start tag of an lxml element as bs4 does"""
+    return _start_tag(
+        el.tag,
+        (
+            # lxml gives boolean attributes their name as value
+            (attr, "" if attr == value and attr in _BOOLEAN_ATTRS else value)
+            for attr, value in el.items()
+        ),
+    )
+
+
+class LxmlAdapter(DOMAdapter):
+    """Adapter for documents parsed with lxml's HTML parser.
+
+    The document node is an `lxml.etree._ElementTree`. The results of text()
+    and inner_html() are normalized the same way as BeautifulSoup does for
+    documents it builds with lxml. Documents nested deeper than the trees lxml
+    builds itself are built from the events of its parser, like BeautifulSoup
+    does, so that no element is dropped.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("the lxml DOM backend requires lxml")
+
+    def parse(self, doc, html_parser=None):
+        doc = _read(doc)
+        parser = _html_parser()
+        parser.feed(doc)
+        root = parser.close()
+        if root is not None and _lxml_truncated(root):
+            # build the tree from the parser events instead, as BeautifulSoup
+            # does, which is slower
+            parser = _html_parser(etree.TreeBuilder(insert_comments=True))
+            parser.feed(doc)
+            root = parser.close()
+        if root is None:
+            # nothing but whitespace
+            root = parser.makeelement("html")
+        return root.getroottree()
+
+    def markup_parser(self, doc, html_parser=None):
+        return "lxml"
+
+    def is_node(self, doc):
+        return isinstance(doc, (etree._Element, etree._ElementTree))
+
+    def tag_name(self, el):
+        return el.tag
+
+    def children(self, el):
+        if isinstance(el, etree._ElementTree):
+            return iter((el.getroot(),))
+        return el.iterchildren(etree.Element)
+
+    def descendants(self, el):
+        if isinstance(el, etree._ElementTree):
+            return el.iter(etree.Element)
+        return el.iterdescendants(etree.Element)
+
+    def contents(self, el):
+        if el.text:
+            yield el.text
+        for child in el:
+            if isinstance(child.tag, str):
+                yield child
+            if child.tail:
+                yield child.tail
+
+    def contains(self, ancestor, el):
+        if isinstance(ancestor, etree._ElementTree):
+            # the root element is a child of the document
+            ancestor = ancestor.getroot()
+            if el is ancestor:
+                return True
+        return any(parent is ancestor for parent in el.iterancestors())
+
+    def get_attr(self, el, attr, default=None):
+        try:
+            value = el.get(attr)
+        except AttributeError:
+            # the document node
+            return default
+        if value is None:
+            return default
+        if attr == "class" or (attr == "rel" and el.tag in ("a", "area", "link")):
+            return value.split()
+        return value
+
+    def has_attr(self, el, attr):
+        return attr in el.attrib
+
+    def set_attr(self, el, attr, value):
+        if isinstance(value, list):
+            value = " ".join(value)
+        el.set(attr, value)
+
+    def text(self, el):
+        # like bs4, only include the strings in the same kind of string
+        # container as el, e.g. no <script> text unless el is a <script>
+        target = el.tag if el.tag in _STRING_CONTAINER_TAGS else None
+        preserve_whitespace, container = self._context(el)
+        strings = []
+        if el.text and container == target:
+            strings.append(_collapse(el.text, preserve_whitespace))
+        # (node, whether inside a preserved whitespace tag, string container)
+        stack = [(child, preserve_whitespace, container) for child in reversed(el)]
+        while stack:
+            node, preserve_whitespace, container = stack.pop()
+            if isinstance(node, str):
+                # the tail of a closed element
+                strings.append(node)
+                continue
+            if node.tail and container == target:
+                stack.append((_collapse(node.tail, preserve_whitespace), None, None))
+            if not isinstance(node.tag, str):
+                continue
+            if node.tag in _PRESERVE_WHITESPACE_TAGS:
+                preserve_whitespace = True
+            if node.tag in _STRING_CONTAINER_TAGS:
+                container = node.tag
+            if node.text and container == target:
+                strings.append(_collapse(node.text, preserve_whitespace))
+            stack.extend(
+                (child, preserve_whitespace, container) for child in reversed(node)
+            )
+        return "".join(strings)
+
+    def inner_html(self, el):
+        parts = []
+        preserve_whitespace, _ = self._context(el)
+        escape = el.tag not in _CDATA_CONTAINING_TAGS
+        if el.text:
+            text = _collapse(el.text, preserve_whitespace)
+            parts.append(_escape(text) if escape else text)
+        # (node, whether inside a preserved whitespace tag, escape its tail)
+        stack = [(child, preserve_whitespace, escape) for child in reversed(el)]
+        while stack:
+            node, preserve_whitespace, escape = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+                continue
+            tail = None
+            if node.tail:
+                tail = _collapse(node.tail, preserve_whitespace)
+                if escape:
+                    tail = _escape(tail)
+            if node.tag is etree.Comment:
+                comment = _collapse(node.text or "", preserve_whitespace)
+                parts.append("<!--%s-->" % comment)
+            elif isinstance(node.tag, str):
+                tag_name = node.tag
+                start = _lxml_start_tag(node)
+                if tag_name in _VOID_TAGS and not len(node) and not node.text:
+                    parts.append(start[:-1] + "/>")
+                else:
+                    parts.append(start)
+                    child_preserve = (
+                        preserve_whitespace or tag_name in _PRESERVE_WHITESPACE_TAGS
+                    )
+                    child_escape = tag_name not in _CDATA_CONTAINING_TAGS
+                    if tail is not None:
+                        stack.append((tail, None, None))
+                    stack.append(("</%s>" % tag_name, None, None))
+                    stack.extend(
+                        (child, child_preserve, child_escape)
+                        for child in reversed(node)
+                    )
+                    if node.text:
+                        text = _collapse(node.text, child_preserve)
+                        parts.append(_escape(text) if child_escape else text)
+                    continue
+            if tail is not None:
+                parts.append(tail)
+        return "".join(parts)
+
+    def outer_html(self, el):
+        start = _lxml_start_tag(el)
+        if el.tag in _VOID_TAGS and not len(el) and not el.text:
+            return start[:-1] + "/>"
+        return "%s%s</%s>" % (start, self.inner_html(el), el.tag)
+
+    def copy(self, el):
+        el_copy = copy.deepcopy(el)
+        el_copy.tail = None
+        return el_copy
+
+    def remove(self, el):
+        parent = el.getparent()
+        if parent is None:
+            return
+        if el.tail:
+            previous = el.getprevious()
+            if previous is not None:
+                previous.tail = (previous.tail or "") + el.tail
+            else:
+                parent.text = (parent.text or "") + el.tail
+        parent.remove(el)
+
+    def new_element(self, el, tag_name, attrs):
+        new_el = el.makeelement(tag_name)
+        for attr, value in attrs.items():
+            self.set_attr(new_el, attr, value)
+        return new_el
+
+    def _context(self, el):
+        """Find if el or one of its ancestors preserves whitespace, and the
+        innermost string container element they are in, if any."""
+        preserve_whitespace = False
+        container = None
+        while el is not None:
+            if el.tag in _PRESERVE_WHITESPACE_TAGS:
+                preserve_whitespace = True
+            if container is None and el.tag in _STRING_CONTAINER_TAGS:
+                container = el.tag
+            el = el.getparent()
+        return preserve_whitespace, container
+
+
+class _CompactElement(object):
+    """An element of a compact DOM.
+
+    Attributes:
+      tag (string): the interned tag name
+      attrs (dict): the attributes other than class, or None if there are
+        none. rel on a, area and link elements is a tuple.
+      classes (tuple): the interned class names, or None without a class
+        attribute
+      children (list): the child elements and strings
+      parent (_CompactElement): the parent element or None
+    """
+
+    __slots__ = ("tag", "attrs", "classes", "children", "parent")
+
+    def __init__(self, tag, attrs=None, classes=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = classes
+        self.children = []
+        self.parent = parent
+
+    def __repr__(self):
+        return "<_CompactElement %s>" % self.tag
+
+
+class _CompactComment(str):
+    """A comment of a compact DOM"""
+
+    __slots__ = ()
+
+
+# the types of the strings in string containers, like bs4's Script etc.
+_CONTAINER_STRINGS = {
+    tag_name: type("_%sString" % tag_name.title(), (str,), {"__slots__": ()})
+    for tag_name in _STRING_CONTAINER_TAGS
+}
+_REL_TAGS = frozenset(("a", "area", "link"))
+
+
+def _compact_attrs(tag_name, attrib):
+    """Split the attributes of an element into (attrs, classes) for a
+    compact element"""
+    attrs = None
+    classes = None
+    for attr, value in attrib.items():
+        if attr == "class":
+            classes = tuple([intern(cl) for cl in value.split()])
+            continue
+        if attrs is None:
+            attrs = {}
+        if attr == "rel" and tag_name in _REL_TAGS:
+            value = tuple(value.split())
+        attrs[intern(attr)] = value
+    return attrs, classes
+
+
+def _compact_start_tag(el):
+    """Serialize the start tag of a compact element as bs4 does"""
+    attrs = list(el.attrs.items()) if el.attrs else []
+    if el.classes is not None:
+        attrs.append(("class", el.classes))
+    return _start_tag(el.tag, attrs)
+
+
+class _CompactBuilder(object):
+    """lxml parser target that builds a compact DOM, handling strings the
+    same way as BeautifulSoup's lxml tree builder"""
+
+    def __init__(self):
+        self.document = _CompactElement("[document]")
+        self._current = self.document
+        self._data = []
+        # the number of open elements that preserve whitespace
+        self._preserve_whitespace = 0
+        self._containers = []
+
+    def start(self, tag, attrib, nsmap=None):
+        self._end_data()
+        tag = intern(tag)
+        attrs, classes = _compact_attrs(tag, attrib)
+        el = _CompactElement(tag, attrs, classes, self._current)
+        self._current.children.append(el)
+        self._current = el
+        if tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace += 1
+        if tag in _STRING_CONTAINER_TAGS:
+            self._containers.append(el)
+
+    def end(self, tag):
+        self._end_data()
+        el = self._current
+        if el.tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace -= 1
+        if self._containers and self._containers[-1] is el:
+            self._containers.pop()
+        self._current = el.parent
+
+    def data(self, data):
+        self._data.append(data)
+
+    def comment(self, text):
+        self._end_data()
+        self._data.append(text)
+        self._end_data(_CompactComment)
+
+    def close(self):
+        self._end_data()
+        return self.document
+
+    def _end_data(self, string_type=None):
+        if not self._data:
+            return
+        text = _collapse("".join(self._data), self._preserve_whitespace)
+        self._data = []
+        if string_type is None and self._containers:
+            string_type = _CONTAINER_STRINGS[self._containers[-1].tag]
+        if string_type is not None:
+            text = string_type(text)
+        self._current.children.append(text)
+
+
+class CompactAdapter(DOMAdapter):
+    """Adapter for compact documents, built from the events of lxml's HTML
+    parser into `__slots__` elements with interned tag and class names.
+
+    The document node is an element with the tag name "[document]". Strings
+    are stored the same way as BeautifulSoup does for documents it builds
+    with lxml.
+    """
+
+    name = "compact"
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("the compact DOM backend requires lxml")
+
+    def parse(self, doc, html_parser=None):
+        parser = _html_parser(_CompactBuilder())
+        parser.feed(_read(doc))
+        return parser.close()
+
+    def markup_parser(self, doc, html_parser=None):
+        return "lxml"
+
+    def is_node(self, doc):
+        return isinstance(doc, _CompactElement)
+
+    def tag_name(self, el):
+        return el.tag
+
+    def children(self, el):
+        return [child for child in el.children if child.__class__ is _CompactElement]
+
+    def descendants(self, el):
+        stack = self.children(el)
+        stack.reverse()
+        while stack:
+            el = stack.pop()
+            yield el
+            stack.extend(
+                [
+                    child
+                    for child in reversed(el.children)
+                    if child.__class__ is _CompactElement
+                ]
+            )
+
+    def contents(self, el):
+        return [
+            child for child in el.children if child.__class__ is not _CompactComment
+        ]
+
+    def contains(self, ancestor, el):
+        el = el.parent
+        while el is not None:
+            if el is ancestor:
+                return True
+            el = el.parent
+        return False
+
+    def get_attr(self, el, attr, default=None):
+        if attr == "class":
+            classes = el.classes
+            return default if classes is None else classes
+        attrs = el.attrs
+        if attrs is None:
+            return default
+        return attrs.get(attr, default)
+
+    def has_attr(self, el, attr):
+        if attr == "class":
+            return el.classes is not None
+        return el.attrs is not None and attr in el.attrs
+
+    def set_attr(self, el, attr, value):
+        if attr == "class":
+            el.classes = tuple(value)
+            return
+        if attr == "rel" and el.tag in _REL_TAGS:
+            value = tuple(value)
+        if el.attrs is None:
+            el.attrs = {}
+        el.attrs[attr] = value
+
+    def text(self, el):
+        # like bs4, only include the strings of the same type as the strings
+        # directly in el, e.g. no <script> text unless el is a <script>
+        string_type = _CONTAINER_STRINGS.get(el.tag, str)
+        strings = []
+        stack = [el.children]
+        index = [0]
+        while stack:
+            children = stack[-1]
+            i = index[-1]
+            if i == len(children):
+                stack.pop()
+                index.pop()
+                continue
+            index[-1] = i + 1
+            child = children[i]
+            if child.__class__ is _CompactElement:
+                stack.append(child.children)
+                index.append(0)
+            elif child.__class__ is string_type:
+                strings.append(child)
+        return "".join(strings)
+
+    def inner_html(self, el):
+        parts = []
+        # (node, whether the text of the node is escaped)
+        escape = el.tag not in _CDATA_CONTAINING_TAGS
+        stack = [(child, escape) for child in reversed(el.children)]
+        while stack:
+            node, escape = stack.pop()
+            if node.__class__ is _CompactElement:
+                tag_name = node.tag
+                start = _compact_start_tag(node)
+                if tag_name in _VOID_TAGS and not node.children:
+                    parts.append(start[:-1] + "/>")
+                else:
+                    parts.append(start)
+                    stack.append(("</%s>" % tag_name, False))
+                    child_escape = tag_name not in _CDATA_CONTAINING_TAGS
+                    stack.extend(
+                        (child, child_escape) for child in reversed(node.children)
+                    )
+            elif node.__class__ is _CompactComment:
+                parts.append("<!--%s-->" % node)
+            elif escape:
+                parts.append(_escape(node))
+            else:
+                parts.append(node)
+        return "".join(parts)
+
+    def outer_html(self, el):
+        start = _compact_start_tag(el)
+        if el.tag in _VOID_TAGS and not el.children:
+            return start[:-1] + "/>"
+        return "%s%s</%s>" % (start, self.inner_html(el), el.tag)
+
+    def copy(self, el):
+        el_copy = _CompactElement(el.tag, el.attrs and dict(el.attrs), el.classes, None)
+        stack = [(el, el_copy)]
+        while stack:
+            original, node = stack.pop()
+            for child in original.children:
+                if child.__class__ is _CompactElement:
+                    child_copy = _CompactElement(
+                        child.tag,
+                        child.attrs and dict(child.attrs),
+                        child.classes,
+                        node,
+                    )
+                    node.children.append(child_copy)
+                    stack.append((child, child_copy))
+                else:
+                    node.children.append(child)
+        return el_copy
+
+    def remove(self, el):
+        parent = el.parent
+        if parent is None:
+            return
+        parent.children.pop(self._index(el))
+        el.parent = None
+
+    def new_element(self, el, tag_name, attrs):
+        attrs, classes = _compact_attrs(
+            tag_name,
+            {
+                attr: value if isinstance(value, str) else " ".join(value)
+                for attr, value in attrs.items()
+            },
+        )
+        return _CompactElement(intern(tag_name), attrs, classes)
+
+    def _index(self, el):
+        for i, child in enumerate(el.parent.children):
+            if child is el:
+                return i
+
+
+_ADAPTERS = {
+    BS4Adapter.name: BS4Adapter,
+    LxmlAdapter.name: LxmlAdapter,
+    CompactAdapter.name: CompactAdapter,
+}
+
+#: the default adapter, for BeautifulSoup documents
+BS4 = BS4Adapter()
+
+
+def get_adapter(dom_backend=None, doc=None):
+    """Get an adapter for a DOM backend.
+
+    Args:
+      dom_backend (string): optional, name of the backend, "bs4", "lxml" or
+        "compact". Defaults to "bs4".
+      doc (optional): a document node, used to pick the backend it belongs to
+        instead of dom_backend.
+
+    Returns:
+      DOMAdapter: a new adapter or the shared BS4 adapter.
+    """
+    if doc is not None:
+        if BS4.is_node(doc):
+            return BS4
+        if etree is not None and isinstance(doc, (etree._Element, etree._ElementTree)):
+            return LxmlAdapter()
+        if isinstance(doc, _CompactElement):
+            return CompactAdapter()
+    if dom_backend is None or dom_backend == BS4.name:
+        return BS4
+    try:
+        return _ADAPTERS[dom_backend]()
+    except KeyError:
+        raise ValueError("unknown DOM backend: %r" % (dom_backend,))
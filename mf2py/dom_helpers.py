@@ -1,11 +1,10 @@
 import re
 from urllib.parse import urljoin
 
-import bs4
-from bs4.element import Comment, NavigableString, Tag
+from .dom_adapters import BS4
 
-_whitespace_to_space_regex = re.compile(r"[\n\t\r]+")
-_reduce_spaces_regex = re.compile(r" {2,}")
+# runs of whitespace to replace by one space: single spaces are left as they are
+_collapse_whitespace_regex = re.compile(r"[ \n\t\r]{2,}|[\n\t\r]")
 
 
 def try_urljoin(base, url, allow_fragments=True):
@@ -19,24 +18,25 @@ def try_urljoin(base, url, allow_fragments=True):
     return url
 
 
-def get_attr(el, attr, check_name=None):
+def get_attr(el, attr, check_name=None, dom=BS4):
     """Get the attribute of an element if it exists.
 
     Args:
-      el (bs4.element.Tag): a DOM element
+      el: a DOM element
       attr (string): the attribute to get
       check_name (string or list, optional): a list/tuple of strings or single
         string, that must match the element's tag name
+      dom (DOMAdapter, optional): the adapter for the DOM of el
 
     Returns:
       string: the attribute's value
     """
     if check_name is None:
-        return el.get(attr)
-    if isinstance(check_name, str) and el.name == check_name:
-        return el.get(attr)
-    if isinstance(check_name, (tuple, list)) and el.name in check_name:
-        return el.get(attr)
+        return dom.get_attr(el, attr)
+    if isinstance(check_name, str) and dom.tag_name(el) == check_name:
+        return dom.get_attr(el, attr)
+    if isinstance(check_name, (tuple, list)) and dom.tag_name(el) in check_name:
+        return dom.get_attr(el, attr)
 
 
 def parse_srcset(srcset, base_url):
@@ -54,14 +54,14 @@ def parse_srcset(srcset, base_url):
     return sources
 
 
-def get_img(img, base_url):
+def get_img(img, base_url, dom=BS4):
     """Return a dictionary with src and alt/srcset if present, else just string src."""
-    src = get_attr(img, "src", check_name="img")
+    src = get_attr(img, "src", check_name="img", dom=dom)
     if src is None:
         return
     src = try_urljoin(base_url, src)
-    alt = get_attr(img, "alt", check_name="img")
-    srcset = get_attr(img, "srcset", check_name="img")
+    alt = get_attr(img, "alt", check_name="img", dom=dom)
+    srcset = get_attr(img, "srcset", check_name="img", dom=dom)
     if alt is not None or srcset:
         prop_value = {"value": src}
         if alt is not None:
@@ -73,22 +73,48 @@ def get_img(img, base_url):
         return src
 
 
-def get_children(node):
+def get_children(node, dom=BS4):
     """An iterator over the immediate children tags of this tag"""
-    for child in node.children:
-        if isinstance(child, bs4.Tag) and child.name != "template":
+    for child in dom.children(node):
+        if dom.tag_name(child) != "template":
             yield child
 
 
-def get_descendents(node):
+def get_descendents(node, dom=BS4):
     """An iterator over the all children tags (descendants) of this tag"""
-    for desc in node.descendants:
-        if isinstance(desc, bs4.Tag) and desc.name != "template":
+    for desc in dom.descendants(node):
+        if dom.tag_name(desc) != "template":
             yield desc
 
 
-def get_textContent(el, replace_img=False, img_to_src=True, base_url=""):
-    """Get the text content of an element, replacing images by alt or src"""
+def make_urls_absolute(el, base_url, dom=BS4):
+    """Resolve the URLs in the attributes of the descendants of el against
+    base_url, in place"""
+    for tag in dom.descendants(el):
+        for attr in ("href", "src", "cite", "data", "poster"):
+            value = dom.get_attr(tag, attr)
+            if value is not None:
+                dom.set_attr(tag, attr, try_urljoin(base_url, value))
+
+
+def get_textContent(
+    el, replace_img=False, img_to_src=True, base_url="", dom=BS4, cache=None
+):
+    """Get the text content of an element, replacing images by alt or src
+
+    Args:
+      el: a DOM element
+      replace_img (boolean): whether to replace images by their alt or src
+      img_to_src (boolean): whether to replace images without alt by src
+      base_url (string): the base URL to resolve the src of images against
+      dom (DOMAdapter, optional): the adapter for the DOM of el
+      cache (dict, optional): the text collected from elements by previous
+        calls, which is reused for el and its descendants and extended with
+        theirs. Only share it between calls on a DOM that does not change.
+
+    Returns:
+      string: the text content
+    """
 
     DROP_TAGS = ("script", "style", "template")
     PRE_TAGS = ("pre",)
@@ -96,108 +122,137 @@ def get_textContent(el, replace_img=False, img_to_src=True, base_url=""):
     P_BREAK_AFTER = 0
     PRE_BEFORE = 2
     PRE_AFTER = 3
-
-    def text_collection(el, replace_img=False, img_to_src=True, base_url=""):
-        # returns array of strings or integers
-
-        items = []
-
-        # drops the tags defined above and comments
-        if el.name in DROP_TAGS or isinstance(el, Comment):
-            items = []
-
-        elif isinstance(el, NavigableString):
-            value = el
-            # replace \t \n \r by space
-            value = _whitespace_to_space_regex.sub(" ", value)
-            # replace multiple spaces with one space
-            items = [_reduce_spaces_regex.sub(" ", value)]
+    P_BREAKS = (P_BREAK_BEFORE, P_BREAK_AFTER)
+
+    # the text of the element as a list of strings and integers, without
+    # empty strings, collected in one pass over the descendants in document
+    # order with a stack of iterators over their contents instead of recursion
+    results = []
+    # the elements of other variants collect different text
+    variant = (img_to_src, base_url) if replace_img else None
+    # (iterator over contents, whether they are the contents of a <p>,
+    # the element they are the contents of, where its text starts in results)
+    stack = [(iter([el]), False, None, 0)]
+    while stack:
+        el = next(stack[-1][0], None)
+        if el is None:
+            _, is_p, parent, start = stack.pop()
+            if is_p:
+                results.extend((P_BREAK_AFTER, "\n"))
+            if cache is not None and parent is not None:
+                # keep the element so that its id is not reused
+                cache[id(parent), variant] = (parent, results, start, len(results))
+            continue
+
+        # text strings, comments are already skipped by dom.contents
+        if isinstance(el, str):
+            # replace \t \n \r by space and multiple spaces with one space
+            value = _collapse_whitespace_regex.sub(" ", el)
+            if value:
+                results.append(value)
+            continue
+
+        name = dom.tag_name(el)
+        # drops the tags defined above
+        if name in DROP_TAGS:
+            pass
 
         # don't do anything special for PRE-formatted tags defined above
-        elif el.name in PRE_TAGS:
-            items = [PRE_BEFORE, el.get_text(), PRE_AFTER]
-
-        elif el.name == "img" and replace_img:
-            value = el.get("alt")
+        elif name in PRE_TAGS:
+            results.append(PRE_BEFORE)
+            value = dom.text(el)
+            if value:
+                results.append(value)
+            results.append(PRE_AFTER)
+
+        elif name == "img" and replace_img:
+            value = dom.get_attr(el, "alt")
             if value is None and img_to_src:
-                value = el.get("src")
+                value = dom.get_attr(el, "src")
                 if value is not None:
                     value = try_urljoin(base_url, value)
 
             if value is not None:
-                items = [" ", value, " "]
+                if value:
+                    results.extend((" ", value, " "))
+                else:
+                    results.extend((" ", " "))
 
-        elif el.name == "br":
-            items = ["\n"]
+        elif name == "br":
+            results.append("\n")
 
         else:
-            for child in el.children:
-                child_items = text_collection(child, replace_img, img_to_src, base_url)
-                items.extend(child_items)
-
-            if el.name == "p":
-                items = [P_BREAK_BEFORE] + items + [P_BREAK_AFTER, "\n"]
-
-        return items
-
-    results = [
-        t for t in text_collection(el, replace_img, img_to_src, base_url) if t != ""
-    ]
-
-    if results:
-        # remove <space> if it is first and last or if it is preceded by a <space> or <p> open/close
-        length = len(results)
-        for i in range(0, length):
-            if results[i] == " " and (
-                i == 0
-                or i == length - 1
-                or results[i - 1] == " "
-                or results[i - 1] in (P_BREAK_BEFORE, P_BREAK_AFTER)
-                or results[i + 1] == " "
-                or results[i + 1] in (P_BREAK_BEFORE, P_BREAK_AFTER)
-            ):
-                results[i] = ""
-
-    if results:
-        # remove leading whitespace and <int> i.e. next lines
-        while (
-            isinstance(results[0], str) and (results[0] == "" or results[0].isspace())
-        ) or results[0] in (P_BREAK_BEFORE, P_BREAK_AFTER):
-            results.pop(0)
-            if not results:
-                break
-
-    if results:
-        # remove trailing whitespace and <int> i.e. next lines
-        while (
-            isinstance(results[-1], str)
-            and (results[-1] == "" or results[-1].isspace())
-        ) or results[-1] in (P_BREAK_BEFORE, P_BREAK_AFTER):
-            results.pop(-1)
-            if not results:
-                break
+            cached = cache.get((id(el), variant)) if cache is not None else None
+            if cached is not None:
+                _, collected, start, end = cached
+                results.extend(collected[start:end])
+                continue
+            start = len(results)
+            is_p = name == "p"
+            if is_p:
+                results.append(P_BREAK_BEFORE)
+            stack.append((iter(dom.contents(el)), is_p, el, start))
+
+    if cache is not None:
+        # the list is in the cache, so work on a copy
+        results = results[:]
+
+    length = len(results)
+    # remove <space> if it is first and last or if it is preceded by a <space> or <p> open/close
+    for i in range(0, length):
+        if results[i] == " " and (
+            i == 0
+            or i == length - 1
+            or results[i - 1] == " "
+            or results[i - 1] in P_BREAKS
+            or results[i + 1] == " "
+            or results[i + 1] in P_BREAKS
+        ):
+            results[i] = ""
+
+    def is_blank(t):
+        """Whether t is whitespace or a next line to trim"""
+        if isinstance(t, str):
+            return t == "" or t.isspace()
+        return t in P_BREAKS
+
+    # remove leading and trailing whitespace and <int> i.e. next lines
+    start = 0
+    while start < length and is_blank(results[start]):
+        start += 1
+    end = length
+    while end > start and is_blank(results[end - 1]):
+        end -= 1
 
     # trim leading and trailing non-<pre> whitespace
-    if results:
-        if isinstance(results[0], str):
-            results[0] = results[0].lstrip()
-        if isinstance(results[-1], str):
-            results[-1] = results[-1].rstrip()
+    if start < end:
+        if isinstance(results[start], str):
+            results[start] = results[start].lstrip()
+        if isinstance(results[end - 1], str):
+            results[end - 1] = results[end - 1].rstrip()
 
     # create final string by concatenating replacing consecutive sequence of <int> by largest value number of \n
-    text = ""
+    text = []
     count = 0
     last = None
-    for t in results:
-        if t in (P_BREAK_BEFORE, P_BREAK_AFTER):
+    for i in range(start, end):
+        t = results[i]
+        if t in P_BREAKS:
             count = max(t, count)
         elif t == PRE_BEFORE:
-            text = text.rstrip(" ")
+            # strip the trailing spaces of the text so far
+            while text and text[-1].strip(" ") == "":
+                text.pop()
+            if text:
+                text[-1] = text[-1].rstrip(" ")
         elif not isinstance(t, int):
             if count or last == "\n":
                 t = t.lstrip(" ")
-            text = "".join([text, "\n" * count, t])
+            if count:
+                text.append("\n" * count)
+            if t:
+                text.append(t)
             count = 0
         last = t
 
-    return text
+    return "".join(text)
@@ -0,0 +1,204 @@
+"""HTTP cache for fetching documents by URL, revalidating them with their
+ETag and Last-Modified validators so that unchanged documents are neither
+downloaded nor parsed again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from .cache import _settings_key
+from .parser import Parser, _response_doc
+
+# seconds during which a host that could not be reached is not tried again
+DEFAULT_NEGATIVE_TTL = 60
+# the maximum number of remembered permanent redirects followed for a URL
+MAX_REDIRECTS = 30
+_PERMANENT_REDIRECTS = (301, 308)
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS responses (
+        url TEXT PRIMARY KEY, final_url TEXT, etag TEXT, last_modified TEXT,
+        doc BLOB)""",
+    "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, final_url TEXT, result TEXT)",
+    "CREATE INDEX IF NOT EXISTS results_final_url ON results (final_url)",
+    "CREATE TABLE IF NOT EXISTS redirects (url TEXT PRIMARY KEY, target TEXT)",
+    "CREATE TABLE IF NOT EXISTS failures (host TEXT PRIMARY KEY, expires REAL)",
+)
+
+
+def _result_key(final_url, options):
+    return hashlib.sha256(_settings_key(final_url, options).encode("utf-8")).hexdigest()
+
+
+class HTTPCache(object):
+    """
+    HTTP cache for `Parser(url=..., http_cache=...)`, stored in an SQLite
+    database on disk that can be shared by several processes.
+
+    The validators, the document and the final URL after redirects of every
+    response with an ETag or Last-Modified header are stored, and the next
+    request for the URL is made conditional with If-None-Match and
+    If-Modified-Since. When the server answers 304 Not Modified, the stored
+    document is used, and so is the stored parse result for the same options
+    so that the document is not parsed again.
+
+    Permanent redirects (301 and 308) are remembered, and a host that could
+    not be reached is not tried again for negative_ttl seconds: fetching from
+    it raises requests.ConnectionError immediately.
+
+    Example:
+      http_cache = HTTPCache("mf2py-http.sqlite")
+      mf2json = mf2py.parse(url="https://example.com/feed", http_cache=http_cache)
+
+    Args:
+      path (string): path of the SQLite database, created if needed.
+      negative_ttl (float): optional, seconds during which a host that could
+        not be reached is not tried again.
+      session (requests.Session): optional, session to fetch with.
+
+    """
+
+    def __init__(self, path, negative_ttl=DEFAULT_NEGATIVE_TTL, session=None):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def fetch(self, url, options=None):
+        """Fetch a URL, revalidating the stored response if there is one.
+
+        Args:
+          url (string): the URL to fetch
+          options (dict): optional, the Parser options that affect the result,
+            to look up the stored parse result with
+
+        Returns:
+          tuple: (final URL, document, result) where result is the stored
+            mf2json dict if the document was not modified and was parsed
+            before with the same options, otherwise None
+        """
+        with self._lock:
+            db = self._connect()
+            url = self._redirect(db, url)
+            host = urlparse(url).netloc
+            row = db.execute(
+                "SELECT expires FROM failures WHERE host = ?", (host,)
+            ).fetchone()
+            if row is not None and row[0] > time.time():
+                raise requests.ConnectionError(
+                    "{0} could not be reached recently".format(host)
+                )
+            entry = db.execute(
+                "SELECT final_url, etag, last_modified, doc FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        headers = {"User-Agent": Parser.useragent}
+        if entry is not None:
+            if entry[1] is not None:
+                headers["If-None-Match"] = entry[1]
+            if entry[2] is not None:
+                headers["If-Modified-Since"] = entry[2]
+
+        try:
+            data = self.session.get(url, headers=headers)
+        except (requests.ConnectionError, requests.Timeout):
+            with self._lock, self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO failures (host, expires) VALUES (?, ?)",
+                    (host, time.time() + self.negative_ttl),
+                )
+            raise
+
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM failures WHERE host = ?", (host,))
+            for response in data.history:
+                if response.status_code in _PERMANENT_REDIRECTS:
+                    target = urljoin(response.url, response.headers["location"])
+                    db.execute(
+                        "INSERT OR REPLACE INTO redirects (url, target) VALUES (?, ?)",
+                        (response.url, target),
+                    )
+
+            if data.status_code == 304 and entry is not None:
+                final_url, _, _, doc = entry
+                result = None
+                if options is not None:
+                    row = db.execute(
+                        "SELECT result FROM results WHERE key = ?",
+                        (_result_key(final_url, options),),
+                    ).fetchone()
+                    if row is not None:
+                        result = json.loads(row[0])
+                return final_url, doc, result
+
+            final_url, doc = _response_doc(data)
+            etag = data.headers.get("etag")
+            last_modified = data.headers.get("last-modified")
+            if entry is not None:
+                db.execute("DELETE FROM results WHERE final_url = ?", (entry[0],))
+            db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            # store the response under the URL it will be requested from next
+            url = self._redirect(db, url)
+            if data.status_code == 200 and (etag or last_modified):
+                db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (url, final_url, etag, last_modified, doc),
+                )
+        return final_url, doc, None
+
+    def store_result(self, final_url, options, result):
+        """Store the parse result of a fetched document, to be used while the
+        document is not modified.
+
+        Args:
+          final_url (string): the final URL returned by fetch()
+          options (dict): the Parser options that affect the result
+          result (dict): the mf2json dict
+        """
+        with self._lock, self._connect() as db:
+            # only documents that can be revalidated are worth it
+            row = db.execute(
+                "SELECT 1 FROM responses WHERE final_url = ?", (final_url,)
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                    (_result_key(final_url, options), final_url, json.dumps(result)),
+                )
+
+    def clear(self):
+        """Remove all the stored responses, results, redirects and failures"""
+        with self._lock, self._connect() as db:
+            for table in ("responses", "results", "redirects", "failures"):
+                db.execute("DELETE FROM {0}".format(table))
+
+    def _redirect(self, db, url):
+        """Follow the remembered permanent redirects of a URL"""
+        for _ in range(MAX_REDIRECTS):
+            row = db.execute(
+                "SELECT target FROM redirects WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                break
+            url = row[0]
+        return url
+
+    def _connect(self):
+        """Get the connection to the database of this process"""
+        # connections can not be used after a fork
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+            self._db_pid = os.getpid()
+        return self._db
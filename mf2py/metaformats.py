@@ -6,6 +6,7 @@ TODO:
 * explicit mf2 classes on meta tags
   https://microformats.org/wiki/metaformats#parsing_an_element_for_properties
 """
+from .dom_adapters import BS4
 from .dom_helpers import try_urljoin
 from .mf2_classes import filter_classes
 
@@ -43,21 +44,33 @@ URL_PROPERTIES = {
 }
 
 
-def parse(soup, url=None):
-    """Extracts and returns a metaformats item from a BeautifulSoup parse tree.
+def _find(el, tag_name, dom, attr=None, value=None):
+    """Find the first descendant of el with the given tag name, and attribute
+    value if given"""
+    for desc in dom.descendants(el):
+        if dom.tag_name(desc) == tag_name and (
+            attr is None or dom.get_attr(desc, attr) == value
+        ):
+            return desc
+
+
+def parse(soup, url=None, dom=BS4):
+    """Extracts and returns a metaformats item from a parsed document.
 
     Args:
-      soup (bs4.BeautifulSoup): parsed HTML
+      soup: the parsed HTML document
       url (str): URL of document
+      dom (DOMAdapter, optional): the adapter for the DOM of soup
 
     Returns:
       dict: mf2 item, or None if the input is not eligible for metaformats
     """
-    if not soup.head:
+    head = _find(soup, "head", dom)
+    if head is None:
         return None
 
     # Is there a microformat2 root class on the html element?
-    if filter_classes(soup.get("class", []))["h"]:
+    if filter_classes(dom.get_attr(soup, "class", []))["h"]:
         return None
 
     parsed = {"properties": {}, "source": "metaformats"}
@@ -65,14 +78,14 @@ def parse(soup, url=None):
 
     # Properties
     for attr, meta, mf2 in METAFORMAT_TO_MF2:
-        if val := soup.head.find("meta", attrs={attr: meta}):
-            if content := val.get("content"):
+        if (val := _find(head, "meta", dom, attr, meta)) is not None:
+            if content := dom.get_attr(val, "content"):
                 if meta in URL_PROPERTIES:
                     content = try_urljoin(url, content)
                 props.setdefault(mf2, [content])
 
-    if soup.head.title:
-        if text := soup.head.title.text:
+    if (title := _find(head, "title", dom)) is not None:
+        if text := dom.text(title):
             props.setdefault("name", [text])
 
     if not props:
@@ -81,8 +94,8 @@ def parse(soup, url=None):
 
     # type from OGP or default to h-entry
     parsed["type"] = ["h-entry"]
-    if ogp_type := soup.head.find("meta", property="og:type"):
-        if content := ogp_type.get("content"):
+    if (ogp_type := _find(head, "meta", dom, "property", "og:type")) is not None:
+        if content := dom.get_attr(ogp_type, "content"):
             if mf2_type := OGP_TYPE_TO_MF2.get(content.split(".")[0]):
                 parsed["type"] = [mf2_type]
 
@@ -1,4 +1,5 @@
 import re
+from sys import intern
 
 _mf2_classes_re = re.compile("(p|e|u|dt|h)-((:?[a-z0-9]+-)?[a-z]+(:?-[a-z]+)*)$")
 _mf2_roots_re = re.compile("h-(:?[a-z0-9]+-)?[a-z]+(:?-[a-z]+)*$")
@@ -18,7 +19,8 @@ def filter_classes(classes, regex=_mf2_classes_re):
             if c[0] == "h":
                 types["h"].add(c)
             else:
-                types[match.group(1)].add(match.group(2))
+                # interned as the property names of the results
+                types[match.group(1)].add(intern(match.group(2)))
     return types
 
 
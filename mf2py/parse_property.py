@@ -4,81 +4,92 @@ import re
 
 from . import value_class_pattern
 from .datetime_helpers import DATETIME_RE, TIME_RE, normalize_datetime
-from .dom_helpers import get_attr, get_img, get_textContent, try_urljoin
+from .dom_adapters import BS4
+from .dom_helpers import (
+    get_attr,
+    get_img,
+    get_textContent,
+    make_urls_absolute,
+    try_urljoin,
+)
 
 
-def text(el, base_url=""):
+def text(el, base_url="", dom=BS4, text_cache=None):
     """Process p-* properties"""
 
     # handle value-class-pattern
-    prop_value = value_class_pattern.text(el)
+    prop_value = value_class_pattern.text(el, dom=dom)
     if prop_value is not None:
         return prop_value
 
-    prop_value = get_attr(el, "title", check_name=("abbr", "link"))
+    prop_value = get_attr(el, "title", check_name=("abbr", "link"), dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "value", check_name=("data", "input"))
+        prop_value = get_attr(el, "value", check_name=("data", "input"), dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "alt", check_name=("img", "area"))
+        prop_value = get_attr(el, "alt", check_name=("img", "area"), dom=dom)
     if prop_value is None:
-        prop_value = get_textContent(el, replace_img=True, base_url=base_url)
+        prop_value = get_textContent(
+            el, replace_img=True, base_url=base_url, dom=dom, cache=text_cache
+        )
 
     return prop_value
 
 
-def url(el, base_url=""):
+def url(el, base_url="", dom=BS4, text_cache=None):
     """Process u-* properties"""
 
-    prop_value = get_attr(el, "href", check_name=("a", "area", "link"))
+    prop_value = get_attr(el, "href", check_name=("a", "area", "link"), dom=dom)
     if prop_value is None:
-        prop_value = get_img(el, base_url)
+        prop_value = get_img(el, base_url, dom=dom)
         if prop_value is not None:
             return prop_value
     if prop_value is None:
         prop_value = get_attr(
-            el, "src", check_name=("audio", "video", "source", "iframe")
+            el, "src", check_name=("audio", "video", "source", "iframe"), dom=dom
         )
     if prop_value is None:
-        prop_value = get_attr(el, "poster", check_name="video")
+        prop_value = get_attr(el, "poster", check_name="video", dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "data", check_name="object")
+        prop_value = get_attr(el, "data", check_name="object", dom=dom)
 
     if prop_value is None:
         # handle value-class-pattern
-        prop_value = value_class_pattern.text(el)
+        prop_value = value_class_pattern.text(el, dom=dom)
 
     if prop_value is None:
-        prop_value = get_attr(el, "title", check_name="abbr")
+        prop_value = get_attr(el, "title", check_name="abbr", dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "value", check_name=("data", "input"))
+        prop_value = get_attr(el, "value", check_name=("data", "input"), dom=dom)
     if prop_value is None:
-        prop_value = get_textContent(el)
+        prop_value = get_textContent(el, dom=dom, cache=text_cache)
 
     return try_urljoin(base_url, prop_value)
 
 
-def datetime(el, default_date=None):
+def datetime(el, default_date=None, dom=BS4, text_cache=None):
     """Process dt-* properties
 
     Args:
-      el (bs4.element.Tag): Tag containing the dt-value
+      el: element containing the dt-value
+      dom (DOMAdapter, optional): the adapter for the DOM of el
+      text_cache (dict, optional): the cache of get_textContent
 
     Returns:
       a tuple (string string): a tuple of two strings, (datetime, date)
     """
 
     # handle value-class-pattern
-    prop_value = value_class_pattern.datetime(el, default_date)
+    prop_value = value_class_pattern.datetime(el, default_date, dom=dom)
     if prop_value is not None:
         return prop_value
 
-    prop_value = get_attr(el, "datetime", check_name=("time", "ins", "del"))
+    prop_value = get_attr(el, "datetime", check_name=("time", "ins", "del"), dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "title", check_name="abbr")
+        prop_value = get_attr(el, "title", check_name="abbr", dom=dom)
     if prop_value is None:
-        prop_value = get_attr(el, "value", check_name=("data", "input"))
+        prop_value = get_attr(el, "value", check_name=("data", "input"), dom=dom)
     if prop_value is None:
-        prop_value = get_textContent(el)
+        prop_value = get_textContent(el, dom=dom, cache=text_cache)
 
     # if this is just a time, augment with default date
     match = re.match(TIME_RE + "$", prop_value)
@@ -94,16 +105,17 @@ def datetime(el, default_date=None):
     )
 
 
-def embedded(el, base_url, root_lang, document_lang, expose_dom):
+def embedded(
+    el, base_url, root_lang, document_lang, expose_dom, dom=BS4, text_cache=None
+):
     """Process e-* properties"""
-    for tag in el.find_all():
-        for attr in ("href", "src", "cite", "data", "poster"):
-            if attr in tag.attrs:
-                tag.attrs[attr] = try_urljoin(base_url, tag.attrs[attr])
+    make_urls_absolute(el, base_url, dom=dom)
     prop_value = {
-        "value": get_textContent(el, replace_img=True, base_url=base_url),
+        "value": get_textContent(
+            el, replace_img=True, base_url=base_url, dom=dom, cache=text_cache
+        ),
     }
-    if lang := el.attrs.get("lang"):
+    if lang := dom.get_attr(el, "lang"):
         prop_value["lang"] = lang
     elif root_lang:
         prop_value["lang"] = root_lang
@@ -112,5 +124,5 @@ def embedded(el, base_url, root_lang, document_lang, expose_dom):
     if expose_dom:
         prop_value["dom"] = el
     else:
-        prop_value["html"] = el.decode_contents().strip()
+        prop_value["html"] = dom.inner_html(el).strip()
     return prop_value
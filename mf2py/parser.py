@@ -1,24 +1,134 @@
-import copy
 import json
 from urllib.parse import urlparse
 
 import requests
-from bs4 import BeautifulSoup, FeatureNotFound
-from bs4.element import Tag
 
 from . import (
     backcompat,
+    budget,
+    dom_adapters,
     implied_properties,
     metaformats,
     mf2_classes,
     parse_property,
+    profiling,
+    rels,
+    results,
+    serialize,
     temp_fixes,
 )
-from .dom_helpers import get_attr, get_children, get_descendents, try_urljoin
-from .mf_helpers import unordered_list
+from .dom_helpers import get_attr, get_children, make_urls_absolute, try_urljoin
+from .prescan import may_contain_microformats
 from .version import __version__
 
 
+def _response_doc(data):
+    """Get the final URL and the document to parse from a requests response."""
+    # HACK: check for character encodings and use 'correct' data
+    if "charset" in data.headers.get("content-type", ""):
+        doc = data.text
+    else:
+        doc = data.content
+
+    # use the final URL after redirects
+    return data.url, doc
+
+
+def _base_url(url, base_href):
+    """Get the URL to resolve relative URLs against, given the href of the
+    document's <base> element."""
+    if base_href:
+        if urlparse(base_href).netloc:
+            # base specifies an absolute path
+            return base_href
+        elif url:
+            # base specifies a relative path
+            return try_urljoin(url, base_href)
+    return url
+
+
+def _filtered_roots(filter_roots):
+    """Get the set of root class names to filter for the filter_roots option"""
+    try:
+        return set(filter_roots)
+    except TypeError:
+        if filter_roots:
+            return mf2_classes.CONFLICTING_ROOTS_TAILWIND
+        else:
+            return []
+
+
+def _scan_document(doc, filtered_roots, types=None, dom=dom_adapters.BS4):
+    """Walk the document once to find everything the parser starts from.
+
+    Args:
+      doc: the document node, or an element
+      filtered_roots (set): root class names to filter
+      types (set, optional): only find roots of these h-* types, looking inside
+        the roots of other types for them
+      dom (DOMAdapter, optional): the adapter for the DOM of doc
+
+    Returns:
+      tuple: (base, html, roots, rel_els) where base and html are the first
+        <base> and <html> elements or None, roots is a list of
+        (element, root class names, backcompat mode) for the microformats
+        that are not nested in another, and rel_els is a list of
+        (element, inside a template) for the a, area and link elements with
+        a rel attribute, all in document order
+    """
+    base = None
+    html = None
+    roots = []
+    rel_els = []
+
+    # (element, whether roots may be found here, whether inside a template)
+    stack = [(doc, True, False)]
+    while stack:
+        el, find_roots, in_template = stack.pop()
+        if el is not doc:
+            name = dom.tag_name(el)
+            if name in ("a", "area", "link"):
+                if dom.has_attr(el, "rel"):
+                    rel_els.append((el, in_template))
+            elif name == "base":
+                if base is None:
+                    base = el
+            elif name == "html":
+                if html is None:
+                    html = el
+            elif name == "template":
+                # templates are not parsed for microformats
+                find_roots = False
+                in_template = True
+
+        if find_roots:
+            classes = dom.get_attr(el, "class", [])
+            if classes:
+                root_class_names = mf2_classes.root(classes, filtered_roots)
+                backcompat_mode = False
+                if not root_class_names:
+                    root_class_names = backcompat.root(classes)
+                    backcompat_mode = True
+                if root_class_names and (
+                    types is None
+                    or not types.isdisjoint(
+                        backcompat.root_types(root_class_names)
+                        if backcompat_mode
+                        else root_class_names
+                    )
+                ):
+                    roots.append((el, root_class_names, backcompat_mode))
+                    # nested microformats are parsed along with their parent
+                    find_roots = False
+
+        stack.extend(
+            (child, find_roots, in_template)
+            for child in reversed(list(dom.children(el)))
+        )
+
+    return base, html, roots, rel_els
+
+
 def parse(
     doc=None,
     url=None,
@@ -26,14 +136,23 @@ def parse(
     expose_dom=False,
     metaformats=False,
     filter_roots=False,
+    types=None,
+    properties=None,
+    dom_backend=None,
+    prescan=False,
+    http_cache=None,
+    memo=None,
+    profile=False,
+    memory=False,
+    limits=None,
 ):
     """
     Parse a document or URL for microformats and return a dictionary in mf2json format.
 
     Args:
-      doc (file, string or BeautifulSoup doc): file handle, text of content
-        to parse, or BeautifulSoup document. If None it will be fetched from
-        given URL.
+      doc (file, string, BeautifulSoup or lxml doc): file handle, text of
+        content to parse, or document of a DOM backend. If None it will be
+        fetched from given URL.
       url (string): URL of the file to be processed. If None it will be
         extracted from the `<base>` element of given doc.
       html_parser (string): optional, select a specific HTML parser. Valid options
@@ -44,6 +163,45 @@ def parse(
         and Twitter card data: https://microformats.org/wiki/metaformats
       filter_roots (boolean or list): optional, filter root class names. Use
         True to filter known conflicting classes, otherwise filter given list.
+      types (list): optional, only parse microformats of the given h-* types,
+        e.g. ["h-entry"]. Unlike filter_by_type, microformats of these types
+        nested inside microformats of other types are also found and returned
+        as top-level items, and the other microformats are never parsed.
+      properties (list): optional, only parse the given properties, e.g.
+        ["name", "url"], of every microformat including nested ones. The
+        other properties, explicit or implied, are never parsed.
+      dom_backend (string): optional, the DOM backend to parse the document
+        into, "bs4" (default), "lxml" to build an lxml tree directly or
+        "compact" to build a compact tree from lxml's parser events. Not
+        used if doc is already a document of a DOM backend.
+      prescan (boolean): optional, check the raw document first with
+        may_contain_microformats() and skip parsing it if it has no
+        microformats or rel links.
+      http_cache (HTTPCache): optional, HTTP cache to fetch the URL with if
+        no doc is given. If the document was not modified since it was last
+        fetched, the stored result is used without parsing it again, unless
+        there are limits.
+      memo (SubtreeMemo): optional, memo of top-level microformats to reuse
+        the results of identical ones from this or previous documents. Not
+        used with expose_dom.
+      profile (boolean): optional, add the wall time in seconds and the
+        number of calls of each phase of parsing to the "profile" of the
+        "debug" dict: "tree building", "scan", "items" (including the phases
+        run within them), "backcompat", "implied properties", "embedded",
+        "metaformats" and "rels".
+      memory (boolean): optional, trace the memory allocated by the same
+        phases with tracemalloc and add the peak and retained bytes of each
+        to the "memory" of the "debug" dict, e.g. of the tree for "tree
+        building", the translated class names for "backcompat" and the
+        result for "items" and "rels". Slows parsing down.
+      limits (dict): optional, limits of the resources parsing may use, by
+        name: "seconds" since the Parser was created, "depth" of the
+        elements in top-level microformats, number of "items" including
+        nested ones, number of "rel_urls" and "html_bytes" of e-* properties
+        in total. Once one is exceeded, parsing stops and the result has
+        what was parsed before, with the name of the limit as the "limit
+        exceeded" of the "debug" dict. The document is always parsed into a
+        tree first.
 
     Return: a mf2json dict representing the structured data in the document
 
@@ -55,6 +213,15 @@ def parse(
         expose_dom=expose_dom,
         metaformats=metaformats,
         filter_roots=filter_roots,
+        types=types,
+        properties=properties,
+        dom_backend=dom_backend,
+        prescan=prescan,
+        http_cache=http_cache,
+        memo=memo,
+        profile=profile,
+        memory=memory,
+        limits=limits,
     ).to_dict()
 
 
@@ -63,9 +230,9 @@ class Parser(object):
     Parser to parse a document or URL for microformats and output in various formats.
 
     Args:
-      doc (file, string or BeautifulSoup doc): file handle, text of content
-        to parse, or BeautifulSoup document. If None it will be fetched from
-        given URL.
+      doc (file, string, BeautifulSoup or lxml doc): file handle, text of
+        content to parse, or document of a DOM backend. If None it will be
+        fetched from given URL.
       url (string): URL of the file to be processed. If None it will be
         extracted from the `<base>` element of given doc.
       html_parser (string): optional, select a specific HTML parser. Valid options
@@ -76,6 +243,50 @@ class Parser(object):
         and Twitter card data: https://microformats.org/wiki/metaformats
       filter_roots (boolean or list): optional, filter root class names. Use
         True to filter known conflicting classes, otherwise filter given list.
+      types (list): optional, only parse microformats of the given h-* types,
+        e.g. ["h-entry"]. Unlike filter_by_type, microformats of these types
+        nested inside microformats of other types are also found and returned
+        as top-level items, and the other microformats are never parsed.
+      properties (list): optional, only parse the given properties, e.g.
+        ["name", "url"], of every microformat including nested ones. The
+        other properties, explicit or implied, are never parsed.
+      lazy (boolean): optional, only parse the items and the rels of the
+        document when they are first accessed, each independently.
+      objects (boolean): optional, give the items as `Item` objects and the
+        rel-urls as `Rel` objects, with `__slots__`, instead of mf2json
+        dicts. to_dict() and to_json() still give mf2json.
+      dom_backend (string): optional, the DOM backend to parse the document
+        into, "bs4" (default), "lxml" to build an lxml tree directly or
+        "compact" to build a compact tree from lxml's parser events. Not
+        used if doc is already a document of a DOM backend.
+      prescan (boolean): optional, check the raw document first with
+        may_contain_microformats() and skip parsing it if it has no
+        microformats or rel links.
+      http_cache (HTTPCache): optional, HTTP cache to fetch the URL with if
+        no doc is given. If the document was not modified since it was last
+        fetched, the stored result is used without parsing it again, unless
+        there are limits.
+      memo (SubtreeMemo): optional, memo of top-level microformats to reuse
+        the results of identical ones from this or previous documents. Not
+        used with expose_dom.
+      profile (boolean): optional, add the wall time in seconds and the
+        number of calls of each phase of parsing to the "profile" of the
+        "debug" dict: "tree building", "scan", "items" (including the phases
+        run within them), "backcompat", "implied properties", "embedded",
+        "metaformats" and "rels".
+      memory (boolean): optional, trace the memory allocated by the same
+        phases with tracemalloc and add the peak and retained bytes of each
+        to the "memory" of the "debug" dict, e.g. of the tree for "tree
+        building", the translated class names for "backcompat" and the
+        result for "items" and "rels". Slows parsing down.
+      limits (dict): optional, limits of the resources parsing may use, by
+        name: "seconds" since the Parser was created, "depth" of the
+        elements in top-level microformats, number of "items" including
+        nested ones, number of "rel_urls" and "html_bytes" of e-* properties
+        in total. Once one is exceeded, parsing stops and the result has
+        what was parsed before, with the name of the limit as the "limit
+        exceeded" of the "debug" dict. The document is always parsed into a
+        tree first.
 
     Attributes:
       useragent (string): the User-Agent string for the Parser
@@ -94,10 +305,28 @@ class Parser(object):
         expose_dom=False,
         metaformats=False,
         filter_roots=False,
+        types=None,
+        properties=None,
+        lazy=False,
+        dom_backend=None,
+        prescan=False,
+        http_cache=None,
+        memo=None,
+        objects=False,
+        profile=False,
+        memory=False,
+        limits=None,
     ):
+        # the deadline is counted from here
+        self._budget = budget.Budget(limits) if limits else None
         self.__url__ = None
         self.__doc__ = None
         self._preserve_doc = False
+        # (HTTPCache, final URL, options) to store the result in once parsed
+        self._http_cache = None
+        # nothing to parse unless there is a document
+        self._items_parsed = True
+        self._rels_parsed = True
         self.__parsed__ = {
             "items": [],
             "rels": {},
@@ -110,14 +339,22 @@ class Parser(object):
         }
         self.lang = None
         self.expose_dom = expose_dom
+        # exposed DOMs can not be reused
+        self._memo = memo if not expose_dom else None
+        self._objects = objects
+        self._rel_objects = None
+        # the debug keys and the profiles of the phases of parsing
+        self._profiles = []
+        if profile:
+            self._profiles.append(("profile", profiling.Profile()))
+        if memory:
+            self._profiles.append(("memory", profiling.MemoryProfile()))
         self.__metaformats = metaformats
-        try:
-            self.filtered_roots = set(filter_roots)
-        except TypeError:
-            if filter_roots:
-                self.filtered_roots = mf2_classes.CONFLICTING_ROOTS_TAILWIND
-            else:
-                self.filtered_roots = []
+        self.filtered_roots = _filtered_roots(filter_roots)
+        if isinstance(types, str):
+            types = [types]
+        self.types = set(types) if types is not None else None
+        self.properties = set(properties) if properties is not None else None
 
         # use default parser if none specified
         self.__html_parser__ = html_parser or "html5lib"
@@ -125,68 +362,136 @@ class Parser(object):
         if url is not None:
             self.__url__ = url
 
-            if doc is None:
+            if doc is None and http_cache is not None:
+                # the options that affect the result, unless it has DOMs
+                options = None
+                if not expose_dom:
+                    options = {
+                        "html_parser": html_parser,
+                        "expose_dom": expose_dom,
+                        "metaformats": metaformats,
+                        "filter_roots": filter_roots,
+                        "types": types,
+                        "properties": properties,
+                        "dom_backend": dom_backend,
+                    }
+                self.__url__, doc, result = http_cache.fetch(self.__url__, options)
+                # the stored result was not parsed within the limits, so the
+                # stored document is parsed instead
+                if result is not None and self._budget is None:
+                    # the document was not modified, so neither is the result
+                    if objects:
+                        result["items"] = [
+                            results.Item.from_dict(item) for item in result["items"]
+                        ]
+                    self.__parsed__ = result
+                    doc = None
+                elif options is not None:
+                    self._http_cache = (http_cache, self.__url__, options)
+            elif doc is None:
                 data = requests.get(
                     self.__url__,
                     headers={
                         "User-Agent": self.useragent,
                     },
                 )
+                self.__url__, doc = _response_doc(data)
 
-                # update to final URL after redirects
-                self.__url__ = data.url
-
-                # HACK: check for character encodings and use 'correct' data
-                if "charset" in data.headers.get("content-type", ""):
-                    doc = data.text
-                else:
-                    doc = data.content
+        # the adapter for the DOM of the document
+        self._dom = dom_adapters.get_adapter(dom_backend, doc)
 
         if doc is not None:
-            if isinstance(doc, BeautifulSoup) or isinstance(doc, Tag):
+            if self._dom.is_node(doc):
                 self.__doc__ = doc
                 self._preserve_doc = True
             else:
-                try:
-                    # try the user-given html parser or default html5lib
-                    self.__doc__ = BeautifulSoup(doc, features=self.__html_parser__)
-                except FeatureNotFound:
-                    # maybe raise a warning?
-                    # else switch to default use
-                    self.__doc__ = BeautifulSoup(doc)
+                if prescan and hasattr(doc, "read"):
+                    doc = doc.read()
+                if prescan and not may_contain_microformats(doc, metaformats):
+                    # nothing to find, so only give the debug information
+                    self.__parsed__["debug"]["markup parser"] = self._dom.markup_parser(
+                        None, self.__html_parser__
+                    )
+                else:
+                    self.__doc__ = self._phase("tree building", self._dom.parse)(
+                        doc, self.__html_parser__
+                    )
 
         # update actual parser used
-        # uses builder.NAME from BeautifulSoup
-        if isinstance(self.__doc__, BeautifulSoup) and self.__doc__.builder is not None:
-            self.__html_parser__ = self.__doc__.builder.NAME
+        if self.__doc__ is not None:
+            self.__html_parser__ = self._dom.markup_parser(self.__doc__)
         else:
             self.__html_parser__ = None
 
-        # check for <base> tag
-        if self.__doc__:
-            poss_base = next(
-                (el for el in get_descendents(self.__doc__) if el.name == "base"), None
-            )
-            if poss_base:
-                poss_base_url = poss_base.get("href")  # try to get href
-                if poss_base_url:
-                    if urlparse(poss_base_url).netloc:
-                        # base specifies an absolute path
-                        self.__url__ = poss_base_url
-                    elif self.__url__:
-                        # base specifies a relative path
-                        self.__url__ = try_urljoin(self.__url__, poss_base_url)
-
         if self.__doc__ is not None:
-            if document := self.__doc__.find("html"):
-                self.lang = document.attrs.get("lang")
+            # find <base>, <html>, microformat roots and rel elements in one walk
+            poss_base, document, self._roots, self._rel_els = self._phase(
+                "scan", _scan_document
+            )(self.__doc__, self.filtered_roots, self.types, self._dom)
+            # check for <base> tag
+            if poss_base is not None:
+                # try to get href
+                self.__url__ = _base_url(
+                    self.__url__, self._dom.get_attr(poss_base, "href")
+                )
+            if document is not None:
+                self.lang = self._dom.get_attr(document, "lang")
+
+            # add actual parser used to debug
+            # uses builder.NAME from BeautifulSoup
+            if self.__html_parser__:
+                self.__parsed__["debug"]["markup parser"] = self.__html_parser__
+            else:
+                self.__parsed__["debug"]["markup parser"] = "unknown"
+
+            self._items_parsed = False
+            self._rels_parsed = False
             # parse!
-            self._parse()
+            if not lazy:
+                self._parse()
+
+        for key, phase_profile in self._profiles:
+            # the phases are updated in place if parsed lazily
+            self.__parsed__["debug"][key] = phase_profile.phases
+
+    def _phase(self, phase, func):
+        """Get a function to call func with, profiled as a phase with the
+        profile and memory options"""
+        for _, phase_profile in self._profiles:
+            func = phase_profile.wrap(phase, func)
+        return func
 
     def _parse(self):
         """Does the work of actually parsing the document. Done automatically
-        on initialization.
+        on initialization, or on first access to the results if lazy.
         """
+        self._parse_items()
+        self._parse_rels()
+        if self._http_cache is not None:
+            http_cache, final_url, options = self._http_cache
+            self._http_cache = None
+            # partial results depend on the limits
+            if self._budget is None or self._budget.exceeded is None:
+                result = dict(self.to_dict())
+                # the profiles are only those of this parse
+                result["debug"] = {
+                    key: value
+                    for key, value in result["debug"].items()
+                    if key not in ("profile", "memory")
+                }
+                http_cache.store_result(final_url, options, result)
+
+    def _record_limit(self):
+        """Add the limit that stopped parsing to the debug dict, if any"""
+        if self._budget is not None and self._budget.exceeded is not None:
+            self.__parsed__["debug"]["limit exceeded"] = self._budget.exceeded
+
+    def _parse_items(self):
+        """Parse the document for microformats, once."""
+        if self._items_parsed:
+            return
+        self._items_parsed = True
+
         self._default_date = None
         # _default_date exists to provide implementation for rules described
         # in legacy value-class-pattern. basically, if you have two dt-
@@ -194,6 +499,72 @@ class Parser(object):
         # existing date as a template.
         # see value-class-pattern#microformats2_parsers on wiki.
         # see also the implied_relative_datetimes testcase.
+        self._pending_dates = []
+        # _pending_dates holds the dt- elements of properties that were not
+        # requested with the properties option since _default_date was last
+        # reset. they are only parsed if a requested dt- property may need
+        # them as a template.
+
+        # the elements of classic microformats are parsed with the class names
+        # that backcompat translated them to, through an overlay of the DOM
+        dom = backcompat.Overlay(self._dom)
+        limits = self._budget
+        # the text collected from elements, reused for the properties of
+        # elements within them
+        text_cache = {}
+        apply_rules = self._phase("backcompat", backcompat.apply_rules)
+        implied_name = self._phase("implied properties", implied_properties.name)
+        implied_photo = self._phase("implied properties", implied_properties.photo)
+        implied_url = self._phase("implied properties", implied_properties.url)
+
+        def parse_embedded(el, root_lang, in_backcompat):
+            """Parse the value of an e-* property"""
+            # send a copy of the original element for parsing backcompat
+            embedded_el = dom.original(el)
+            if embedded_el is None:
+                embedded_el = el
+                # the document is not changed within classic microformats:
+                # the templates of their e-* properties and the rels in them
+                # are kept. their URLs are made absolute in the overlay
+                # instead, for the rest of the classic microformat
+                if in_backcompat and not self._preserve_doc:
+                    make_urls_absolute(el, self.__url__, dom=dom)
+                if self._preserve_doc or in_backcompat:
+                    embedded_el = self._dom.copy(embedded_el)
+            temp_fixes.rm_templates(embedded_el, dom=self._dom)
+            return parse_property.embedded(
+                embedded_el,
+                self.__url__,
+                root_lang,
+                self.lang,
+                self.expose_dom,
+                dom=self._dom,
+                text_cache=text_cache,
+            )
+
+        parse_embedded = self._phase("embedded", parse_embedded)
+
+        def parse_datetime(el):
+            """Parse a dt-* property and update the default date"""
+            for date_el in self._pending_dates:
+                _, new_date = parse_property.datetime(
+                    date_el, self._default_date, dom=dom, text_cache=text_cache
+                )
+                if new_date:
+                    self._default_date = new_date
+            self._pending_dates = []
+
+            dt_value, new_date = parse_property.datetime(
+                el, self._default_date, dom=dom, text_cache=text_cache
+            )
+            # update the default date
+            if new_date:
+                self._default_date = new_date
+            return dt_value
+
+        def reset_default_date():
+            self._default_date = None
+            self._pending_dates = []
 
         def handle_microformat(
             root_class_names,
@@ -201,79 +572,102 @@ class Parser(object):
             value_property=None,
             simple_value=None,
             backcompat_mode=False,
+            in_backcompat=False,
         ):
-            """Handles a (possibly nested) microformat, i.e. h-*"""
-            properties = {}
-            children = []
-            self._default_date = None
-            # for processing implied properties: collects if property types (p, e, u, d(t)) or children (h) have been processed
-            parsed_types_aggregation = set()
-
+            """Handles a (possibly nested) microformat, i.e. h-*, as a
+            generator run by run_microformat() that yields the nested ones.
+            in_backcompat is whether it is within a classic microformat."""
+            reset_default_date()
+            # the properties to parse, including the one the value is taken from
+            wanted = self.properties
+            if wanted is not None and value_property is not None:
+                wanted = wanted | {value_property}
             if backcompat_mode:
-                el = backcompat.apply_rules(
-                    el, self.__html_parser__, self.filtered_roots
-                )
-                root_class_names = mf2_classes.root(
-                    el.get("class", []), self.filtered_roots
-                )
+                # el is translated again each time it is parsed, on top of the
+                # translations of the classic microformats it is in
+                dom.enter()
+                root_class_names = apply_rules(el, self.filtered_roots, dom=dom)
+                in_backcompat = True
 
-            root_lang = el.attrs.get("lang")
+            root_lang = dom.get_attr(el, "lang")
 
             # parse for properties and children
-            for child in get_children(el):
-                (
-                    child_props,
-                    child_children,
-                    child_parsed_types_aggregation,
-                ) = parse_props(child, root_lang)
-                for key, new_value in child_props.items():
-                    prop_value = properties.get(key, [])
-                    prop_value.extend(new_value)
-                    properties[key] = prop_value
-                children.extend(child_children)
-                parsed_types_aggregation.update(child_parsed_types_aggregation)
+            # parsed_types_aggregation is for processing implied properties:
+            # collects if property types (p, e, u, d(t)) or children (h) have
+            # been processed
+            properties, children, parsed_types_aggregation = yield from parse_props(
+                el, root_lang, wanted, in_backcompat
+            )
+            if backcompat_mode:
+                dom.leave()
 
             # complex h-* objects can take their "value" from the
             # first explicit property ("name" for p-* or "url" for u-*)
             if value_property and value_property in properties:
                 simple_value = properties[value_property][0]
 
-            # if some properties not already found find in implied ways unless in backcompat mode
-            if not backcompat_mode:
+            # if some properties not already found find in implied ways unless in
+            # backcompat mode, or parsing was stopped by a limit. they are
+            # found through the overlay, with the translations of the classic
+            # microformats el is in
+            if not backcompat_mode and (limits is None or limits.exceeded is None):
                 # stop implied name if any p-*, e-*, h-* is already found
-                if "name" not in properties and parsed_types_aggregation.isdisjoint(
-                    "peh"
+                if (
+                    "name" not in properties
+                    and parsed_types_aggregation.isdisjoint("peh")
+                    and is_wanted("name")
                 ):
                     properties["name"] = [
-                        implied_properties.name(el, self.__url__, self.filtered_roots)
+                        implied_name(
+                            el,
+                            self.__url__,
+                            self.filtered_roots,
+                            dom=dom,
+                            text_cache=text_cache,
+                        )
                     ]
 
-                if "photo" not in properties and parsed_types_aggregation.isdisjoint(
-                    "uh"
+                if (
+                    "photo" not in properties
+                    and parsed_types_aggregation.isdisjoint("uh")
+                    and is_wanted("photo")
                 ):
-                    x = implied_properties.photo(el, self.__url__, self.filtered_roots)
+                    x = implied_photo(el, self.__url__, self.filtered_roots, dom=dom)
+                    if self._objects and isinstance(x, dict):
+                        x = results.PropertyValue.from_dict(x)
                     if x is not None:
                         properties["photo"] = [x]
 
                 # stop implied url if any u-* or h-* is already found
-                if "url" not in properties and parsed_types_aggregation.isdisjoint(
-                    "uh"
+                if (
+                    "url" not in properties
+                    and parsed_types_aggregation.isdisjoint("uh")
+                    and is_wanted("url")
                 ):
-                    x = implied_properties.url(el, self.__url__, self.filtered_roots)
+                    x = implied_url(el, self.__url__, self.filtered_roots, dom=dom)
                     if x is not None:
                         properties["url"] = [x]
 
+            # drop the value property if it was only parsed for the value
+            if not is_wanted(value_property):
+                properties.pop(value_property, None)
+
+            if self._objects:
+                return build_item(
+                    root_class_names, el, properties, children, simple_value, root_lang
+                )
+
             # build microformat with type and properties
             microformat = {
                 "type": [class_name for class_name in sorted(root_class_names)],
                 "properties": properties,
             }
-            if el.name == "area":
-                shape = get_attr(el, "shape")
+            if dom.tag_name(el) == "area":
+                shape = get_attr(el, "shape", dom=dom)
                 if shape is not None:
                     microformat["shape"] = shape
 
-                coords = get_attr(el, "coords")
+                coords = get_attr(el, "coords", dom=dom)
                 if coords is not None:
                     microformat["coords"] = coords
 
@@ -281,7 +675,7 @@ class Parser(object):
             if children:
                 microformat["children"] = children
 
-            Id = get_attr(el, "id")
+            Id = get_attr(el, "id", dom=dom)
             if Id:
                 microformat["id"] = Id
 
@@ -303,268 +697,416 @@ class Parser(object):
                 microformat["lang"] = self.lang
             return microformat
 
-        def parse_props(el, root_lang):
-            """Parse the properties from a single element"""
+        def build_item(
+            root_class_names, el, properties, children, simple_value, root_lang
+        ):
+            """Build the Item of a microformat, for the objects option. Its
+            properties are the dict built by parse_props(), whose values are
+            already objects"""
+            shape = coords = None
+            if dom.tag_name(el) == "area":
+                shape = get_attr(el, "shape", dom=dom)
+                coords = get_attr(el, "coords", dom=dom)
+            return results.Item(
+                sorted(root_class_names),
+                properties,
+                children=children or None,
+                id=get_attr(el, "id", dom=dom),
+                shape=shape,
+                coords=coords,
+                value=simple_value,
+                lang=root_lang or self.lang,
+            )
+
+        def is_wanted(prop_name, wanted=None):
+            """Check if a property was requested with the properties option"""
+            if wanted is None:
+                wanted = self.properties
+            return wanted is None or prop_name in wanted
+
+        def parse_props(el, root_lang, wanted, in_backcompat):
+            """Parse the properties and the nested microformats of the
+            descendants of an element, down to nested microformat roots.
+
+            The descendants are walked in document order with a stack of
+            iterators over their children instead of recursion, and nested
+            microformats are handled by yielding the arguments of
+            handle_microformat() to run_microformat(), which sends back the
+            result.
+            """
             props = {}
             children = []
             # for processing implied properties: collects if property types (p, e, u, d(t)) or children (h) have been processed
             parsed_types_aggregation = set()
 
-            classes = el.get("class", [])
-            filtered_classes = mf2_classes.filter_classes(classes)
-            # Is this element a microformat2 root?
-            root_class_names = filtered_classes["h"]
-            backcompat_mode = False
-
-            # Is this element a microformat1 root?
-            if not root_class_names:
-                root_class_names = backcompat.root(classes)
-                backcompat_mode = True
-
-            if root_class_names:
-                parsed_types_aggregation.add("h")
-
-            # Is this a property element (p-*, u-*, etc.) flag
-            # False is default
-            is_property_el = False
-
-            # Parse plaintext p-* properties.
-            p_value = None
-            for prop_name in filtered_classes["p"]:
-                is_property_el = True
-                parsed_types_aggregation.add("p")
-                prop_value = props.setdefault(prop_name, [])
-
-                # if value has not been parsed then parse it
-                if p_value is None:
-                    p_value = parse_property.text(el, base_url=self.__url__)
+            # iterators over the children of the elements being walked
+            stack = [get_children(el, dom=dom)]
+            while stack:
+                el = next(stack[-1], None)
+                if el is None:
+                    stack.pop()
+                    if limits is not None and stack:
+                        # all the children of the element were parsed
+                        limits.leave()
+                    continue
+
+                # the properties of this element itself
+                el_props = {}
+
+                classes = dom.get_attr(el, "class", [])
+                filtered_classes = mf2_classes.filter_classes(classes)
+                # Is this element a microformat2 root?
+                root_class_names = filtered_classes["h"]
+                backcompat_mode = False
+
+                # Is this element a microformat1 root?
+                if not root_class_names:
+                    root_class_names = backcompat.root(classes)
+                    backcompat_mode = True
+
+                if limits is not None and not limits.enter(bool(root_class_names)):
+                    # a limit is exceeded, so skip the element
+                    continue
 
                 if root_class_names:
-                    prop_value.append(
-                        handle_microformat(
-                            root_class_names,
-                            el,
-                            value_property="name",
-                            simple_value=p_value,
-                            backcompat_mode=backcompat_mode,
+                    parsed_types_aggregation.add("h")
+
+                # Is this a property element (p-*, u-*, etc.) flag
+                # False is default
+                is_property_el = False
+
+                # Parse plaintext p-* properties.
+                p_value = None
+                for prop_name in filtered_classes["p"]:
+                    is_property_el = True
+                    parsed_types_aggregation.add("p")
+                    if not is_wanted(prop_name, wanted):
+                        continue
+                    prop_value = el_props.setdefault(prop_name, [])
+
+                    # if value has not been parsed then parse it
+                    if p_value is None:
+                        p_value = parse_property.text(
+                            el, base_url=self.__url__, dom=dom, text_cache=text_cache
                         )
-                    )
-                else:
-                    prop_value.append(p_value)
-
-            # Parse URL u-* properties.
-            u_value = None
-            for prop_name in filtered_classes["u"]:
-                is_property_el = True
-                parsed_types_aggregation.add("u")
-                prop_value = props.setdefault(prop_name, [])
-
-                # if value has not been parsed then parse it
-                if u_value is None:
-                    u_value = parse_property.url(el, base_url=self.__url__)
 
-                if root_class_names:
-                    prop_value.append(
-                        handle_microformat(
-                            root_class_names,
-                            el,
-                            value_property="url",
-                            simple_value=u_value,
-                            backcompat_mode=backcompat_mode,
+                    if root_class_names:
+                        prop_value.append(
+                            (
+                                yield (
+                                    root_class_names,
+                                    el,
+                                    "name",
+                                    p_value,
+                                    backcompat_mode,
+                                    in_backcompat,
+                                )
+                            )
+                        )
+                    else:
+                        prop_value.append(p_value)
+
+                # Parse URL u-* properties.
+                u_value = None
+                for prop_name in filtered_classes["u"]:
+                    is_property_el = True
+                    parsed_types_aggregation.add("u")
+                    if not is_wanted(prop_name, wanted):
+                        continue
+                    prop_value = el_props.setdefault(prop_name, [])
+
+                    # if value has not been parsed then parse it
+                    if u_value is None:
+                        u_value = parse_property.url(
+                            el, base_url=self.__url__, dom=dom, text_cache=text_cache
+                        )
+                        if self._objects and isinstance(u_value, dict):
+                            u_value = results.PropertyValue.from_dict(u_value)
+
+                    if root_class_names:
+                        prop_value.append(
+                            (
+                                yield (
+                                    root_class_names,
+                                    el,
+                                    "url",
+                                    u_value,
+                                    backcompat_mode,
+                                    in_backcompat,
+                                )
+                            )
                         )
-                    )
-                else:
-                    if isinstance(u_value, dict):
-                        prop_value.append(u_value)
                     else:
                         prop_value.append(u_value)
 
-            # Parse datetime dt-* properties.
-            dt_value = None
-            for prop_name in filtered_classes["dt"]:
-                is_property_el = True
-                parsed_types_aggregation.add("d")
-                prop_value = props.setdefault(prop_name, [])
-
-                # if value has not been parsed then parse it
-                if dt_value is None:
-                    dt_value, new_date = parse_property.datetime(el, self._default_date)
-                    # update the default date
-                    if new_date:
-                        self._default_date = new_date
-
-                if root_class_names:
-                    stops_implied_name = True
-                    prop_value.append(
-                        handle_microformat(
-                            root_class_names,
-                            el,
-                            simple_value=dt_value,
-                            backcompat_mode=backcompat_mode,
+                # Parse datetime dt-* properties.
+                dt_value = None
+                for prop_name in filtered_classes["dt"]:
+                    is_property_el = True
+                    parsed_types_aggregation.add("d")
+                    if not is_wanted(prop_name, wanted):
+                        continue
+                    prop_value = el_props.setdefault(prop_name, [])
+
+                    # if value has not been parsed then parse it
+                    if dt_value is None:
+                        dt_value = parse_datetime(el)
+
+                    if root_class_names:
+                        prop_value.append(
+                            (
+                                yield (
+                                    root_class_names,
+                                    el,
+                                    None,
+                                    dt_value,
+                                    backcompat_mode,
+                                    in_backcompat,
+                                )
+                            )
                         )
-                    )
-                else:
-                    if dt_value is not None:
-                        prop_value.append(dt_value)
-
-            # Parse embedded markup e-* properties.
-            e_value = None
-            for prop_name in filtered_classes["e"]:
-                is_property_el = True
-                parsed_types_aggregation.add("e")
-                prop_value = props.setdefault(prop_name, [])
-
-                # if value has not been parsed then parse it
-                if e_value is None:
-                    # send original element for parsing backcompat
-                    if el.original is None:
-                        embedded_el = el
                     else:
-                        embedded_el = el.original
-                    if self._preserve_doc:
-                        embedded_el = copy.copy(embedded_el)
-                    temp_fixes.rm_templates(embedded_el)
-                    e_value = parse_property.embedded(
-                        embedded_el, self.__url__, root_lang, self.lang, self.expose_dom
-                    )
-
-                if root_class_names:
-                    stops_implied_name = True
-                    prop_value.append(
-                        handle_microformat(
-                            root_class_names,
-                            el,
-                            simple_value=e_value,
-                            backcompat_mode=backcompat_mode,
+                        if dt_value is not None:
+                            prop_value.append(dt_value)
+
+                # Parse embedded markup e-* properties.
+                e_value = None
+                for prop_name in filtered_classes["e"]:
+                    is_property_el = True
+                    parsed_types_aggregation.add("e")
+                    if not is_wanted(prop_name, wanted):
+                        continue
+
+                    # if value has not been parsed then parse it
+                    if e_value is None:
+                        e_value = parse_embedded(el, root_lang, in_backcompat)
+                        if limits is not None and not limits.add_html(
+                            e_value.get("html", "")
+                        ):
+                            break
+                        if self._objects:
+                            e_value = results.PropertyValue.from_dict(e_value)
+                    prop_value = el_props.setdefault(prop_name, [])
+
+                    if root_class_names:
+                        prop_value.append(
+                            (
+                                yield (
+                                    root_class_names,
+                                    el,
+                                    None,
+                                    e_value,
+                                    backcompat_mode,
+                                    in_backcompat,
+                                )
+                            )
+                        )
+                    else:
+                        prop_value.append(e_value)
+
+                if filtered_classes["dt"] and dt_value is None and wanted is not None:
+                    # no dt-* property of this element was requested but it may
+                    # still set the default date
+                    self._pending_dates.append(el)
+
+                if is_property_el and root_class_names and not el_props:
+                    # no property of this nested microformat was requested, so
+                    # it is skipped, but it would have reset the default date
+                    reset_default_date()
+
+                # add the properties of the element before those of its
+                # descendants
+                for prop_name, values in el_props.items():
+                    prop_value = props.get(prop_name)
+                    if prop_value is None:
+                        props[prop_name] = values
+                    else:
+                        prop_value.extend(values)
+
+                # if this is not a property element, but it is a h-* microformat,
+                # add it to our list of children
+                if not is_property_el and root_class_names:
+                    children.append(
+                        (
+                            yield (
+                                root_class_names,
+                                el,
+                                None,
+                                None,
+                                backcompat_mode,
+                                in_backcompat,
+                            )
                         )
                     )
+                # parse child tags, provided this isn't a microformat root-class
+                if root_class_names:
+                    if limits is not None:
+                        limits.leave()
                 else:
-                    prop_value.append(e_value)
-
-            # if this is not a property element, but it is a h-* microformat,
-            # add it to our list of children
-            if not is_property_el and root_class_names:
-                children.append(
-                    handle_microformat(
-                        root_class_names, el, backcompat_mode=backcompat_mode
-                    )
-                )
-            # parse child tags, provided this isn't a microformat root-class
-            if not root_class_names:
-                for child in get_children(el):
-                    (
-                        child_properties,
-                        child_microformats,
-                        child_parsed_types_aggregation,
-                    ) = parse_props(child, root_lang)
-                    for prop_name in child_properties:
-                        v = props.get(prop_name, [])
-                        v.extend(child_properties[prop_name])
-                        props[prop_name] = v
-                    children.extend(child_microformats)
-                    parsed_types_aggregation.update(child_parsed_types_aggregation)
+                    stack.append(get_children(el, dom=dom))
             return props, children, parsed_types_aggregation
 
-        def parse_rels(el):
-            """Parse an element for rel microformats"""
-            rel_attrs = get_attr(el, "rel")
-            # if rel attributes exist
-            if rel_attrs is not None:
-                # find the url and normalise it
-                url = try_urljoin(self.__url__, el.get("href", ""))
-                value_dict = self.__parsed__["rel-urls"].get(url, {})
-
-                # 1st one wins
-                if "text" not in value_dict:
-                    value_dict["text"] = el.get_text().strip()
-
-                url_rels = value_dict.get("rels", [])
-                value_dict["rels"] = url_rels
-
-                for knownattr in ("media", "hreflang", "type", "title"):
-                    x = get_attr(el, knownattr)
-                    # 1st one wins
-                    if x is not None and knownattr not in value_dict:
-                        value_dict[knownattr] = x
-
-                self.__parsed__["rel-urls"][url] = value_dict
-
-                for rel_value in rel_attrs:
-                    value_list = self.__parsed__["rels"].get(rel_value, [])
-                    if url not in value_list:
-                        value_list.append(url)
-                    if rel_value not in url_rels:
-                        url_rels.append(rel_value)
-
-                    self.__parsed__["rels"][rel_value] = value_list
-                if "alternate" in rel_attrs:
-                    alternate_list = self.__parsed__.get("alternates", [])
-                    alternate_dict = {}
-                    alternate_dict["url"] = url
-                    x = " ".join([r for r in rel_attrs if not r == "alternate"])
-                    if x != "":
-                        alternate_dict["rel"] = x
-                    alternate_dict["text"] = el.get_text().strip()
-                    for knownattr in ("media", "hreflang", "type", "title"):
-                        x = get_attr(el, knownattr)
-                        if x is not None:
-                            alternate_dict[knownattr] = x
-                    alternate_list.append(alternate_dict)
-                    self.__parsed__["alternates"] = alternate_list
-
-        def parse_el(el, ctx):
-            """Parse an element for microformats"""
-            classes = el.get("class", [])
-
-            # find potential microformats in root classnames h-*
-            potential_microformats = mf2_classes.root(classes, self.filtered_roots)
-
-            # if potential microformats found parse them
-            if potential_microformats:
-                result = handle_microformat(potential_microformats, el)
-                ctx.append(result)
-            else:
-                # find backcompat root classnames
-                potential_microformats = backcompat.root(classes)
-                if potential_microformats:
-                    result = handle_microformat(
-                        potential_microformats, el, backcompat_mode=True
-                    )
-                    ctx.append(result)
+        def run_microformat(*args, **kwargs):
+            """Handle a microformat with handle_microformat(), running the
+            nested ones it yields with a stack of generators instead of
+            recursion so that deeply nested microformats do not exceed the
+            recursion limit"""
+            stack = [handle_microformat(*args, **kwargs)]
+            value = None
+            while True:
+                try:
+                    request = stack[-1].send(value)
+                except StopIteration as e:
+                    stack.pop()
+                    if not stack:
+                        return e.value
+                    value = e.value
                 else:
-                    # parse child tags
-                    for child in get_children(el):
-                        parse_el(child, ctx)
+                    stack.append(handle_microformat(*request))
+                    value = None
 
         ctx = []
 
         if self.__metaformats:
             # extract out a metaformats item, if available
-            self.__metaformats_item = metaformats.parse(self.__doc__, url=self.__url__)
+            self.__metaformats_item = self._phase("metaformats", metaformats.parse)(
+                self.__doc__, url=self.__url__, dom=dom
+            )
 
-        # start parsing at root element of the document
-        parse_el(self.__doc__, ctx)
+        memo = self._memo
+        if memo is not None:
+            # everything but the root element that a microformat depends on
+            settings = {
+                "url": self.__url__,
+                "lang": self.lang,
+                "dom backend": dom.name,
+                "markup parser": self.__html_parser__,
+                "filter roots": sorted(self.filtered_roots),
+                "properties": (
+                    sorted(self.properties) if self.properties is not None else None
+                ),
+                "version": __version__,
+            }
+            # parsing e-* properties removes their templates from the document
+            # and the rel elements in them with them, which a memoized
+            # microformat would not do
+            template_rel_els = [el for el, in_template in self._rel_els if in_template]
+
+        # parse the top-level microformat roots found in the document
+        parse_root = self._phase("items", run_microformat)
+        for el, root_class_names, backcompat_mode in self._roots:
+            if limits is not None and not limits.enter(True):
+                break
+            key = None
+            if memo is not None and not any(
+                dom.contains(el, rel_el) for rel_el in template_rel_els
+            ):
+                key = memo.key(dom.outer_html(el), settings)
+                memoized = memo.get(key)
+                # what parsing it used counts against the limits, and if it
+                # is unknown or beyond them, it is parsed again
+                if memoized is not None and (
+                    limits is None
+                    or (memoized["used"] is not None and limits.reuse(memoized["used"]))
+                ):
+                    microformat = memoized["item"]
+                    if self._objects:
+                        microformat = results.Item.from_dict(microformat)
+                    ctx.append(microformat)
+                    if limits is not None:
+                        limits.leave()
+                    continue
+            if limits is not None:
+                mark = limits.mark()
+            microformat = parse_root(
+                root_class_names, el, backcompat_mode=backcompat_mode
+            )
+            used = None
+            if limits is not None:
+                used = limits.used(mark)
+                limits.leave()
+                if limits.exceeded is not None:
+                    # partial microformats are kept but not memoized
+                    key = None
+            if key is not None:
+                memo.set(
+                    key,
+                    {
+                        "item": microformat.to_dict() if self._objects else microformat,
+                        "used": used,
+                    },
+                )
+            ctx.append(microformat)
         self.__parsed__["items"] = ctx
+        self._record_limit()
         if self.__metaformats and self.__metaformats_item:
-            self.__parsed__["items"].append(self.__metaformats_item)
+            if self.types is None or not self.types.isdisjoint(
+                self.__metaformats_item["type"]
+            ):
+                metaformats_item = self.__metaformats_item
+                if self._objects:
+                    metaformats_item = results.Item.from_dict(metaformats_item)
+                self.__parsed__["items"].append(metaformats_item)
+
+    def _parse_rels(self):
+        """Parse the document for rel microformats, once."""
+        if self._rels_parsed:
+            return
+
+        if not self._items_parsed and any(
+            in_template for el, in_template in self._rel_els
+        ):
+            # templates are removed from e-* properties when parsing items and
+            # their rel elements with them, so parse items first
+            self._parse_items()
+        self._rels_parsed = True
+
+        def parse_rel_els():
+            """Parse the rel elements for rel values, in document order"""
+            for el, in_template in self._rel_els:
+                # skip elements of templates that were removed from e-*
+                # properties
+                if in_template and not self._dom.contains(self.__doc__, el):
+                    continue
+                if self._budget is not None and not self._budget.add_rel_url(
+                    len(self.__parsed__["rel-urls"])
+                ):
+                    break
+                rels.parse(el, self.__url__, self.__parsed__, dom=self._dom)
 
-        # parse for rel values
-        for el in get_descendents(self.__doc__):
-            if el.name in ("a", "area", "link") and el.has_attr("rel"):
-                parse_rels(el)
+        # profiled as a whole rather than per element
+        self._phase("rels", parse_rel_els)()
+        self._record_limit()
 
         # sort the rels array in rel-urls since this should be unordered set
-        for url in self.__parsed__["rel-urls"]:
-            if "rels" in self.__parsed__["rel-urls"][url]:
-                rels = self.__parsed__["rel-urls"][url]["rels"]
-                self.__parsed__["rel-urls"][url]["rels"] = unordered_list(rels)
-
-        # add actual parser used to debug
-        # uses builder.NAME from BeautifulSoup
-        if self.__html_parser__:
-            self.__parsed__["debug"]["markup parser"] = self.__html_parser__
-        else:
-            self.__parsed__["debug"]["markup parser"] = "unknown"
+        rels.sort_rel_urls(self.__parsed__)
+
+    @property
+    def items(self):
+        """list: the top-level microformats of the document in mf2json format,
+        or Item objects with the objects option"""
+        self._parse_items()
+        return self.__parsed__["items"]
+
+    @property
+    def rels(self):
+        """dict: the URLs of the document's rel microformats, by rel value"""
+        self._parse_rels()
+        return self.__parsed__["rels"]
+
+    @property
+    def rel_urls(self):
+        """dict: the rel values and other details of each URL of the document's
+        rel microformats, as Rel objects with the objects option"""
+        self._parse_rels()
+        if self._objects:
+            if self._rel_objects is None:
+                self._rel_objects = {
+                    url: results.Rel.from_dict(url, rel_url)
+                    for url, rel_url in self.__parsed__["rel-urls"].items()
+                }
+            return self._rel_objects
+        return self.__parsed__["rel-urls"]
 
     def to_dict(self, filter_by_type=None):
         """Get a dictionary version of the parsed microformat document.
@@ -577,9 +1119,16 @@ class Parser(object):
             dict: representation of the parsed microformats document
         """
         if filter_by_type is None:
+            self._parse()
+            if self._objects:
+                parsed = dict(self.__parsed__)
+                parsed["items"] = [item.to_dict() for item in parsed["items"]]
+                return parsed
             return self.__parsed__
+        elif self._objects:
+            return [x.to_dict() for x in self.items if filter_by_type in x.type]
         else:
-            return [x for x in self.__parsed__["items"] if filter_by_type in x["type"]]
+            return [x for x in self.items if filter_by_type in x["type"]]
 
     def to_json(self, pretty_print=False, filter_by_type=None):
         """Get a json-encoding string version of the parsed microformats document
@@ -600,3 +1149,27 @@ class Parser(object):
             )
         else:
             return json.dumps(self.to_dict(filter_by_type))
+
+    def write_json(self, fp, pretty_print=False, filter_by_type=None, ndjson=False):
+        """Write the json-encoding of the parsed microformats document to a
+        file, one top-level item at a time, without building it as a string
+
+        Args:
+          fp (file): text file to write to
+          pretty_print (bool, optional): Encode the json document with
+            linebreaks and indents to improve readability. Defaults to False.
+          filter_by_type (bool, optional): only include top-level items of
+            the given h-* type
+          ndjson (bool, optional): write the top-level items as
+            newline-delimited JSON instead, one item per line, without the
+            rels. Defaults to False.
+        """
+        if filter_by_type is None:
+            self._parse()
+            # Item objects are converted one at a time too
+            mf2json = self.__parsed__
+        elif self._objects:
+            mf2json = [x for x in self.items if filter_by_type in x.type]
+        else:
+            mf2json = [x for x in self.items if filter_by_type in x["type"]]
+        serialize.write_json(mf2json, fp, pretty_print=pretty_print, ndjson=ndjson)
@@ -0,0 +1,74 @@
+"""Fast check of raw documents for anything the parser could find, so that
+documents without microformats can be skipped without building a tree."""
+
+import html
+import re
+
+from . import backcompat, mf2_classes
+
+# an attribute starts after whitespace, a quote or a slash, e.g. <a/rel=me>
+_CLASS_ATTR = r"""[\s"'/](?i:class)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))"""
+_REL_ATTR = r"""[\s"'/](?i:rel)(?=[\s=/>])"""
+_METAFORMATS_TAGS = r"<(?i:title|meta)[\s/>]"
+
+_CLASS_ATTR_RE = re.compile(_CLASS_ATTR)
+_REL_ATTR_RE = re.compile(_REL_ATTR)
+_METAFORMATS_TAGS_RE = re.compile(_METAFORMATS_TAGS)
+_CLASS_ATTR_BYTES_RE = re.compile(_CLASS_ATTR.encode("ascii"))
+_REL_ATTR_BYTES_RE = re.compile(_REL_ATTR.encode("ascii"))
+_METAFORMATS_TAGS_BYTES_RE = re.compile(_METAFORMATS_TAGS.encode("ascii"))
+
+# root class names only contain these characters, so splitting class values
+# on anything else finds them whatever the encoding or the whitespace
+_NAME_RE = re.compile(r"[a-zA-Z0-9-]+")
+
+
+def _class_names(value):
+    """Get the candidate class names of a raw class attribute value"""
+    if isinstance(value, bytes):
+        # ASCII-compatible encodings are all the same for class names
+        value = value.decode("latin-1")
+    if "&" in value:
+        value = html.unescape(value)
+    return _NAME_RE.findall(value)
+
+
+def may_contain_microformats(doc, metaformats=False):
+    """Check if a raw document may contain microformats or rel links.
+
+    This is conservative: if it returns False, parsing the document gives no
+    items, rels or rel-urls, but it may return True for documents without any,
+    e.g. if a root class name only appears in a script.
+
+    Args:
+      doc (file, string or bytes): the document, as given to Parser
+      metaformats (boolean): optional, also check for the <title> and <meta>
+        elements that metaformats are extracted from
+
+    Returns:
+      boolean: False if the document has no microformat root classes, mf1 or
+        mf2, and no rel attributes
+    """
+    if hasattr(doc, "read"):
+        doc = doc.read()
+    if isinstance(doc, bytes):
+        if b"\x00" in doc:
+            # UTF-16 or UTF-32, which the patterns do not match
+            return True
+        class_attr_re = _CLASS_ATTR_BYTES_RE
+        rel_attr_re = _REL_ATTR_BYTES_RE
+        metaformats_tags_re = _METAFORMATS_TAGS_BYTES_RE
+    else:
+        class_attr_re = _CLASS_ATTR_RE
+        rel_attr_re = _REL_ATTR_RE
+        metaformats_tags_re = _METAFORMATS_TAGS_RE
+
+    if rel_attr_re.search(doc):
+        return True
+    if metaformats and metaformats_tags_re.search(doc):
+        return True
+    for match in class_attr_re.finditer(doc):
+        names = _class_names(match.group(match.lastindex))
+        if mf2_classes.root(names, []) or backcompat.root(names):
+            return True
+    return False
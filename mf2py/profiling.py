@@ -0,0 +1,90 @@
+"""Wall time, call counts and memory of the phases of parsing, for Parser's
+profile and memory options."""
+
+import time
+import tracemalloc
+
+# not available before Python 3.9
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+class Profile(object):
+    """
+    The wall time and the number of calls of each phase of parsing a
+    document. Phases that were set up but not run have no calls.
+
+    Attributes:
+      phases (dict): {"seconds": float, "calls": int} dicts by phase name
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    def wrap(self, name, func):
+        """Wrap a function so that its calls are counted and timed as a phase.
+
+        The time of phases run within others is also part of theirs.
+        """
+        phase = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                phase["seconds"] += time.perf_counter() - start
+                phase["calls"] += 1
+
+        return timed
+
+
+class MemoryProfile(object):
+    """
+    The memory allocated by each phase of parsing a document, traced with
+    tracemalloc, which is started for the phases if it is not already.
+
+    For each phase, "peak" is the most bytes allocated at once during a call
+    above what was allocated when it started, and "retained" the total bytes
+    still allocated when its calls returned, e.g. the tree built, the copies
+    of elements returned or the parsed values. Peaks need Python 3.9 or later
+    to be measured per phase; before, they include what was allocated since
+    tracemalloc was started.
+
+    Attributes:
+      phases (dict): {"peak": int, "retained": int, "calls": int} dicts by
+        phase name
+    """
+
+    def __init__(self):
+        self.phases = {}
+        # the highest peak seen so far by each phase being run, outermost first
+        self._peaks = []
+
+    def wrap(self, name, func):
+        """Wrap a function so that the memory allocated by its calls is traced
+        as a phase"""
+        phase = self.phases.setdefault(name, {"peak": 0, "retained": 0, "calls": 0})
+
+        def traced(*args, **kwargs):
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            start, peak = tracemalloc.get_traced_memory()
+            # the peak is reset for this phase, so keep the one of the phases
+            # it is run within
+            self._peaks = [max(outer, peak) for outer in self._peaks]
+            if _reset_peak is not None:
+                _reset_peak()
+            self._peaks.append(start)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(self._peaks.pop(), peak)
+                phase["peak"] = max(phase["peak"], peak - start)
+                phase["retained"] += current - start
+                phase["calls"] += 1
+                if started:
+                    tracemalloc.stop()
+
+        return traced
@@ -0,0 +1,73 @@
+"""functions to parse rel microformats http://microformats.org/wiki/rel """
+
+from .dom_adapters import BS4
+from .dom_helpers import get_attr, try_urljoin
+from .mf_helpers import unordered_list
+
+
+def parse(el, base_url, parsed, dom=BS4):
+    """Parse an element for rel microformats
+
+    Args:
+      el: an a, area or link element
+      base_url (string): the base URL to use, to reconcile relative URLs
+      parsed (dict): the mf2json dict to add "rels", "rel-urls" and
+        "alternates" to
+      dom (DOMAdapter, optional): the adapter for the DOM of el
+
+    Returns:
+      string: the URL of the element if it has rel values, otherwise None
+    """
+    rel_attrs = get_attr(el, "rel", dom=dom)
+    # if rel attributes exist
+    if rel_attrs is not None:
+        # find the url and normalise it
+        url = try_urljoin(base_url, dom.get_attr(el, "href", ""))
+        value_dict = parsed["rel-urls"].get(url, {})
+
+        # 1st one wins
+        if "text" not in value_dict:
+            value_dict["text"] = dom.text(el).strip()
+
+        url_rels = value_dict.get("rels", [])
+        value_dict["rels"] = url_rels
+
+        for knownattr in ("media", "hreflang", "type", "title"):
+            x = get_attr(el, knownattr, dom=dom)
+            # 1st one wins
+            if x is not None and knownattr not in value_dict:
+                value_dict[knownattr] = x
+
+        parsed["rel-urls"][url] = value_dict
+
+        for rel_value in rel_attrs:
+            value_list = parsed["rels"].get(rel_value, [])
+            if url not in value_list:
+                value_list.append(url)
+            if rel_value not in url_rels:
+                url_rels.append(rel_value)
+
+            parsed["rels"][rel_value] = value_list
+        if "alternate" in rel_attrs:
+            alternate_list = parsed.get("alternates", [])
+            alternate_dict = {}
+            alternate_dict["url"] = url
+            x = " ".join([r for r in rel_attrs if not r == "alternate"])
+            if x != "":
+                alternate_dict["rel"] = x
+            alternate_dict["text"] = dom.text(el).strip()
+            for knownattr in ("media", "hreflang", "type", "title"):
+                x = get_attr(el, knownattr, dom=dom)
+                if x is not None:
+                    alternate_dict[knownattr] = x
+            alternate_list.append(alternate_dict)
+            parsed["alternates"] = alternate_list
+        return url
+
+
+def sort_rel_urls(parsed):
+    """sort the rels array in rel-urls since this should be unordered set"""
+    for url in parsed["rel-urls"]:
+        if "rels" in parsed["rel-urls"][url]:
+            rels = parsed["rel-urls"][url]["rels"]
+            parsed["rel-urls"][url]["rels"] = unordered_list(rels)
@@ -0,0 +1,249 @@
+"""Compact objects for parse results, used by Parser with objects=True
+instead of mf2json dicts. They use `__slots__` and interned type and property
+names, and are converted to mf2json dicts on demand with to_dict().
+"""
+
+from sys import intern
+
+
+def _value_to_dict(value):
+    """Convert a property value to mf2json"""
+    if isinstance(value, (Item, PropertyValue)):
+        return value.to_dict()
+    return value
+
+
+def _value_from_dict(value):
+    """Convert an mf2json property value to an object"""
+    if isinstance(value, dict):
+        if "type" in value:
+            return Item.from_dict(value)
+        return PropertyValue.from_dict(value)
+    return value
+
+
+class PropertyValue(object):
+    """A property value with more than a string, e.g. the HTML of an e-*
+    property or the alt text of an image.
+
+    Attributes:
+      value (string): the plain text value, or the URL of an image
+      alt (string): the alt text of an image, or None
+      srcset (dict): the sources of an image by descriptor, or None
+      lang (string): the language of an e-* property, or None
+      dom: the DOM of an e-* property with expose_dom, or None
+      html (string): the HTML of an e-* property, or None
+    """
+
+    __slots__ = ("value", "alt", "srcset", "lang", "dom", "html")
+
+    def __init__(self, value, alt=None, srcset=None, lang=None, dom=None, html=None):
+        self.value = value
+        self.alt = alt
+        self.srcset = srcset
+        self.lang = lang
+        self.dom = dom
+        self.html = html
+
+    def __repr__(self):
+        return "PropertyValue(%r)" % (self.value,)
+
+    def __eq__(self, other):
+        if not isinstance(other, PropertyValue):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    @classmethod
+    def from_dict(cls, value):
+        """Make a property value from its mf2json dict"""
+        return cls(
+            value["value"],
+            alt=value.get("alt"),
+            srcset=value.get("srcset"),
+            lang=value.get("lang"),
+            dom=value.get("dom"),
+            html=value.get("html"),
+        )
+
+    def to_dict(self):
+        """Get the mf2json dict of the property value"""
+        value = {"value": self.value}
+        for name in ("alt", "srcset", "lang", "dom", "html"):
+            attr = getattr(self, name)
+            if attr is not None:
+                value[name] = attr
+        return value
+
+
+class Item(object):
+    """A microformat.
+
+    Attributes:
+      type (tuple): the h-* type names
+      properties (dict): the lists of values of the properties by name. The
+        values are strings, PropertyValue objects or Item objects.
+      children (list): the child Item objects, or None
+      id (string): the id of the root element, or None
+      shape (string): the shape of an area root element, or None
+      coords (string): the coords of an area root element, or None
+      value: the value of a microformat that is a property, a string, a
+        PropertyValue or the Item of a nested microformat, or None
+      lang (string): the language, or None
+      source (string): "metaformats" for a metaformats item, or None
+    """
+
+    __slots__ = (
+        "type",
+        "properties",
+        "children",
+        "id",
+        "shape",
+        "coords",
+        "value",
+        "lang",
+        "source",
+    )
+
+    def __init__(
+        self,
+        type,
+        properties,
+        children=None,
+        id=None,
+        shape=None,
+        coords=None,
+        value=None,
+        lang=None,
+        source=None,
+    ):
+        self.type = tuple([intern(name) for name in type])
+        if not all(intern(name) is name for name in properties):
+            properties = {intern(name): values for name, values in properties.items()}
+        self.properties = properties
+        self.children = children
+        self.id = id
+        self.shape = shape
+        self.coords = coords
+        self.value = value
+        self.lang = lang
+        self.source = source
+
+    def __repr__(self):
+        return "Item(%r)" % (list(self.type),)
+
+    def __eq__(self, other):
+        if not isinstance(other, Item):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    @classmethod
+    def from_dict(cls, item):
+        """Make an item from its mf2json dict"""
+        value = item.get("value")
+        if "html" in item or "dom" in item:
+            # the value, lang and HTML of an e-* property
+            value = PropertyValue.from_dict(item)
+        elif "alt" in item or "srcset" in item:
+            value = PropertyValue(
+                item["value"], alt=item.get("alt"), srcset=item.get("srcset")
+            )
+        children = item.get("children")
+        return cls(
+            item["type"],
+            {
+                name: [_value_from_dict(value) for value in values]
+                for name, values in item["properties"].items()
+            },
+            children=[cls.from_dict(child) for child in children]
+            if children is not None
+            else None,
+            id=item.get("id"),
+            shape=item.get("shape"),
+            coords=item.get("coords"),
+            value=value,
+            lang=item.get("lang"),
+            source=item.get("source"),
+        )
+
+    def to_dict(self):
+        """Get the mf2json dict of the item, as Parser gives without
+        objects=True"""
+        properties = {
+            name: [_value_to_dict(value) for value in values]
+            for name, values in self.properties.items()
+        }
+        if self.source is not None:
+            # metaformats items are built in this order
+            return {
+                "properties": properties,
+                "source": self.source,
+                "type": list(self.type),
+            }
+
+        item = {"type": list(self.type), "properties": properties}
+        if self.shape is not None:
+            item["shape"] = self.shape
+        if self.coords is not None:
+            item["coords"] = self.coords
+        if self.children:
+            item["children"] = [child.to_dict() for child in self.children]
+        if self.id:
+            item["id"] = self.id
+        if isinstance(self.value, (Item, PropertyValue)):
+            # folded into the item, as Parser does for a dict value
+            item.update(self.value.to_dict())
+        elif self.value is not None:
+            item["value"] = self.value
+        if self.lang:
+            item["lang"] = self.lang
+        return item
+
+
+class Rel(object):
+    """The rel values and other details of the URL of rel links.
+
+    Attributes:
+      url (string): the URL
+      text (string): the text of the first link
+      rels (list): the rel values
+      media, hreflang, type, title (string): the attribute of the first link
+        with it, or None
+    """
+
+    __slots__ = ("url", "text", "rels", "media", "hreflang", "type", "title")
+
+    def __init__(
+        self, url, text, rels, media=None, hreflang=None, type=None, title=None
+    ):
+        self.url = url
+        self.text = text
+        self.rels = [intern(rel) for rel in rels]
+        self.media = media
+        self.hreflang = hreflang
+        self.type = type
+        self.title = title
+
+    def __repr__(self):
+        return "Rel(%r, %r)" % (self.url, self.rels)
+
+    @classmethod
+    def from_dict(cls, url, rel_url):
+        """Make a Rel from a URL and its mf2json "rel-urls" entry"""
+        return cls(
+            url,
+            rel_url["text"],
+            rel_url["rels"],
+            media=rel_url.get("media"),
+            hreflang=rel_url.get("hreflang"),
+            type=rel_url.get("type"),
+            title=rel_url.get("title"),
+        )
+
+    def to_dict(self):
+        """Get the mf2json "rel-urls" entry of the URL"""
+        rel_url = {"text": self.text, "rels": list(self.rels)}
+        for name in ("media", "hreflang", "type", "title"):
+            attr = getattr(self, name)
+            if attr is not None:
+                rel_url[name] = attr
+        return rel_url
@@ -0,0 +1,77 @@
+"""Write mf2json to files one item at a time, so that the output of large
+documents is never held in memory as a whole string."""
+
+import json
+
+# the separators of Parser.to_json(), which are also json's defaults
+_ITEM_SEPARATOR = ", "
+_KEY_SEPARATOR = ": "
+
+
+def _dumps(value, indent=None, level=0):
+    """Encode a value the same way as Parser.to_json(), indented for the given
+    nesting level"""
+    if hasattr(value, "to_dict"):
+        # Item objects
+        value = value.to_dict()
+    text = json.dumps(
+        value, indent=indent, separators=(_ITEM_SEPARATOR, _KEY_SEPARATOR)
+    )
+    if indent is not None and level:
+        # strings never contain raw newlines, so these are all indentation
+        text = text.replace("\n", "\n" + " " * (indent * level))
+    return text
+
+
+def _write(fp, value, indent=None, depth=2, level=0):
+    """Write a value as JSON, writing the elements of dicts and lists less than
+    depth levels deep one at a time"""
+    if depth == 0 or not isinstance(value, (dict, list)) or not value:
+        fp.write(_dumps(value, indent, level))
+        return
+
+    is_dict = isinstance(value, dict)
+    fp.write("{" if is_dict else "[")
+    for i, element in enumerate(value.items() if is_dict else value):
+        if i:
+            fp.write(_ITEM_SEPARATOR)
+        if indent is not None:
+            fp.write("\n" + " " * (indent * (level + 1)))
+        if is_dict:
+            key, element = element
+            fp.write(json.dumps(key) + _KEY_SEPARATOR)
+        _write(fp, element, indent, depth - 1, level + 1)
+    if indent is not None:
+        fp.write("\n" + " " * (indent * level))
+    fp.write("}" if is_dict else "]")
+
+
+def write_json(mf2json, fp, pretty_print=False, ndjson=False):
+    """Write mf2json to a file one top-level item at a time.
+
+    The output is the same as Parser.to_json() for the same arguments, but
+    only one item is encoded in memory at once.
+
+    Args:
+      mf2json (dict or list): an mf2json dict, e.g. a result of parse() or
+        parse_many(), or a list of items
+      fp (file): text file to write to
+      pretty_print (bool, optional): Encode the json document with
+        linebreaks and indents to improve readability. Defaults to False.
+      ndjson (bool, optional): write the top-level items as newline-delimited
+        JSON instead, one item per line, without the rels. Defaults to False.
+    """
+    if ndjson:
+        items = mf2json["items"] if isinstance(mf2json, dict) else mf2json
+        for item in items:
+            fp.write(_dumps(item))
+            fp.write("\n")
+        return
+
+    # the elements of the "items" list of a dict are two levels deep
+    _write(
+        fp,
+        mf2json,
+        indent=4 if pretty_print else None,
+        depth=2 if isinstance(mf2json, dict) else 1,
+    )
@@ -0,0 +1,299 @@
+"""Incremental parser that yields top-level microformats as soon as their root
+element is closed, so that large documents are never held as a whole tree.
+
+Requires lxml, which is used as an incremental tokenizer and tree builder.
+The output is the same as `Parser(doc, html_parser="lxml")`.
+"""
+
+import collections
+
+from bs4 import BeautifulSoup
+from bs4.element import Comment
+
+from . import backcompat, metaformats, mf2_classes, rels
+from .parser import Parser, _base_url, _filtered_roots
+from .version import __version__
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+def _to_soup(el, soup):
+    """Add an lxml element and its descendants to a BeautifulSoup document,
+    building them the same way BeautifulSoup's own lxml tree builder does, and
+    return the new tag."""
+    tag = None
+    stack = [(el, False)]
+    while stack:
+        node, closing = stack.pop()
+        if closing:
+            soup.endData()
+            soup.handle_endtag(node.tag)
+            if node is not el and node.tail:
+                soup.handle_data(node.tail)
+        elif node.tag is etree.Comment:
+            soup.endData()
+            soup.handle_data(node.text or "")
+            soup.endData(Comment)
+            if node.tail:
+                soup.handle_data(node.tail)
+        elif isinstance(node.tag, str):
+            new_tag = soup.handle_starttag(node.tag, None, None, dict(node.attrib))
+            if tag is None:
+                tag = new_tag
+            if node.text:
+                soup.handle_data(node.text)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node))
+        elif node.tail:
+            soup.handle_data(node.tail)
+    soup.endData()
+    return tag
+
+
+def _discard(el):
+    """Free an lxml element that is no longer needed, and its previous siblings"""
+    el.clear(keep_tail=True)
+    parent = el.getparent()
+    if parent is not None:
+        while el.getprevious() is not None:
+            del parent[0]
+
+
+class StreamingParser(object):
+    """
+    Parser that is fed a document in chunks and yields each top-level
+    microformat as soon as its root element is closed.
+
+    Example:
+      parser = StreamingParser(url="http://example.com")
+      for chunk in chunks:
+          parser.feed(chunk)
+          for item in parser.iter_items():
+              ...
+      parser.close()
+      for item in parser.iter_items():
+          ...
+
+    Args:
+      url (string): URL of the document. A `<base>` element is only taken into
+        account for the items that are closed after it.
+      expose_dom (boolean): optional, expose the DOM of embedded properties.
+      metaformats (boolean): optional, include metaformats extracted from OGP
+        and Twitter card data: https://microformats.org/wiki/metaformats. The
+        metaformats item is yielded after close().
+      filter_roots (boolean or list): optional, filter root class names. Use
+        True to filter known conflicting classes, otherwise filter given list.
+
+    """
+
+    def __init__(
+        self, url=None, expose_dom=False, metaformats=False, filter_roots=False
+    ):
+        if etree is None:
+            raise ImportError("StreamingParser requires lxml")
+        self.__url__ = url
+        self.lang = None
+        self.expose_dom = expose_dom
+        self.__metaformats = metaformats
+        self.filter_roots = filter_roots
+        self.filtered_roots = _filtered_roots(filter_roots)
+        self.__parsed__ = {
+            "rels": {},
+            "rel-urls": {},
+            "debug": {
+                "description": Parser.ua_desc,
+                "source": Parser.ua_url,
+                "version": __version__,
+                "markup parser": "lxml",
+            },
+        }
+
+        self._parser = etree.HTMLPullParser(events=("start", "end"))
+        self._started = False
+        self._closed = False
+        self._base_found = False
+        self._html_found = False
+        self._template_depth = 0
+        # the top-level microformat root element currently open, if any
+        self._root = None
+        # the rel elements and top-level roots in document order, each a list
+        # holding the tags of its rel elements once it is closed, or None
+        # until then, so that rels are parsed in the same order as by Parser
+        self._rels = collections.deque()
+        # those that are open, innermost last
+        self._open_rels = []
+        # the number of open rel elements outside roots: the elements within
+        # them are kept until they are closed for their text
+        self._rel_depth = 0
+        self._head = None
+        self._in_head = False
+        self._soup = BeautifulSoup("", features="lxml")
+        self._items = collections.deque()
+        self._rel_urls = collections.deque()
+
+    def feed(self, data):
+        """Feed the next chunk of the document.
+
+        Args:
+          data (string or bytes): the next chunk of the document. All chunks
+            must be of the same type.
+        """
+        self._started = True
+        self._parser.feed(data)
+        self._handle_events()
+
+    def close(self):
+        """Signal the end of the document, closing all open elements."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._started:
+            self._parser.close()
+            self._handle_events()
+
+        if self.__metaformats and self._head is not None:
+            soup = BeautifulSoup("", features="lxml")
+            html = soup.new_tag("html")
+            soup.append(html)
+            html.append(self._head)
+            item = metaformats.parse(soup, url=self.__url__)
+            if item:
+                self._items.append(item)
+
+        rels.sort_rel_urls(self.__parsed__)
+
+    def iter_items(self):
+        """Yield the top-level microformats closed since the last call"""
+        while self._items:
+            yield self._items.popleft()
+
+    def iter_rels(self):
+        """Yield (url, rel-urls entry) for the rel elements parsed since the
+        last call. An entry can be updated by later rel elements with the
+        same URL."""
+        while self._rel_urls:
+            url = self._rel_urls.popleft()
+            yield url, self.__parsed__["rel-urls"][url]
+
+    def to_dict(self):
+        """Get the "rels", "rel-urls" and "debug" parts of the mf2json dict.
+
+        The items are only given by iter_items(), so they are not included.
+
+        Returns:
+            dict: representation of the parsed document without "items"
+        """
+        return self.__parsed__
+
+    def _is_root(self, el):
+        classes = el.get("class", "").split()
+        return mf2_classes.root(classes, self.filtered_roots) or backcompat.root(
+            classes
+        )
+
+    def _handle_events(self):
+        for event, el in self._parser.read_events():
+            if not isinstance(el.tag, str):
+                continue
+            if event == "start":
+                self._start(el)
+            else:
+                self._end(el)
+
+    def _start(self, el):
+        if el.tag == "base" and not self._base_found:
+            self._base_found = True
+            self.__url__ = _base_url(self.__url__, el.get("href"))
+        elif el.tag == "html" and not self._html_found:
+            self._html_found = True
+            self.lang = el.get("lang")
+        elif el.tag == "head":
+            self._in_head = True
+        elif el.tag == "template":
+            self._template_depth += 1
+
+        if self._root is None and not self._template_depth and self._is_root(el):
+            self._root = el
+            self._open_rel_entry()
+        elif (
+            self._root is None
+            and el.tag in ("a", "area", "link")
+            and "rel" in el.attrib
+        ):
+            self._rel_depth += 1
+            self._open_rel_entry()
+
+    def _open_rel_entry(self):
+        entry = [None]
+        self._rels.append(entry)
+        self._open_rels.append(entry)
+
+    def _close_rel_entry(self, tags):
+        """Set the tags of the rel elements of the innermost open entry and
+        parse the rels of the closed entries that are first"""
+        self._open_rels.pop()[0] = tags
+        while self._rels and self._rels[0][0] is not None:
+            for tag in self._rels.popleft()[0]:
+                url = rels.parse(tag, self.__url__, self.__parsed__)
+                self._rel_urls.append(url)
+
+    def _end(self, el):
+        if el.tag == "template":
+            self._template_depth -= 1
+        elif el.tag == "head":
+            self._in_head = False
+            if self._head is None and self.__metaformats:
+                self._head = _to_soup(el, self._soup).extract()
+
+        # the rel elements of a root are parsed with its microformats
+        if (
+            self._root is None
+            and el.tag in ("a", "area", "link")
+            and "rel" in el.attrib
+        ):
+            self._rel_depth -= 1
+            if self._template_depth:
+                # the strings of templates are not part of the text
+                template = self._soup.handle_starttag("template", None, None, {})
+                tag = _to_soup(el, self._soup)
+                self._soup.handle_endtag("template")
+                template.extract()
+            else:
+                tag = _to_soup(el, self._soup).extract()
+            self._close_rel_entry([tag])
+
+        if el is self._root:
+            self._root = None
+            items, tags = self._parse_root(el)
+            self._items.extend(items)
+            self._close_rel_entry(tags)
+            if not self._rel_depth:
+                _discard(el)
+        elif self._root is None and not self._in_head and not self._rel_depth:
+            _discard(el)
+
+    def _parse_root(self, el):
+        """Parse the microformats of a top-level root element and return them
+        with its rel elements"""
+        soup = BeautifulSoup("", features="lxml")
+        if el.tag != "html":
+            soup.handle_starttag(
+                "html", None, None, {"lang": self.lang} if self.lang else {}
+            )
+        _to_soup(el, soup)
+        parser = Parser(
+            soup,
+            self.__url__,
+            expose_dom=self.expose_dom,
+            filter_roots=self.filter_roots,
+            lazy=True,
+        )
+        # the document is only built for this root, so let the templates be
+        # removed from e-* properties as they are when parsing markup
+        parser._preserve_doc = False
+        items = parser.items
+        # the rel elements of those templates are gone with them
+        return items, soup.find_all(("a", "area", "link"), rel=True)
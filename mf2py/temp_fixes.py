@@ -1,3 +1,7 @@
-def rm_templates(doc):
-    for el in doc.find_all("template"):
-        el.extract()
+from .dom_adapters import BS4
+
+
+def rm_templates(doc, dom=BS4):
+    for el in list(dom.descendants(doc)):
+        if dom.tag_name(el) == "template":
+            dom.remove(el)
@@ -9,57 +9,59 @@ from .datetime_helpers import (
     TIMEZONE_RE,
     normalize_datetime,
 )
+from .dom_adapters import BS4
 from .dom_helpers import get_children
 
 
-def _get_vcp_value(el):
-    if "value-title" in el.get("class", []):
-        return el.get("title")
-    return el.get_text()
+def _get_vcp_value(el, dom):
+    if "value-title" in dom.get_attr(el, "class", []):
+        return dom.get_attr(el, "title")
+    return dom.text(el)
 
 
-def _get_vcp_children(el):
+def _get_vcp_children(el, dom):
     return [
         c
-        for c in get_children(el)
-        if c.has_attr("class")
-        and ("value" in c["class"] or "value-title" in c["class"])
+        for c in get_children(el, dom=dom)
+        if (classes := dom.get_attr(c, "class")) is not None
+        and ("value" in classes or "value-title" in classes)
     ]
 
 
-def text(el):
-    value_els = _get_vcp_children(el)
+def text(el, dom=BS4):
+    value_els = _get_vcp_children(el, dom)
     if value_els:
-        return "".join(_get_vcp_value(el) for el in value_els)
+        return "".join(_get_vcp_value(el, dom) for el in value_els)
 
 
-def datetime(el, default_date=None):
-    value_els = _get_vcp_children(el)
+def datetime(el, default_date=None, dom=BS4):
+    value_els = _get_vcp_children(el, dom)
     if value_els:
         date_parts = []
         for value_el in value_els:
-            if "value-title" in value_el.get("class", []):
-                title = el.get("title")
+            name = dom.tag_name(value_el)
+            if "value-title" in dom.get_attr(value_el, "class", []):
+                title = dom.get_attr(el, "title")
                 if title:
                     date_parts.append(title.strip())
-            elif value_el.name in ("img", "area"):
-                alt = value_el.get("alt") or value_el.get_text()
+            elif name in ("img", "area"):
+                alt = dom.get_attr(value_el, "alt") or dom.text(value_el)
                 if alt:
                     date_parts.append(alt.strip())
-            elif value_el.name == "data":
-                val = value_el.get("value") or value_el.get_text()
+            elif name == "data":
+                val = dom.get_attr(value_el, "value") or dom.text(value_el)
                 if val:
                     date_parts.append(val.strip())
-            elif value_el.name == "abbr":
-                title = value_el.get("title") or value_el.get_text()
+            elif name == "abbr":
+                title = dom.get_attr(value_el, "title") or dom.text(value_el)
                 if title:
                     date_parts.append(title.strip())
-            elif value_el.name in ("del", "ins", "time"):
-                dt = value_el.get("datetime") or value_el.get_text()
+            elif name in ("del", "ins", "time"):
+                dt = dom.get_attr(value_el, "datetime") or dom.text(value_el)
                 if dt:
                     date_parts.append(dt.strip())
             else:
-                val = value_el.get_text()
+                val = dom.text(value_el)
                 if val:
                     date_parts.append(val.strip())
 
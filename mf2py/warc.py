@@ -0,0 +1,254 @@
+"""Read the HTTP responses of WARC archives, e.g. the output of web crawlers,
+and parse them without unpacking the archive first.
+
+Archives are read as a stream, one record at a time, whether they are plain or
+gzip-compressed with one gzip member per record.
+"""
+
+import collections
+import gzip
+import io
+import zlib
+
+from .batch import parse_many
+from .parser import parse
+
+# read and discard skipped records in blocks of this many bytes
+_SKIP_BLOCK_SIZE = 64 * 1024
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+WarcResponse = collections.namedtuple(
+    "WarcResponse", ["record_id", "url", "status", "content_type", "doc"]
+)
+
+
+def _read_headers(fp):
+    """Read header lines up to a blank line into a dict by lowercase name"""
+    headers = {}
+    name = None
+    while True:
+        line = fp.readline()
+        if not line.strip():
+            return headers
+        line = line.decode("utf-8", "replace")
+        if line[0] in " \t" and name is not None:
+            # folded continuation of the previous header
+            headers[name] += " " + line.strip()
+            continue
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        headers[name] = value.strip()
+
+
+def _skip(fp, length):
+    """Discard the next length bytes of a stream"""
+    while length > 0:
+        block = fp.read(min(length, _SKIP_BLOCK_SIZE))
+        if not block:
+            return
+        length -= len(block)
+
+
+def _content_type(value):
+    """Split a Content-Type header into its lowercase MIME type and charset"""
+    mime_type, *params = value.split(";")
+    charset = None
+    for param in params:
+        name, _, param_value = param.partition("=")
+        if name.strip().lower() == "charset":
+            charset = param_value.strip().strip("\"'") or None
+    return mime_type.strip().lower(), charset
+
+
+def _dechunk(body):
+    """Decode a body sent with Transfer-Encoding: chunked"""
+    chunks = []
+    stream = io.BytesIO(body)
+    while True:
+        size = stream.readline().split(b";")[0].strip()
+        if not size:
+            break
+        size = int(size, 16)
+        if size == 0:
+            break
+        chunks.append(stream.read(size))
+        stream.readline()
+    return b"".join(chunks)
+
+
+def _decode_body(body, headers):
+    """Undo the transfer and content encodings of an HTTP body, keeping the
+    body as stored if they can not be undone"""
+    try:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = _dechunk(body)
+        encoding = headers.get("content-encoding", "").strip().lower()
+        if encoding in ("gzip", "x-gzip"):
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                # some servers send raw deflate data
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+    except (ValueError, zlib.error):
+        pass
+    return body
+
+
+def _http_response(block):
+    """Split an HTTP response block into its status, headers and body"""
+    stream = io.BytesIO(block)
+    status_line = stream.readline().split()
+    try:
+        status = int(status_line[1])
+    except (IndexError, ValueError):
+        status = None
+    headers = _read_headers(stream)
+    return status, headers, _decode_body(stream.read(), headers)
+
+
+def _open(fp):
+    """Get a binary stream of the records of an archive, decompressing it if
+    it is gzipped"""
+    if not hasattr(fp, "peek"):
+        fp = io.BufferedReader(fp)
+    if fp.peek(2)[:2] == b"\x1f\x8b":
+        # reads all the gzip members one after the other
+        return gzip.GzipFile(fileobj=fp)
+    return fp
+
+
+def iter_warc_responses(fp, html_only=True):
+    """
+    Iterate over the HTTP responses of a WARC archive.
+
+    Only WARC response records are read; the other records, e.g. requests,
+    metadata, and the plain text conversion records of WET files which have no
+    markup left to parse, are skipped without being kept in memory.
+
+    Args:
+      fp (file or string): binary file object or path of the archive, plain or
+        gzip-compressed
+      html_only (boolean): optional, skip the responses whose Content-Type is
+        not HTML. Defaults to True.
+
+    Yields:
+      WarcResponse: named tuple of (record_id, url, status, content_type,
+        doc) where url is the WARC-Target-URI and doc is the body of the
+        response, decoded to a string with the charset of its Content-Type if
+        it has one, otherwise bytes.
+    """
+    if isinstance(fp, str):
+        with open(fp, "rb") as f:
+            yield from iter_warc_responses(f, html_only)
+        return
+
+    stream = _open(fp)
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        if not line.strip():
+            # the blank lines ending the previous record
+            continue
+        if not line.startswith(b"WARC/"):
+            raise ValueError("Not a WARC record: {0!r}".format(line[:100]))
+
+        headers = _read_headers(stream)
+        length = int(headers.get("content-length", 0))
+        if headers.get("warc-type") != "response" or not headers.get(
+            "content-type", ""
+        ).startswith("application/http"):
+            _skip(stream, length)
+            continue
+
+        status, http_headers, body = _http_response(stream.read(length))
+        mime_type, charset = _content_type(http_headers.get("content-type", ""))
+        if html_only and mime_type and mime_type not in _HTML_TYPES:
+            continue
+
+        doc = body
+        if charset is not None:
+            try:
+                doc = body.decode(charset, "replace")
+            except LookupError:
+                # unknown charset, so leave it to the parser to detect
+                pass
+        yield WarcResponse(
+            headers.get("warc-record-id"),
+            headers.get("warc-target-uri", "").strip("<>") or None,
+            status,
+            mime_type or None,
+            doc,
+        )
+
+
+def parse_warc(
+    fp,
+    workers=1,
+    html_parser=None,
+    metaformats=False,
+    filter_roots=False,
+    prescan=False,
+    memory=False,
+):
+    """
+    Parse the HTML responses of a WARC archive, with the WARC-Target-URI of
+    each response as its URL.
+
+    Example:
+      with open("crawl.warc.gz", "rb") as fp:
+          for record_id, mf2json in mf2py.parse_warc(fp, workers=8):
+              ...
+
+    Args:
+      fp (file or string): binary file object or path of the archive, plain or
+        gzip-compressed
+      workers (int): optional, number of worker processes to parse the
+        responses in, as with parse_many(). Defaults to 1, parsing them in this
+        process in archive order.
+      html_parser (string): optional, select a specific HTML parser. Valid options
+        from the BeautifulSoup documentation are: "html", "xml","html5", "lxml",
+        "html5lib", and "html.parser".
+      metaformats (boolean): optional, include metaformats extracted from OGP
+        and Twitter card data: https://microformats.org/wiki/metaformats
+      filter_roots (boolean or list): optional, filter root class names. Use
+        True to filter known conflicting classes, otherwise filter given list.
+      prescan (boolean): optional, skip parsing the responses that
+        may_contain_microformats() finds have no microformats or rel links.
+      memory (boolean): optional, add the peak and retained bytes of each
+        phase of parsing to the "debug" dict of every result, as with Parser.
+
+    Yields:
+      tuple: (record_id, result) where result is a mf2json dict, or the
+        exception raised while parsing that response. With several workers
+        they are in completion order.
+    """
+    options = {
+        "html_parser": html_parser,
+        "metaformats": metaformats,
+        "filter_roots": filter_roots,
+        "prescan": prescan,
+        "memory": memory,
+    }
+    responses = iter_warc_responses(fp)
+    if workers == 1:
+        for response in responses:
+            try:
+                result = parse(response.doc, response.url, **options)
+            except Exception as e:
+                result = e
+            yield response.record_id, result
+        return
+
+    # the record IDs of the responses in flight by their index
+    record_ids = {}
+
+    def docs():
+        for index, response in enumerate(responses):
+            record_ids[index] = response.record_id
+            yield response.doc, response.url
+
+    for index, result in parse_many(docs(), workers=workers, **options):
+        yield record_ids.pop(index), result
@@ -1,12 +1,18 @@
+import asyncio
 import os
 import re
 import sys
+from concurrent.futures.process import BrokenProcessPool
 from unittest import TestCase, mock
 
 import bs4
+import pytest
+import requests
 from bs4 import BeautifulSoup
 
+import mf2py
 from mf2py import Parser
+from mf2py.batch import _parse_chunk
 
 TestCase.maxDiff = None
 
@@ -876,6 +882,103 @@ def test_backcompat_hentry_content_html():
     )
 
 
+def test_backcompat_document_unchanged():
+    """Confirm that mf1 classnames are translated without changing the document"""
+    from mf2py import dom_adapters
+
+    html = (
+        '<div class="hentry"><p class="entry-title p-summary">Title</p>'
+        '<div class="entry-content"><a rel="tag" href="/tags/cat">cat</a></div>'
+        '<div class="hentry"><p class="entry-title">Child</p>'
+        '<a rel="tag" href="/tags/dog">dog</a></div></div>'
+    )
+    for dom_backend in ("bs4", "lxml", "compact"):
+        dom = dom_adapters.get_adapter(dom_backend)
+        doc = dom.parse(html)
+        before = [dom.outer_html(el) for el in dom.children(doc)]
+        entry = Parser(doc, dom_backend=dom_backend).to_dict()["items"][0]
+        assert [dom.outer_html(el) for el in dom.children(doc)] == before
+        assert entry["properties"]["name"] == ["Title"]
+        assert entry["properties"]["category"] == ["cat"]
+        assert entry["properties"]["content"][0]["html"] == (
+            '<a href="/tags/cat" rel="tag">cat</a>'
+        )
+        (child,) = entry["children"]
+        assert child["properties"] == {"name": ["Child"], "category": ["dog"]}
+
+
+def test_backcompat_nested_rel_tag():
+    """Confirm that rel=tag links inside rel=tag links give the same categories
+    as when the rules were applied to copies of the roots"""
+    # the markup parser is the same for all the backends as html5lib moves
+    # nested links out of each other. BeautifulSoup walked the outer links
+    # again, dropping the categories within them
+    for dom_backend, html_parser, nested in (
+        ("bs4", "lxml", False),
+        ("lxml", None, True),
+        ("compact", None, True),
+    ):
+        result = Parser(
+            '<div class="hfeed"><a rel="tag" href="/t/a">'
+            '<link rel="tag" href="/t/b"></a></div>',
+            dom_backend=dom_backend,
+            html_parser=html_parser,
+        ).to_dict()
+        assert result["items"][0]["properties"] == {
+            "category": ["a", "b"] if nested else ["a"]
+        }
+
+        result = Parser(
+            '<section class="hfeed"><a href="rel/y" rel="tag me"><li>'
+            '<a href="rel/y" rel="tag me"></a></li></a></section>',
+            dom_backend=dom_backend,
+            html_parser=html_parser,
+        ).to_dict()
+        assert result["items"][0]["properties"] == {
+            "category": ["y", "y"] if nested else ["y"]
+        }
+
+
+def test_backcompat_implied_in_overlay():
+    """Confirm that the implied properties of microformats within mf1 roots
+    are found with the p-category elements of rel=tag links"""
+    html = (
+        '<div class="hentry"><span class="author"><a rel="tag" href="/tags/x">'
+        '<img alt="Alt" src="p.png"></a></span></div>'
+    )
+    for dom_backend in ("bs4", "lxml", "compact"):
+        entry = Parser(
+            html, url="http://example.com/", dom_backend=dom_backend
+        ).to_dict()["items"][0]
+        assert entry["properties"]["author"] == [
+            {
+                "type": ["h-card"],
+                "properties": {
+                    "category": ["x"],
+                    "url": ["http://example.com/tags/x"],
+                },
+                "value": "Alt",
+            }
+        ]
+
+
+def test_backcompat_parsed_again():
+    """Confirm that an mf1 root that is the value of two properties is
+    translated each time, with the URLs made absolute in between"""
+    html = (
+        '<time class="h-entry"><b class="hentry e-content dt-published">'
+        '<area href="" rel="tag"/></b></time>'
+    )
+    for dom_backend in ("bs4", "lxml", "compact"):
+        entry = Parser(
+            html, url="http://example.com/p", dom_backend=dom_backend
+        ).to_dict()["items"][0]
+        assert entry["properties"]["published"][0]["properties"] == {}
+        (content,) = entry["properties"]["content"]
+        assert content["properties"] == {"category": ["p"]}
+        assert content["html"] == '<area href="http://example.com/p" rel="tag"/>'
+
+
 def test_whitespace_with_tags_inside_property():
     """Whitespace should only be trimmed at the ends of textContent, not inside.
 
@@ -1227,3 +1330,1192 @@ def test_parser_object():
         '["h-card"], "properties": {"name": ["Frank"]}}, {"type": ["h-card"], '
         '"properties": {"name": ["Cosmo"]}}]'
     )
+
+
+def test_parse_many():
+    docs = [
+        '<div class="h-card">Jerry</div>',
+        ('<a class="h-card" href="/frank">Frank</a>', "http://example.com/"),
+        b'<div class="h-entry"><p class="p-name">Cosmo</p></div>',
+    ]
+    results = dict(mf2py.parse_many(docs, workers=2, chunk_size=1))
+    assert sorted(results) == [0, 1, 2]
+    assert results[0]["items"][0]["properties"]["name"] == ["Jerry"]
+    assert results[1]["items"][0]["properties"]["url"] == ["http://example.com/frank"]
+    assert results[2]["items"][0]["properties"]["name"] == ["Cosmo"]
+    assert results[2] == mf2py.parse(docs[2])
+
+
+def test_parse_many_error():
+    docs = ['<div class="h-card">Jerry</div>', 42, "<div class=h-card>Frank</div>"]
+    results = dict(mf2py.parse_many(docs, workers=1))
+    # a failing document does not affect the others
+    assert isinstance(results[1], Exception)
+    assert results[0]["items"][0]["properties"]["name"] == ["Jerry"]
+    assert results[2]["items"][0]["properties"]["name"] == ["Frank"]
+
+
+def _parse_chunk_or_exit(chunk, options):
+    """Stand in for parse_many's worker function, exiting the worker like the
+    OOM killer for a chunk with the document crash"""
+    if any(doc == "crash" for _, doc, _ in chunk):
+        os._exit(1)
+    return _parse_chunk(chunk, options)
+
+
+def test_parse_many_worker_killed():
+    docs = ["<p class=h-card>%d</p>" % i for i in range(10)]
+    docs += ["crash"] + ["<p class=h-card>%d</p>" % i for i in range(11, 61)]
+    with mock.patch("mf2py.batch._parse_chunk", _parse_chunk_or_exit):
+        results = dict(mf2py.parse_many(docs, workers=2, chunk_size=1))
+    # only the document that killed its worker fails
+    assert sorted(results) == list(range(61))
+    assert isinstance(results[10], BrokenProcessPool)
+    for index, result in results.items():
+        if index != 10:
+            assert result["items"][0]["properties"]["name"] == [str(index)]
+
+
+def test_parse_many_chunks():
+    from mf2py.batch import _chunks
+
+    docs = ["a" * 10, "b" * 10, "c" * 100, "d" * 10]
+    chunks = [[index for index, _, _ in chunk] for chunk in _chunks(docs, 50)]
+    # a large document gets a chunk of its own
+    assert chunks == [[0, 1], [2], [3]]
+
+
+def _mock_response(url, text, content_type="text/html"):
+    resp = mock.MagicMock()
+    resp.url = url
+    resp.text = text
+    resp.content = text.encode("utf-8")
+    resp.headers = {"content-type": content_type}
+    return resp
+
+
+@mock.patch("requests.Session.close")
+@mock.patch("requests.Session.get")
+def test_parse_url_async(getter, close):
+    getter.return_value = _mock_response(
+        "http://example.com/final/",
+        '<a class="h-card" href="me">Jerry</a>',
+        content_type="text/html; charset=utf-8",
+    )
+
+    result = asyncio.run(mf2py.parse_url_async("http://example.com/"))
+    getter.assert_called_with(
+        "http://example.com/", headers={"User-Agent": Parser.useragent}
+    )
+    # the final URL after redirects is used
+    assert result["items"][0]["properties"]["url"] == ["http://example.com/final/me"]
+    # the calls without a session share one, left open to be reused
+    from mf2py import aio
+
+    session = aio._default_session()
+    asyncio.run(mf2py.parse_url_async("http://example.com/"))
+    assert aio._default_session() is session
+    close.assert_not_called()
+
+    # so is a session passed in
+    session = requests.Session()
+    asyncio.run(mf2py.parse_url_async("http://example.com/", session=session))
+    close.assert_not_called()
+
+
+@mock.patch("requests.Session.get")
+def test_parse_urls_async(getter):
+    def get(url, headers):
+        if url.endswith("bad"):
+            raise requests.ConnectionError(url)
+        return _mock_response(url, '<p class="h-entry">%s</p>' % url)
+
+    getter.side_effect = get
+
+    async def collect():
+        urls = ["http://a.example/1", "http://a.example/bad", "http://b.example/2"]
+        return {
+            index: result
+            async for index, result in mf2py.parse_urls_async(urls, per_host=1)
+        }
+
+    results = asyncio.run(collect())
+    assert results[0]["items"][0]["properties"]["name"] == ["http://a.example/1"]
+    assert isinstance(results[1], requests.ConnectionError)
+    assert results[2]["items"][0]["properties"]["name"] == ["http://b.example/2"]
+
+    # URLs are taken as others are done rather than all at once
+    taken = []
+
+    def take(count):
+        for i in range(count):
+            taken.append(i)
+            yield "http://a.example/%d" % i
+
+    async def first():
+        async for index, result in mf2py.parse_urls_async(take(5), concurrency=2):
+            return len(taken)
+
+    assert asyncio.run(first()) == 2
+
+
+def test_streaming_parser():
+    with open(os.path.join(TEST_DIR, "festivus.html"), "rb") as f:
+        doc = f.read()
+    expected = Parser(doc, url="http://example.com", html_parser="lxml").to_dict()
+
+    p = mf2py.StreamingParser(url="http://example.com")
+    items = []
+    for i in range(0, len(doc), 64):
+        p.feed(doc[i : i + 64])
+        items.extend(p.iter_items())
+    p.close()
+    items.extend(p.iter_items())
+
+    assert items == expected["items"]
+    assert p.to_dict()["rels"] == expected["rels"]
+    assert p.to_dict()["rel-urls"] == expected["rel-urls"]
+
+
+def test_streaming_parser_yields_closed_items():
+    p = mf2py.StreamingParser(url="http://example.com")
+    p.feed(
+        '<html lang="en"><body><div class="h-card">Jerry</div>'
+        '<a rel="me" href="/jerry">me</a><div class="h-card">'
+    )
+    assert list(p.iter_items()) == [
+        {"type": ["h-card"], "properties": {"name": ["Jerry"]}, "lang": "en"}
+    ]
+    assert list(p.iter_rels()) == [
+        ("http://example.com/jerry", {"text": "me", "rels": ["me"]})
+    ]
+    p.feed("Frank</div></body></html>")
+    p.close()
+    assert list(p.iter_items()) == [
+        {"type": ["h-card"], "properties": {"name": ["Frank"]}, "lang": "en"}
+    ]
+
+
+def test_streaming_parser_templates():
+    # the templates of e-* properties are dropped with their rel elements,
+    # except within classic microformats
+    doc = (
+        '<div class="h-entry"><div class="e-content"><template>'
+        '<a rel="me" href="/me">me</a></template>Hello</div></div>'
+        '<template><a rel="x" href="/x">x</a></template>'
+        '<p class="vcard"><span class="entry-content"><template>'
+        '<a rel="author" href="/a">a</a></template></span></p>'
+    )
+    expected = mf2py.parse(doc, url="http://example.com", html_parser="lxml")
+
+    p = mf2py.StreamingParser(url="http://example.com")
+    p.feed(doc)
+    p.close()
+    assert list(p.iter_items()) == expected["items"]
+    assert p.to_dict()["rels"] == expected["rels"]
+    assert sorted(expected["rels"]) == ["author", "x"]
+    assert p.to_dict()["rel-urls"] == expected["rel-urls"]
+
+
+def test_streaming_parser_rel_children():
+    # the elements within rel elements are kept for their text, and the rels
+    # are in document order even within roots and other rel elements
+    doc = (
+        '<a rel="me" href="/me"><span>Jane</span> <b>Doe</b></a>'
+        '<a rel="author" href="/card"><div class="h-card"><span class="p-name">'
+        'Jo</span> <a rel="tag" href="/t">t</a></div> <i>Jo</i></a>'
+        '<a rel="x" href="/x">x <template><a rel="y" href="/y">y</a></template>'
+        '<link rel="z" href="/z"></a>'
+    )
+    expected = mf2py.parse(doc, url="http://example.com", html_parser="lxml")
+
+    p = mf2py.StreamingParser(url="http://example.com")
+    for i in range(0, len(doc), 16):
+        p.feed(doc[i : i + 16])
+    p.close()
+    assert list(p.iter_items()) == expected["items"]
+    assert p.to_dict()["rels"] == expected["rels"]
+    assert list(p.to_dict()["rels"]) == list(expected["rels"])
+    assert p.to_dict()["rel-urls"] == expected["rel-urls"]
+    assert list(p.to_dict()["rel-urls"]) == list(expected["rel-urls"])
+    assert expected["rel-urls"]["http://example.com/me"]["text"] == "Jane Doe"
+
+
+def test_streaming_parser_metaformats():
+    with open(os.path.join(TEST_DIR, "metaformats_ogp.html")) as f:
+        doc = f.read()
+    expected = parse_fixture("metaformats_ogp.html", metaformats=True)
+
+    p = mf2py.StreamingParser(metaformats=True)
+    p.feed(doc)
+    p.close()
+    assert list(p.iter_items()) == expected["items"]
+
+
+def test_scan_document():
+    from mf2py.parser import _scan_document
+
+    soup = BeautifulSoup(
+        '<html lang="en"><head><base href="/a/"><base href="/b/"></head><body>'
+        '<div class="h-entry"><a class="h-card" rel="author" href="/me">Me</a></div>'
+        '<template><a rel="me" href="/t">t</a><p class="h-card">t</p></template>'
+        '<p class="vcard"><a rel="me" href="/v">v</a></p></body></html>',
+        "html5lib",
+    )
+    base, html, roots, rel_els = _scan_document(soup, set())
+    assert base["href"] == "/a/"
+    assert html["lang"] == "en"
+    # nested roots and roots in templates are not top-level roots
+    assert [(el.name, names, mode) for el, names, mode in roots] == [
+        ("div", {"h-entry"}, False),
+        ("p", ["vcard"], True),
+    ]
+    assert [(el["href"], in_template) for el, in_template in rel_els] == [
+        ("/me", False),
+        ("/t", True),
+        ("/v", False),
+    ]
+
+
+def test_rels_in_embedded_templates():
+    result = Parser(
+        '<template><a rel="me" href="/x">x</a></template><div class="h-entry">'
+        '<div class="e-content"><template><a rel="author" href="/y">y</a>'
+        "</template></div></div>",
+        url="http://example.com/",
+    ).to_dict()
+    # templates are removed from e-* properties before rels are parsed
+    assert result["rels"] == {"me": ["http://example.com/x"]}
+
+
+def test_lazy():
+    with open(os.path.join(TEST_DIR, "festivus.html")) as f:
+        doc = f.read()
+    expected = Parser(doc).to_dict()
+
+    p = Parser(doc, lazy=True)
+    assert not p._items_parsed and not p._rels_parsed
+    assert p.rels == expected["rels"]
+    assert p.rel_urls == expected["rel-urls"]
+    assert not p._items_parsed
+    assert len(p.to_dict(filter_by_type="h-card")) == 3
+    assert p._items_parsed
+    assert p.to_dict() == expected
+
+    p = Parser(doc, lazy=True)
+    assert p.items == expected["items"]
+    assert not p._rels_parsed
+    assert p.to_json() == Parser(doc).to_json()
+
+
+def test_lazy_rels_in_embedded_templates():
+    doc = (
+        '<div class="h-entry"><div class="e-content"><template>'
+        '<a rel="author" href="/y">y</a></template></div></div>'
+    )
+    # rels are the same when parsed before the items
+    assert Parser(doc, lazy=True).rels == Parser(doc).rels == {}
+
+
+def test_types():
+    with open(os.path.join(TEST_DIR, "festivus.html")) as f:
+        doc = f.read()
+    p = Parser(doc)
+    assert Parser(doc, types=["h-card"]).to_dict()["items"] == p.to_dict(
+        filter_by_type="h-card"
+    )
+    assert Parser(doc, types="h-entry").to_dict()["items"] == p.to_dict(
+        filter_by_type="h-entry"
+    )
+    assert len(Parser(doc, types=["h-card", "h-entry"]).to_dict()["items"]) == 7
+
+
+def test_types_nested():
+    doc = """<div class="h-feed"><p class="p-name">Feed</p>
+    <div class="h-entry"><p class="p-name">One</p>
+    <div class="p-author h-card">Jerry</div></div>
+    <div class="hentry"><p class="entry-title">Two</p></div>
+    </div><p class="h-card">Frank</p>"""
+    result = mf2py.parse(doc, types=["h-entry"])
+    assert [item["type"] for item in result["items"]] == [["h-entry"], ["h-entry"]]
+    assert result["items"][0]["properties"]["name"] == ["One"]
+    assert result["items"][0]["properties"]["author"][0]["value"] == "Jerry"
+    assert result["items"][1]["properties"]["name"] == ["Two"]
+    # the h-feed itself is not parsed
+    assert (
+        mf2py.parse(doc, types=["h-feed"])["items"]
+        == mf2py.parse(doc, types=["h-feed", "h-card"])["items"][:1]
+    )
+
+
+def test_types_metaformats():
+    result = parse_fixture("metaformats_ogp.html", metaformats=True, types=["h-card"])
+    assert result["items"] == []
+
+
+def test_properties():
+    with open(os.path.join(TEST_DIR, "eras.html")) as f:
+        doc = f.read()
+    full = mf2py.parse(doc)["items"][0]
+    result = mf2py.parse(doc, properties=["name", "author"])["items"][0]
+    assert result["properties"]["name"] == full["properties"]["name"]
+    # nested microformats are projected too
+    assert result["properties"]["author"] == [
+        {
+            "type": ["h-card"],
+            "properties": {"name": ["James"]},
+            "value": "James",
+            "lang": "en-us",
+        }
+    ]
+    assert set(result["properties"]) == {"name", "author"}
+
+
+def test_properties_nested_value():
+    doc = """<div class="h-entry"><p class="p-name">Entry</p>
+    <div class="p-author h-card"><a class="p-name u-url" href="/jerry">Jerry</a>
+    Seinfeld</div></div>"""
+    result = mf2py.parse(doc, properties=["author"])
+    author = result["items"][0]["properties"]["author"][0]
+    # the value still comes from the name, which is not included
+    assert author == {"type": ["h-card"], "properties": {}, "value": "Jerry"}
+
+
+def test_properties_default_date():
+    doc = """<div class="h-event"><time class="dt-start">2023-01-02 10:00</time>
+    <time class="dt-end">11:00</time></div>"""
+    result = mf2py.parse(doc, properties=["end"])
+    # the date of the end is still taken from the start
+    assert result["items"][0]["properties"] == {"end": ["2023-01-02 11:00"]}
+
+
+def test_dom_backends_conformance():
+    # the lxml and compact backends give the same results as bs4 with the
+    # lxml parser
+    for path in sorted(os.listdir(TEST_DIR)):
+        if not path.endswith(".html"):
+            continue
+        with open(os.path.join(TEST_DIR, path), "rb") as f:
+            doc = f.read()
+        for options in ({}, {"metaformats": True}, {"filter_roots": True}):
+            expected = Parser(
+                doc, url="http://example.com/a/", html_parser="lxml", **options
+            ).to_dict()
+            for dom_backend in ("lxml", "compact"):
+                result = Parser(
+                    doc, url="http://example.com/a/", dom_backend=dom_backend, **options
+                ).to_dict()
+                assert result == expected, (path, dom_backend)
+
+
+def test_dom_adapters():
+    from lxml import etree
+
+    from mf2py import dom_adapters
+
+    doc = """<div id="el" class=" a  b "><p>x &amp; y &lt;z&gt;\xa0</p>
+    <pre>  pre\n  <b> </b> </pre>
+    <script>a < b</script><!-- comment -->
+    <img alt='say "hi"' src=x title="it's &quot;ok&quot;"><input disabled>
+    <ruby>a<rt>b</rt></ruby><template><i>t</i></template>tail</div>"""
+    # backends must implement the whole interface
+    with pytest.raises(TypeError):
+        dom_adapters.DOMAdapter()
+
+    bs4_dom = dom_adapters.BS4
+    lxml_dom = dom_adapters.get_adapter("lxml")
+    soup = bs4_dom.parse(doc, "lxml")
+    tree = lxml_dom.parse(doc)
+    assert isinstance(tree, etree._ElementTree)
+    assert lxml_dom.markup_parser(tree) == "lxml"
+
+    bs4_el = soup.find(id="el")
+    lxml_el = tree.getroot().find(".//div")
+    for attr in ("class", "id", "missing"):
+        assert bs4_dom.get_attr(bs4_el, attr) == lxml_dom.get_attr(lxml_el, attr)
+    assert bs4_dom.text(bs4_el) == lxml_dom.text(lxml_el)
+    assert bs4_dom.inner_html(bs4_el) == lxml_dom.inner_html(lxml_el)
+    assert [bs4_dom.tag_name(c) for c in bs4_dom.children(bs4_el)] == [
+        lxml_dom.tag_name(c) for c in lxml_dom.children(lxml_el)
+    ]
+    assert [bs4_dom.tag_name(c) for c in bs4_dom.descendants(bs4_el)] == [
+        lxml_dom.tag_name(c) for c in lxml_dom.descendants(lxml_el)
+    ]
+    assert lxml_dom.contains(tree, lxml_el)
+    assert not lxml_dom.contains(tree, lxml_dom.copy(lxml_el))
+
+    compact_dom = dom_adapters.get_adapter("compact")
+    document = compact_dom.parse(doc)
+    assert dom_adapters.get_adapter(None, document).name == "compact"
+    compact_el = next(
+        el
+        for el in compact_dom.descendants(document)
+        if compact_dom.get_attr(el, "id") == "el"
+    )
+    assert list(compact_dom.get_attr(compact_el, "class")) == ["a", "b"]
+    assert compact_dom.text(compact_el) == bs4_dom.text(bs4_el)
+    assert compact_dom.inner_html(compact_el) == bs4_dom.inner_html(bs4_el)
+    assert [compact_dom.tag_name(c) for c in compact_dom.descendants(compact_el)] == [
+        bs4_dom.tag_name(c) for c in bs4_dom.descendants(bs4_el)
+    ]
+    el_copy = compact_dom.copy(compact_el)
+    assert compact_dom.inner_html(el_copy) == compact_dom.inner_html(compact_el)
+    assert compact_dom.contains(document, compact_el)
+    assert not compact_dom.contains(document, el_copy)
+    compact_dom.remove(compact_dom.children(el_copy)[0])
+    assert compact_dom.tag_name(compact_dom.children(el_copy)[0]) == "pre"
+    assert compact_dom.tag_name(compact_dom.children(compact_el)[0]) == "p"
+
+    with pytest.raises(ValueError):
+        dom_adapters.get_adapter("dom")
+
+
+def test_dom_backends_huge_tree():
+    # lxml would truncate such values without its huge_tree option
+    photo = "data:image/png;base64," + "A" * 11000000
+    doc = '<img class="h-card" alt="Jo" src="%s">' % photo
+    for dom_backend in ("lxml", "compact"):
+        result = Parser(doc, dom_backend=dom_backend).to_dict()
+        assert result["items"][0]["properties"]["photo"] == [
+            {"value": photo, "alt": "Jo"}
+        ], dom_backend
+
+
+def test_dom_backends_deep_tree():
+    # lxml's own trees stop at a depth of 2048, dropping the elements within
+    doc = "<div>" * 5000 + '<p class="h-card">Jo</p>' + "</div>" * 5000
+    for dom_backend in ("bs4", "lxml", "compact"):
+        result = Parser(doc, dom_backend=dom_backend, html_parser="lxml").to_dict()
+        assert result["items"] == [
+            {"type": ["h-card"], "properties": {"name": ["Jo"]}}
+        ], dom_backend
+
+
+def test_dom_backend_lxml_doc():
+    from lxml import etree
+
+    doc = """<div class="h-entry"><div class="e-content">
+    <template><a rel="me" href="/me">me</a></template>Hello</div></div>"""
+    tree = etree.fromstring(doc, etree.HTMLParser()).getroottree()
+    result = mf2py.parse(tree)
+    assert result["items"][0]["properties"]["content"] == [
+        {"value": "Hello", "html": "Hello"}
+    ]
+    assert result["debug"]["markup parser"] == "lxml"
+    # the given document is not modified
+    assert len(tree.findall(".//template")) == 1
+    assert result["rels"] == {"me": ["/me"]}
+
+    p = Parser(doc, dom_backend="lxml", expose_dom=True)
+    dom = p.to_dict()["items"][0]["properties"]["content"][0]["dom"]
+    assert isinstance(dom, etree._Element)
+
+
+def test_may_contain_microformats():
+    for doc in (
+        '<div class="note h-card">x</div>',
+        "<div\nCLASS = 'vcard'>x</div>",
+        '<div class="&#104;-entry">x</div>',
+        '<a rel="me" href="/me">me</a>',
+        "<a/REL href=/>x</a>",
+        '<div class="h-card">x</div>'.encode("utf-16"),
+    ):
+        assert mf2py.may_contain_microformats(doc), doc
+        assert mf2py.may_contain_microformats(
+            doc if isinstance(doc, bytes) else doc.encode("utf-8")
+        ), doc
+
+    for doc in ("", '<div class="hx-card note" data-rel="me">h-card</div>'):
+        assert not mf2py.may_contain_microformats(doc)
+    assert not mf2py.may_contain_microformats("<title>T</title>")
+    assert mf2py.may_contain_microformats("<title>T</title>", metaformats=True)
+
+    with open(os.path.join(TEST_DIR, "empty.html"), "rb") as f:
+        assert not mf2py.may_contain_microformats(f)
+
+
+@pytest.mark.filterwarnings("ignore::bs4.GuessedAtParserWarning")
+def test_prescan():
+    # documents that may contain microformats are parsed as usual
+    for path in sorted(os.listdir(TEST_DIR)):
+        if not path.endswith(".html"):
+            continue
+        with open(os.path.join(TEST_DIR, path), "rb") as f:
+            doc = f.read()
+        for options in ({}, {"metaformats": True}):
+            assert Parser(doc, prescan=True, **options).to_dict() == (
+                Parser(doc, **options).to_dict()
+            ), path
+
+    with open(os.path.join(TEST_DIR, "empty.html")) as f:
+        p = Parser(doc=f, prescan=True)
+    assert p.__doc__ is None
+    assert p.to_dict() == {
+        "items": [],
+        "rels": {},
+        "rel-urls": {},
+        "debug": {
+            "description": "mf2py - microformats2 parser for python",
+            "source": "https://github.com/microformats/mf2py",
+            "version": mf2py.__version__,
+            "markup parser": "html5lib",
+        },
+    }
+    assert (
+        mf2py.parse("<p>x</p>", dom_backend="lxml", prescan=True)["debug"][
+            "markup parser"
+        ]
+        == "lxml"
+    )
+    # aliases of the markup parsers are given as the parsers they select
+    for html_parser in ("html", "html5", "lxml", "html.parser", None):
+        debug = mf2py.parse("<p>x</p>", html_parser=html_parser)["debug"]
+        assert (
+            mf2py.parse("<p>x</p>", html_parser=html_parser, prescan=True)["debug"]
+            == debug
+        )
+
+
+def test_result_cache(tmp_path):
+    cache = mf2py.ResultCache(maxsize=2)
+    with open(os.path.join(TEST_DIR, "eras.html"), "rb") as f:
+        doc = f.read()
+    expected = mf2py.parse(doc, url="http://example.com/")
+
+    result = cache.parse(doc, url="http://example.com/")
+    assert result == expected
+    # results are new dicts that can be modified
+    result["items"].clear()
+    assert cache.parse(doc, url="http://example.com/") == expected
+    assert cache.cache_info() == (1, 0, 1, 0, 2, 1)
+
+    # the URL and the options are part of the key
+    assert cache.parse(doc, url="http://example.org/") == mf2py.parse(
+        doc, url="http://example.org/"
+    )
+    assert cache.parse(doc, url="http://example.com/", metaformats=True) == (
+        mf2py.parse(doc, url="http://example.com/", metaformats=True)
+    )
+    info = cache.cache_info()
+    assert (info.misses, info.evictions, info.currsize) == (3, 1, 2)
+    assert cache.parse(doc, url="http://example.com/") == expected
+    assert cache.cache_info().misses == 4
+
+    # results with exposed DOMs are not cached
+    cache.parse(doc, expose_dom=True)
+    assert cache.cache_info().misses == 4
+
+    path = str(tmp_path / "cache.sqlite")
+    cache = mf2py.ResultCache(maxsize=0, path=path)
+    assert cache.parse(doc) == mf2py.parse(doc)
+    other_cache = mf2py.ResultCache(path=path)
+    assert other_cache.parse(doc) == mf2py.parse(doc)
+    assert other_cache.cache_info() == (1, 1, 0, 0, 128, 1)
+    other_cache.clear()
+    assert other_cache.cache_info() == (0, 0, 0, 0, 128, 0)
+    cache.parse(doc)
+    assert cache.cache_info().misses == 2
+
+
+def test_http_cache(tmp_path):
+    from requests.structures import CaseInsensitiveDict
+
+    doc = '<a class="h-card" href="/me">James</a>'
+    requested = []
+
+    def response(url, status_code=200, headers=None, content=b""):
+        resp = mock.MagicMock()
+        resp.url = url
+        resp.status_code = status_code
+        resp.headers = CaseInsensitiveDict(headers or {})
+        resp.content = content
+        resp.history = []
+        return resp
+
+    def get(url, headers):
+        requested.append((url, headers))
+        if url == "http://example.com/old":
+            redirect = response(url, 301, {"Location": "/new"})
+            resp = get("http://example.com/new", headers)
+            resp.history = [redirect]
+            return resp
+        if url == "http://down.example.com/":
+            raise requests.ConnectionError()
+        if headers.get("If-None-Match") == '"v1"':
+            return response(url, 304)
+        return response(url, 200, {"ETag": '"v1"'}, doc.encode("utf-8"))
+
+    session = mock.MagicMock()
+    session.get.side_effect = get
+    http_cache = mf2py.HTTPCache(str(tmp_path / "http.sqlite"), session=session)
+    expected = mf2py.parse(doc, url="http://example.com/new")
+
+    p = Parser(url="http://example.com/old", http_cache=http_cache)
+    assert p.to_dict() == expected
+    assert requested[-1][1].get("If-None-Match") is None
+
+    # the permanent redirect is remembered and the document revalidated
+    requested.clear()
+    p = Parser(url="http://example.com/old", http_cache=http_cache)
+    assert p.to_dict() == expected
+    # the document is not parsed again
+    assert p.__doc__ is None
+    assert requested == [
+        (
+            "http://example.com/new",
+            {"User-Agent": Parser.useragent, "If-None-Match": '"v1"'},
+        )
+    ]
+    assert p.__url__ == "http://example.com/new"
+
+    # results are stored per options
+    result = mf2py.parse(
+        url="http://example.com/new", http_cache=http_cache, properties=["name"]
+    )
+    assert result == mf2py.parse(doc, url="http://example.com/new", properties=["name"])
+
+    # the stored result was not parsed within limits, so the stored document
+    # is parsed instead
+    p = Parser(url="http://example.com/new", http_cache=http_cache, limits={"items": 0})
+    assert p.__doc__ is not None
+    assert p.to_dict()["items"] == []
+    assert p.to_dict()["debug"]["limit exceeded"] == "items"
+    assert mf2py.parse(url="http://example.com/new", http_cache=http_cache) == expected
+
+    # the profiles of the parse that stored a result are not stored with it
+    http_cache.clear()
+    Parser(url="http://example.com/new", http_cache=http_cache, profile=True)
+    result = mf2py.parse(url="http://example.com/new", http_cache=http_cache)
+    assert result == expected
+    p = Parser(url="http://example.com/new", http_cache=http_cache, memory=True)
+    assert p.__doc__ is None
+    assert "profile" not in p.to_dict()["debug"]
+    assert p.to_dict()["debug"]["memory"] == {}
+
+    # failed hosts are not tried again for a while
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            Parser(url="http://down.example.com/", http_cache=http_cache)
+    assert [url for url, _ in requested].count("http://down.example.com/") == 1
+    http_cache.clear()
+    with pytest.raises(requests.ConnectionError):
+        Parser(url="http://down.example.com/", http_cache=http_cache)
+    assert [url for url, _ in requested].count("http://down.example.com/") == 2
+
+
+def test_subtree_memo():
+    memo = mf2py.SubtreeMemo(maxsize=2)
+    sidebar = '<div class="h-card"><a class="p-name u-url" href="/">Me</a></div>'
+    docs = [
+        '<html lang="en">%s<p class="h-entry">Post %d</p></html>' % (sidebar, i)
+        for i in range(3)
+    ]
+    for doc in docs:
+        assert mf2py.parse(doc, url="http://example.com/", memo=memo) == (
+            mf2py.parse(doc, url="http://example.com/")
+        )
+    assert memo.cache_info() == (2, 4, 2, 2, 2)
+    assert memo.hit_rate == pytest.approx(1 / 3)
+
+    # the base URL, the language and the options are part of the key
+    for doc in (docs[0], docs[0].replace("en", "fr")):
+        for options in ({"url": "http://example.org/"}, {"properties": ["name"]}):
+            assert mf2py.parse(doc, memo=memo, **options) == mf2py.parse(doc, **options)
+    assert memo.cache_info().hits == 2
+
+    # memoized microformats are new dicts
+    memo.clear()
+    mf2py.parse(docs[0], memo=memo)["items"][0]["properties"].clear()
+    assert mf2py.parse(docs[0], memo=memo) == mf2py.parse(docs[0])
+    assert memo.cache_info() == (2, 2, 0, 2, 2)
+
+    # microformats with rel elements in the templates of their e-* properties
+    # are not memoized, as parsing them removes the templates
+    memo.clear()
+    doc = """<div class="h-entry"><div class="e-content">
+    <template><a rel="me" href="/me">me</a></template>Hello</div></div>"""
+    for _ in range(2):
+        assert mf2py.parse(doc, memo=memo) == mf2py.parse(doc)
+    assert memo.cache_info() == (0, 0, 0, 2, 0)
+
+
+def test_objects():
+    for path in ("eras.html", "festivus.html", "area.html", "embedded.html"):
+        with open(os.path.join(TEST_DIR, path), "rb") as f:
+            doc = f.read()
+        for options in ({}, {"metaformats": True}):
+            expected = Parser(doc, url="http://example.com/", **options)
+            p = Parser(doc, url="http://example.com/", objects=True, **options)
+            assert all(isinstance(item, mf2py.Item) for item in p.items)
+            assert p.to_json() == expected.to_json()
+            assert p.to_json(filter_by_type="h-card") == expected.to_json(
+                filter_by_type="h-card"
+            )
+
+    with open(os.path.join(TEST_DIR, "eras.html")) as f:
+        p = Parser(doc=f, objects=True)
+    entry = p.items[0]
+    assert entry.type == ("h-entry",)
+    assert entry.lang == "en-us"
+    author = entry.properties["author"][0]
+    assert isinstance(author, mf2py.Item)
+    assert author.value == "James"
+    content = entry.properties["content"][0]
+    assert isinstance(content, mf2py.PropertyValue)
+    assert content.html == "<p>I can't decide which era is my favorite.</p>"
+    assert entry.properties["featured"][0].alt == "Eras tour poster"
+    # type and property names are interned
+    assert entry.type[0] is sys.intern("h-entry")
+    assert next(iter(entry.properties)) is sys.intern("name")
+    assert mf2py.Item.from_dict(entry.to_dict()) == entry
+
+    rel = p.rel_urls["https://example.com/mentions"]
+    assert isinstance(rel, mf2py.Rel)
+    assert rel.rels == ["webmention"]
+    assert rel.to_dict() == {"text": "", "rels": ["webmention"]}
+
+    # the value of a microformat can be a nested microformat
+    doc = (
+        '<div class="h-entry"><div class="p-author h-card">'
+        '<span class="p-name h-card">Jo</span></div></div>'
+    )
+    p = Parser(doc, objects=True)
+    assert isinstance(p.items[0].properties["author"][0].value, mf2py.Item)
+    assert p.to_json() == Parser(doc).to_json()
+    assert p.to_dict()["items"][0]["properties"]["author"] == [
+        {"type": ["h-card"], "properties": {"name": ["Jo"]}, "value": "Jo"}
+    ]
+
+    # the objects are built as the properties are parsed, once per element
+    doc = (
+        '<div class="h-entry"><div class="e-content e-summary">Hi</div>'
+        '<img class="u-photo u-featured" src="/a.png" alt="A"></div>'
+    )
+    properties = Parser(doc, objects=True).items[0].properties
+    assert isinstance(properties["content"][0], mf2py.PropertyValue)
+    assert properties["content"][0] is properties["summary"][0]
+    assert properties["photo"][0] is properties["featured"][0]
+
+
+def test_write_json():
+    import io
+    import json
+
+    with open(os.path.join(TEST_DIR, "festivus.html")) as f:
+        doc = f.read()
+    for objects in (False, True):
+        p = Parser(doc, metaformats=True, objects=objects)
+        for pretty_print in (False, True):
+            for filter_by_type in (None, "h-card"):
+                fp = io.StringIO()
+                p.write_json(
+                    fp, pretty_print=pretty_print, filter_by_type=filter_by_type
+                )
+                assert fp.getvalue() == p.to_json(
+                    pretty_print=pretty_print, filter_by_type=filter_by_type
+                )
+
+        fp = io.StringIO()
+        p.write_json(fp, ndjson=True, filter_by_type="h-entry")
+        lines = fp.getvalue().splitlines()
+        assert len(lines) == 4
+        assert [json.loads(line) for line in lines] == p.to_dict(
+            filter_by_type="h-entry"
+        )
+
+    result = mf2py.parse(doc)
+    fp = io.StringIO()
+    mf2py.write_json(result, fp)
+    assert json.loads(fp.getvalue()) == result
+    fp = io.StringIO()
+    mf2py.write_json(result, fp, ndjson=True)
+    assert len(fp.getvalue().splitlines()) == len(result["items"])
+
+
+def _process_or_exit(source, options):
+    """Stand in for the CLI's worker function, exiting the worker like the
+    OOM killer for crash.html"""
+    if source.endswith("crash.html"):
+        os._exit(1)
+    return {"source": source, "result": {}, "time": 0}
+
+
+def test_cli(tmp_path, capsys):
+    import json
+    import shutil
+
+    from mf2py import cli
+
+    pages = tmp_path / "pages"
+    (pages / "sub").mkdir(parents=True)
+    shutil.copy(os.path.join(TEST_DIR, "eras.html"), pages / "eras.html")
+    shutil.copy(os.path.join(TEST_DIR, "festivus.html"), pages / "sub" / "b.htm")
+    (pages / "sub" / "notes.txt").write_text("not html")
+    missing = str(tmp_path / "missing.html")
+    output = tmp_path / "out.ndjson"
+    checkpoint = tmp_path / "done.txt"
+
+    args = ["-w", "1", "-o", str(output), "--checkpoint", str(checkpoint)]
+    assert cli.main(args + [str(pages / "eras.html"), "--types", "h-entry"]) == 0
+    assert cli.main(args + [str(pages), missing, "--types", "h-entry"]) == 0
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    # eras.html was done before the interruption and is not parsed again
+    assert [record["source"] for record in records] == [
+        str(pages / "eras.html"),
+        str(pages / "sub" / "b.htm"),
+        missing,
+    ]
+    assert records[1]["result"] == mf2py.parse(
+        open(pages / "sub" / "b.htm").read(), types=["h-entry"]
+    )
+    assert records[2]["error"].startswith("FileNotFoundError")
+    assert "result" not in records[2]
+    assert all(record["time"] >= 0 for record in records)
+    assert checkpoint.read_text().splitlines() == [
+        record["source"] for record in records
+    ]
+
+    assert cli.main(["-w", "2", str(pages / "eras.html"), missing]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(json.loads(line)["source"] for line in lines) == sorted(
+        [str(pages / "eras.html"), missing]
+    )
+
+    # without --checkpoint, the records of a previous run are overwritten
+    assert cli.main(["-w", "1", "-o", str(output), missing]) == 0
+    assert [json.loads(line)["source"] for line in output.open()] == [missing]
+
+    # a killed worker is recorded as an error and the others go on
+    crash = str(tmp_path / "crash.html")
+    sources = [crash] + [str(tmp_path / ("%d.html" % i)) for i in range(40)]
+    checkpoint = tmp_path / "crash.txt"
+    with mock.patch("mf2py.cli._process", _process_or_exit):
+        assert (
+            cli.main(
+                ["-w", "2", "-o", str(output), "--checkpoint", str(checkpoint)]
+                + sources
+            )
+            == 0
+        )
+    records = {
+        record["source"]: record
+        for record in (json.loads(line) for line in output.open())
+    }
+    assert sorted(records) == sorted(sources)
+    assert records[crash]["error"].startswith("BrokenProcessPool")
+    # the sources in flight with it are parsed again
+    assert all("result" in records[source] for source in sources[1:])
+    assert all(record["time"] >= 0 for record in records.values())
+    assert sorted(checkpoint.read_text().splitlines()) == sorted(sources)
+
+
+def test_parse_warc(tmp_path):
+    import gzip
+    import io
+
+    def record(warc_type, record_id, block, content_type="application/http"):
+        headers = (
+            "WARC/1.0\r\nWARC-Type: {0}\r\nWARC-Record-ID: {1}\r\n"
+            "WARC-Target-URI: https://example.com/{1}\r\n"
+            "Content-Type: {2}\r\nContent-Length: {3}\r\n\r\n"
+        ).format(warc_type, record_id, content_type, len(block))
+        # one gzip member per record
+        return gzip.compress(headers.encode("ascii") + block + b"\r\n\r\n")
+
+    html = '<meta charset="utf-8"><a class="h-card" href="/me">Café</a>'
+    warc = b"".join(
+        [
+            record("warcinfo", "info", b"software: test", "application/warc-fields"),
+            record("request", "req", b"GET / HTTP/1.1\r\n\r\n"),
+            record(
+                "response",
+                "latin",
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=iso-8859-1"
+                b"\r\n\r\n" + html.encode("iso-8859-1"),
+            ),
+            record(
+                "response",
+                "chunked",
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                b"Transfer-Encoding: chunked\r\nContent-Encoding: gzip\r\n\r\n"
+                + b"%x\r\n" % len(gzip.compress(html.encode("utf-8")))
+                + gzip.compress(html.encode("utf-8"))
+                + b"\r\n0\r\n\r\n",
+            ),
+            record(
+                "response",
+                "image",
+                b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\n\x89PNG",
+            ),
+        ]
+    )
+
+    responses = list(mf2py.iter_warc_responses(io.BytesIO(warc)))
+    assert [response.record_id for response in responses] == ["latin", "chunked"]
+    assert responses[0].doc == html
+    assert responses[0].url == "https://example.com/latin"
+    assert responses[0].status == 200
+    assert responses[0].content_type == "text/html"
+    assert responses[1].doc == html.encode("utf-8")
+    assert len(list(mf2py.iter_warc_responses(io.BytesIO(warc), False))) == 3
+
+    path = tmp_path / "crawl.warc.gz"
+    path.write_bytes(warc)
+    for workers in (1, 2):
+        results = dict(mf2py.parse_warc(str(path), workers=workers))
+        assert sorted(results) == ["chunked", "latin"]
+        for record_id, result in results.items():
+            assert result["items"][0]["properties"] == {
+                "name": ["Café"],
+                "url": ["https://example.com/me"],
+            }
+
+    # plain archives too
+    plain = gzip.decompress(warc)
+    assert len(list(mf2py.iter_warc_responses(io.BytesIO(plain)))) == 2
+    with pytest.raises(ValueError):
+        list(mf2py.iter_warc_responses(io.BytesIO(b"<html></html>")))
+
+
+def test_benchmarks_compare(tmp_path, capsys):
+    import json
+
+    from benchmarks import run
+
+    def results(docs_per_s, p50_ms):
+        return {
+            "results": {
+                "examples/lxml": {"docs_per_s": docs_per_s, "p50_ms": p50_ms},
+            }
+        }
+
+    baseline = results(100.0, 10.0)
+    # 10% worse is within the threshold, faster is never a regression
+    assert run.compare(baseline, results(90.0, 11.0)) == []
+    assert run.compare(baseline, results(200.0, 5.0)) == []
+    assert run.compare(baseline, results(80.0, 10.0)) == [
+        ("examples/lxml", "docs_per_s", 100.0, 80.0, -0.2)
+    ]
+    assert run.compare(baseline, results(80.0, 10.0), threshold=0.25) == []
+    # metrics missing from either run are not compared
+    assert run.compare(results(100.0, 10.0), {"results": {}}) == []
+
+    for name, value in (("baseline", baseline), ("current", results(100.0, 12.5))):
+        with open(tmp_path / (name + ".json"), "w") as f:
+            json.dump(value, f)
+    args = ["compare", str(tmp_path / "baseline.json"), str(tmp_path / "current.json")]
+    assert run.main(args) == 1
+    assert "REGRESSION examples/lxml p50_ms: 10.0 -> 12.5 (+25.0%)" in (
+        capsys.readouterr().out
+    )
+    assert run.main(args + ["--threshold", "0.3"]) == 0
+    assert run._available("html.parser")
+
+
+def test_profile():
+    with open(os.path.join(TEST_DIR, "backcompat", "hentry_with_rel_tag.html")) as f:
+        doc = f.read()
+    result = mf2py.parse(doc, metaformats=True, profile=True)
+    profile = result["debug"]["profile"]
+    assert list(profile) == [
+        "tree building",
+        "scan",
+        "backcompat",
+        "implied properties",
+        "embedded",
+        "metaformats",
+        "items",
+        "rels",
+    ]
+    assert profile["tree building"]["calls"] == 1
+    assert profile["scan"]["calls"] == 1
+    assert profile["items"]["calls"] == 1
+    assert profile["backcompat"]["calls"] == 1
+    assert profile["rels"]["calls"] == 1
+    assert all(phase["seconds"] >= 0 for phase in profile.values())
+    assert profile["items"]["seconds"] >= profile["backcompat"]["seconds"]
+
+    del result["debug"]["profile"]
+    assert result == mf2py.parse(doc, metaformats=True)
+    assert "profile" not in mf2py.parse(doc)["debug"]
+
+    # the phases of lazy parsing are added as they are run
+    p = Parser(doc, lazy=True, profile=True)
+    p.items
+    profile = p.__parsed__["debug"]["profile"]
+    assert profile["items"]["calls"] == 1
+    assert "rels" not in profile
+    p.rels
+    assert profile["rels"]["calls"] == 1
+
+
+def test_memory():
+    import tracemalloc
+
+    with open(os.path.join(TEST_DIR, "backcompat", "hentry_content_html.html")) as f:
+        doc = f.read()
+    result = mf2py.parse(doc, memory=True)
+    memory = result["debug"]["memory"]
+    assert memory["tree building"]["calls"] == 1
+    assert memory["tree building"]["retained"] > 0
+    assert memory["backcompat"]["calls"] == 1
+    assert memory["embedded"]["calls"] == 1
+    assert memory["rels"]["calls"] == 1
+    for phase in memory.values():
+        assert phase["peak"] >= 0
+    # the peak of the items includes the translations of backcompat roots
+    assert memory["items"]["peak"] >= memory["backcompat"]["peak"] > 0
+    assert not tracemalloc.is_tracing()
+
+    del result["debug"]["memory"]
+    assert result == mf2py.parse(doc)
+
+    # with both, and while already tracing
+    tracemalloc.start()
+    try:
+        debug = mf2py.parse(doc, profile=True, memory=True)["debug"]
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert list(debug["profile"]) == list(debug["memory"])
+    assert debug["memory"]["tree building"]["retained"] > 0
+
+    results = dict(mf2py.parse_many([doc], workers=1, memory=True))
+    assert results[0]["debug"]["memory"]["items"]["calls"] == 1
+
+
+def test_limits():
+    doc = (
+        '<div class="h-feed"><p class="p-name">Feed</p>'
+        + "".join(
+            '<div class="h-entry"><p class="p-name">Entry {0}</p>'
+            '<div class="e-content"><p>Content {0}</p></div></div>'.format(i)
+            for i in range(10)
+        )
+        + '</div><a rel="me" href="/a">a</a><a rel="me" href="/b">b</a>'
+    )
+    full = mf2py.parse(doc)
+    assert mf2py.parse(doc, limits={"seconds": 60, "depth": 10}) == full
+
+    # the feed and two of its entries
+    result = mf2py.parse(doc, limits={"items": 3})
+    assert result["debug"]["limit exceeded"] == "items"
+    assert result["items"][0]["properties"] == {"name": ["Feed"]}
+    assert result["items"][0]["children"] == full["items"][0]["children"][:2]
+    assert result["rels"] == {}
+
+    result = mf2py.parse(doc, limits={"html_bytes": 30})
+    assert result["debug"]["limit exceeded"] == "html_bytes"
+    children = result["items"][0]["children"]
+    assert children[0] == full["items"][0]["children"][0]
+    assert "content" not in children[1]["properties"]
+    assert len(children) == 2
+
+    result = mf2py.parse(doc, limits={"depth": 1})
+    assert result["debug"]["limit exceeded"] == "depth"
+    assert result["items"] == [{"type": ["h-feed"], "properties": {}}]
+
+    result = mf2py.parse(doc, limits={"rel_urls": 1})
+    assert result["debug"]["limit exceeded"] == "rel_urls"
+    assert result["items"] == full["items"]
+    assert list(result["rel-urls"]) == ["/a"]
+
+    with mock.patch("time.monotonic", side_effect=[0, 0, 100, 100, 100]):
+        result = mf2py.parse(doc, limits={"seconds": 10})
+    assert result["debug"]["limit exceeded"] == "seconds"
+    assert result["items"] == [{"type": ["h-feed"], "properties": {}}]
+
+    memo = mf2py.SubtreeMemo()
+    mf2py.parse(doc, memo=memo, limits={"items": 3})
+    assert memo.cache_info().currsize == 0
+
+    # memoized microformats count against the limits, and are parsed again
+    # for what fits if they are beyond them or what they used is unknown
+    mf2py.parse(doc, memo=memo)
+    for limits in (
+        {"items": 3},
+        {"items": 11},
+        {"items": 10},
+        {"html_bytes": 30},
+        {"depth": 2},
+        {"depth": 3},
+    ):
+        for _ in range(2):
+            result = mf2py.parse(doc, memo=memo, limits=limits)
+            assert result == mf2py.parse(doc, limits=limits)
+    assert memo.cache_info().currsize == 1
+    memo.clear()
+    for twice in (False, True):
+        result = mf2py.parse(doc * (1 + twice), memo=memo, limits={"items": 12})
+        assert result == mf2py.parse(doc * (1 + twice), limits={"items": 12})
+    # the second copy was found but parsed again, partially
+    assert result["debug"]["limit exceeded"] == "items"
+    assert memo.cache_info().hits == 2
+
+    with pytest.raises(ValueError):
+        mf2py.parse(doc, limits={"bytes": 10})
+
+
+def test_deeply_nested():
+    # deeper than the recursion limit, in elements and in microformats
+    depth = sys.getrecursionlimit() + 100
+    doc = (
+        '<div class="h-entry"><p class="p-name">Entry</p>'
+        + "<div>" * depth
+        + '<a class="u-url" href="/entry">link</a>'
+        + '<div class="h-card"><span class="p-name">Card</span>' * depth
+        + "</div>" * (2 * depth)
+        + "</div>"
+    )
+    item = mf2py.parse(doc, dom_backend="compact")["items"][0]
+    assert item["properties"] == {"name": ["Entry"], "url": ["/entry"]}
+    for _ in range(depth):
+        (item,) = item["children"]
+        assert item["properties"] == {"name": ["Card"]}
+    assert "children" not in item
+
+    # and in classic microformats
+    doc = (
+        '<div class="hentry"><span class="entry-title">Entry</span>'
+        + '<a rel="tag" href="/tags/tag">tag</a>'
+    ) * depth + "</div>" * depth
+    items = mf2py.parse(doc, dom_backend="compact")["items"]
+    for _ in range(depth):
+        (item,) = items
+        assert item["properties"] == {"name": ["Entry"], "category": ["tag"]}
+        items = item.get("children", [])
+    assert items == []
+
+
+def test_text_content_deeply_nested():
+    # the text of elements deeper than the recursion limit, and long runs of
+    # whitespace, paragraphs and images
+    depth = sys.getrecursionlimit() + 100
+    doc = (
+        '<div class="h-entry"><div class="p-name">'
+        + "<span>a \n\t " * depth
+        + '<p>  b  <img alt="c"> </p>'
+        + "</span>" * depth
+        + " \n</div></div>"
+    )
+    item = mf2py.parse(doc, dom_backend="compact")["items"][0]
+    assert item["properties"]["name"] == ["a " * depth + "\nb  c"]
+
+
+def test_text_content_overlapping():
+    # the text of elements within others is reused, for each way of
+    # replacing images
+    doc = """<div class="h-entry">
+    <div class="e-content"><p class="p-name">Entry <img src="/a.png"></p>
+    <div class="p-author h-card"><p>Card <img src="/b.png" alt="B"></p>
+    <span>Note <img src="/c.png"><br>end</span></div>
+    </div></div>"""
+    entry = mf2py.parse(doc, url="http://example.com")["items"][0]
+    assert entry["properties"]["name"] == ["Entry  http://example.com/a.png"]
+    assert entry["properties"]["content"][0]["value"] == (
+        "Entry  http://example.com/a.png\n\nCard  B\nNote  http://example.com/c.png \nend"
+    )
+    author = entry["properties"]["author"][0]
+    assert author["value"] == "Card  B\nNote  http://example.com/c.png \nend"
+    assert author["properties"]["name"] == ["Card  B\nNote \nend"]